@@ -14,7 +14,7 @@ WICHTIG: IoT-Verbindung bleibt stabil, auch wenn Signal disconnected!
 
 Verwendung:
     1. Passe Konfiguration an (DEVICE_NAME, Signal-Nummern, etc.)
-    2. Installiere Abhängigkeiten: pip install websockets httpx
+    2. Installiere Abhängigkeiten: pip install -r requirements.txt
     3. Stelle sicher, dass client_secret_signal-device in der DB gespeichert ist
     4. Führe aus: python3 device-signal.py
 """
@@ -25,8 +25,25 @@ import json
 import sys
 import os
 import ssl
-from datetime import datetime
-from typing import Optional
+import re
+import base64
+import bisect
+import hashlib
+import mimetypes
+import sqlite3
+import tempfile
+import time
+import uuid
+import random
+import math
+import queue
+import logging
+import logging.handlers
+import concurrent.futures
+import email.utils
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import List, Optional
 
 # HTTP-Client für Signal REST API
 try:
@@ -45,462 +62,4092 @@ WS_HOST = os.getenv("WS_HOST", "10.0.3.17")
 WS_PORT = int(os.getenv("WS_PORT", "8080"))
 WS_PATH = os.getenv("WS_PATH", "/ws/external")
 
+# REST API des IoT Orchestrators (Device-Registrierung)
+IOT_API_PORT = int(os.getenv("IOT_API_PORT", "3000"))
+IOT_REGISTER_TIMEOUT = float(os.getenv("IOT_REGISTER_TIMEOUT", "5"))
+IOT_REGISTER_RETRIES = int(os.getenv("IOT_REGISTER_RETRIES", "3"))
+
 # Geräte-Informationen  
 DEVICE_NAME = os.getenv("DEVICE_NAME", "signal-device")
 
-# Globaler API Key
-API_KEY = os.getenv("SIMPLE_API_KEY", "default-api-key-123")
+# Globaler API Key
+API_KEY = os.getenv("SIMPLE_API_KEY", "default-api-key-123")
+
+# Signal-Konfiguration
+SIGNAL_SERVER_URL = os.getenv("SIGNAL_SERVER_URL", "signal.local.chase295.de")
+SIGNAL_RECEIVE_NUMBER = os.getenv("SIGNAL_RECEIVE_NUMBER", "+4915122215051")
+SIGNAL_SEND_NUMBER = os.getenv("SIGNAL_SEND_NUMBER", "+4915122215051")
+SIGNAL_RECIPIENT_NUMBER = os.getenv("SIGNAL_RECIPIENT_NUMBER", "+4917681328005")
+
+# Protokoll-Konfiguration
+SIGNAL_PROTOCOL = os.getenv("SIGNAL_PROTOCOL", "https").lower()
+
+# SSL-Konfiguration
+SIGNAL_VERIFY_SSL = os.getenv("SIGNAL_VERIFY_SSL", "False").lower() in ('true', '1', 't')
+
+# Reconnect-Konfiguration
+SIGNAL_RECONNECT_DELAY = float(os.getenv("SIGNAL_RECONNECT_DELAY", "1"))
+IOT_RECONNECT_DELAY = float(os.getenv("IOT_RECONNECT_DELAY", "1"))
+
+# Reconnect-Strategie: erster Versuch sofort, danach Backoff mit Jitter bis
+# RECONNECT_MAX_DELAY; nach RECONNECT_BREAKER_THRESHOLD Fehlversuchen in Folge
+# (0 = aus) nur noch alle RECONNECT_BREAKER_COOLDOWN Sekunden ein Probeversuch.
+# Der Cooldown ist standardmäßig RECONNECT_MAX_DELAY: ein offener Breaker
+# verlängert die Ausfallzeit nach einem Neustart des Gegenübers nicht
+RECONNECT_FAST_RETRY = os.getenv("RECONNECT_FAST_RETRY", "True").lower() in ("true", "1", "yes")
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", "60"))
+RECONNECT_BREAKER_THRESHOLD = int(os.getenv("RECONNECT_BREAKER_THRESHOLD", "10"))
+RECONNECT_BREAKER_COOLDOWN = float(os.getenv("RECONNECT_BREAKER_COOLDOWN", str(RECONNECT_MAX_DELAY)))
+
+# Zeitbudget pro Verbindungsversuch (TCP, TLS, WebSocket-Handshake, Willkommensnachricht)
+WS_CONNECT_TIMEOUT = float(os.getenv("WS_CONNECT_TIMEOUT", "5"))
+
+# Heartbeat beider WebSockets (Sekunden, 0 = aus): Ping-Intervall, max. Wartezeit
+# auf den Pong und Reconnect, wenn so lange gar nichts empfangen wurde
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+WS_HEARTBEAT_TIMEOUT = float(os.getenv("WS_HEARTBEAT_TIMEOUT", "10"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "90"))
+
+# HTTP-Client-Konfiguration (Signal REST API, gemeinsamer Connection-Pool)
+SIGNAL_HTTP_TIMEOUT = float(os.getenv("SIGNAL_HTTP_TIMEOUT", "10"))
+SIGNAL_HTTP_CONNECT_TIMEOUT = float(os.getenv("SIGNAL_HTTP_CONNECT_TIMEOUT", "5"))
+SIGNAL_HTTP_MAX_CONNECTIONS = int(os.getenv("SIGNAL_HTTP_MAX_CONNECTIONS", "10"))
+SIGNAL_HTTP_MAX_KEEPALIVE = int(os.getenv("SIGNAL_HTTP_MAX_KEEPALIVE", "5"))
+SIGNAL_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SIGNAL_HTTP_KEEPALIVE_EXPIRY", "30"))
+SIGNAL_HTTP2 = os.getenv("SIGNAL_HTTP2", "False").lower() in ('true', '1', 't')
+
+# Sende-Queue (IoT → Signal), entkoppelt IoT-Empfang von der Signal-Latenz
+SIGNAL_SEND_QUEUE_SIZE = int(os.getenv("SIGNAL_SEND_QUEUE_SIZE", "1000"))
+SIGNAL_SEND_WORKERS = int(os.getenv("SIGNAL_SEND_WORKERS", "4"))
+SIGNAL_SEND_OVERFLOW = os.getenv("SIGNAL_SEND_OVERFLOW", "block").lower()  # block | drop-oldest | spill
+SIGNAL_SEND_SPILL_FILE = os.getenv("SIGNAL_SEND_SPILL_FILE", "signal-send-spill.jsonl")
+SIGNAL_SEND_DRAIN_TIMEOUT = float(os.getenv("SIGNAL_SEND_DRAIN_TIMEOUT", "5"))
+# Nach so vielen Antworten in Folge kommt eine wartende Benachrichtigung (bulk) dran
+SIGNAL_SEND_BULK_EVERY = int(os.getenv("SIGNAL_SEND_BULK_EVERY", "8"))
+
+# Rate Limits für den Signal-Versand als Token Bucket (Nachrichten/s, 0 = unbegrenzt)
+# pro Absendernummer und pro Empfänger; Burst = Nachrichten ohne Wartezeit
+SIGNAL_RATE_LIMIT = float(os.getenv("SIGNAL_RATE_LIMIT", "0"))
+SIGNAL_RATE_BURST = int(os.getenv("SIGNAL_RATE_BURST", "10"))
+SIGNAL_RECIPIENT_RATE_LIMIT = float(os.getenv("SIGNAL_RECIPIENT_RATE_LIMIT", "0"))
+SIGNAL_RECIPIENT_RATE_BURST = int(os.getenv("SIGNAL_RECIPIENT_RATE_BURST", "5"))
+# Antwortet die Signal API mit 429/413: Pause laut Retry-After (ohne Header
+# SIGNAL_RETRY_AFTER_DEFAULT, höchstens SIGNAL_RETRY_AFTER_MAX) und bis zu
+# SIGNAL_RATE_LIMIT_RETRIES neue Versuche, danach bleibt die Nachricht in der Outbox
+SIGNAL_RATE_LIMIT_RETRIES = int(os.getenv("SIGNAL_RATE_LIMIT_RETRIES", "5"))
+SIGNAL_RETRY_AFTER_DEFAULT = float(os.getenv("SIGNAL_RETRY_AFTER_DEFAULT", "5"))
+SIGNAL_RETRY_AFTER_MAX = float(os.getenv("SIGNAL_RETRY_AFTER_MAX", "300"))
+
+# Persistente Outbox (Signal-Versand und IoT-Weiterleitung, at-least-once)
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "True").lower() in ('true', '1', 't')
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.db")
+OUTBOX_FLUSH_INTERVAL_MS = int(os.getenv("OUTBOX_FLUSH_INTERVAL_MS", "50"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "256"))
+OUTBOX_RETRY_INTERVAL = int(os.getenv("OUTBOX_RETRY_INTERVAL", "30"))
+OUTBOX_RETENTION = int(os.getenv("OUTBOX_RETENTION", "600"))
+# Fehlgeschlagene Signal-Zustellversuche pro Nachricht (auch über Neustarts), danach wird sie aufgegeben
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+
+# Zusammenfassen (Coalescing) kurz aufeinanderfolgender Nachrichten pro Empfänger
+SIGNAL_COALESCE_ENABLED = os.getenv("SIGNAL_COALESCE_ENABLED", "False").lower() in ('true', '1', 't')
+SIGNAL_COALESCE_WINDOW_MS = int(os.getenv("SIGNAL_COALESCE_WINDOW_MS", "500"))
+SIGNAL_COALESCE_MAX_CHARS = int(os.getenv("SIGNAL_COALESCE_MAX_CHARS", "2000"))
+SIGNAL_COALESCE_SEPARATOR = os.getenv("SIGNAL_COALESCE_SEPARATOR", "\n\n").replace("\\n", "\n")
+SIGNAL_MAX_MESSAGE_LENGTH = int(os.getenv("SIGNAL_MAX_MESSAGE_LENGTH", "2000"))
+
+# Puffer für gestreamten TXT Output (Chunks bis zum finalen Frame)
+SESSION_BUFFER_TTL = int(os.getenv("SESSION_BUFFER_TTL", "300"))
+SESSION_BUFFER_MAX_BYTES = int(os.getenv("SESSION_BUFFER_MAX_BYTES", str(8 * 1024 * 1024)))
+SESSION_BUFFER_MAX_SESSIONS = int(os.getenv("SESSION_BUFFER_MAX_SESSIONS", "1000"))
+SESSION_EXPIRE_POLICY = os.getenv("SESSION_EXPIRE_POLICY", "flush").lower()  # flush | discard
+
+# Streaming-Zustellung: "final" sendet erst beim finalen Chunk, "progressive"
+# sendet Teilnachrichten an Satz-/Absatzgrenzen oder nach Ablauf des Latenzbudgets
+SIGNAL_STREAM_MODE = os.getenv("SIGNAL_STREAM_MODE", "final").lower()  # final | progressive
+SIGNAL_STREAM_MIN_CHARS = int(os.getenv("SIGNAL_STREAM_MIN_CHARS", "80"))
+SIGNAL_STREAM_LATENCY_MS = int(os.getenv("SIGNAL_STREAM_LATENCY_MS", "3000"))
+
+# IoT-Framing: parallele Streams (Header/Payload-Paare) über eine Verbindung
+IOT_MAX_PENDING_HEADERS = int(os.getenv("IOT_MAX_PENDING_HEADERS", "1000"))
+IOT_REORDER_WINDOW = int(os.getenv("IOT_REORDER_WINDOW", "64"))
+
+# IoT-Senden: Payload als Binärframe (UTF-8) statt Textframe, max. Nachrichten pro Schreibvorgang
+IOT_BINARY_PAYLOAD = os.getenv("IOT_BINARY_PAYLOAD", "False").lower() in ("true", "1", "yes")
+IOT_WRITE_BATCH = int(os.getenv("IOT_WRITE_BATCH", "64"))
+
+# Ringpuffer für empfangene Signal-Nachrichten, solange IoT nicht verbunden ist
+SIGNAL_INBOX_SIZE = int(os.getenv("SIGNAL_INBOX_SIZE", "1000"))
+
+# Medien (Anhänge) in beide Richtungen: max. Dateigröße, Chunkgröße der
+# IoT-Binärframes, Arbeitsspeicher pro Upload (darüber Auslagerung auf
+# Platte) und HTTP-Timeout für Download/Upload
+MEDIA_ENABLED = os.getenv("MEDIA_ENABLED", "True").lower() in ("true", "1", "yes")
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(25 * 1024 * 1024)))
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", str(64 * 1024)))
+MEDIA_SPOOL_MEMORY = int(os.getenv("MEDIA_SPOOL_MEMORY", str(1024 * 1024)))
+MEDIA_HTTP_TIMEOUT = float(os.getenv("MEDIA_HTTP_TIMEOUT", "60"))
+# Gleichzeitige Anhang-Downloads (alle Konten), Rest des HTTP-Pools bleibt frei für /v2/send
+MEDIA_DOWNLOAD_CONCURRENCY = int(os.getenv("MEDIA_DOWNLOAD_CONCURRENCY", "4"))
+
+# Antwort-Routing: Ausgaben gehen an den Absender (oder die Gruppe) der Anfrage
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "True").lower() in ('true', '1', 't')
+ROUTING_TTL = int(os.getenv("ROUTING_TTL", "3600"))
+ROUTING_MAX_ENTRIES = int(os.getenv("ROUTING_MAX_ENTRIES", "10000"))
+
+# Multi-Account: JSON/YAML-Datei mit mehreren Signal-Nummern und Geräten (leer = nur Umgebungsvariablen)
+ACCOUNTS_CONFIG = os.getenv("ACCOUNTS_CONFIG", "")
+ACCOUNT_RESTART_DELAY = int(os.getenv("ACCOUNT_RESTART_DELAY", "10"))
+
+# Statistik-Ausgabe (Sekunden, 0 = deaktiviert)
+STATS_INTERVAL = int(os.getenv("STATS_INTERVAL", "60"))
+
+# Prometheus /metrics Endpoint (Port 0 = deaktiviert)
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# JSON-Codec: "auto" nutzt orjson oder msgspec, falls installiert, sonst die Standardbibliothek
+JSON_CODEC = os.getenv("JSON_CODEC", "auto").lower()  # auto | orjson | msgspec | json
+
+# Logging: "text" (lesbar, wie bisher) oder "json" (eine JSON-Zeile pro Ereignis)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Level pro Kategorie, z.B. "signal=DEBUG,iot=WARNING" (signal, iot, outbox, stats, app)
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# Nachrichtentexte und Nummern in Logs maskieren, sonst auf N Zeichen kürzen
+LOG_REDACT = os.getenv("LOG_REDACT", "False").lower() in ("true", "1", "yes")
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "100"))
+# Logs pro Nachricht (Hot Path): max. Einträge pro Sekunde und Kategorie (0 = unbegrenzt) und Stichprobenanteil
+LOG_HOT_RATE = float(os.getenv("LOG_HOT_RATE", "50"))
+LOG_HOT_SAMPLE = float(os.getenv("LOG_HOT_SAMPLE", "1.0"))
+
+# Signal-URLs intelligent konstruieren
+def build_signal_urls(server_url=SIGNAL_SERVER_URL, protocol=SIGNAL_PROTOCOL, receive_number=SIGNAL_RECEIVE_NUMBER):
+    """
+    Baut Signal WebSocket und REST API URLs basierend auf SIGNAL_SERVER_URL und SIGNAL_PROTOCOL
+    """
+    url = server_url.strip()
+    protocol = protocol.lower()
+    
+    if url.startswith("http://"):
+        protocol = "http"
+        url = url[7:]
+    elif url.startswith("https://"):
+        protocol = "https"
+        url = url[8:]
+    elif url.startswith("ws://"):
+        protocol = "http"
+        url = url[5:]
+    elif url.startswith("wss://"):
+        protocol = "https"
+        url = url[6:]
+    
+    if protocol not in ("http", "https"):
+        protocol = "https"
+    
+    url = url.rstrip("/")
+    
+    ws_protocol = "wss" if protocol == "https" else "ws"
+    http_protocol = protocol
+    
+    ws_url = f"{ws_protocol}://{url}/v1/receive/{receive_number}"
+    api_url = f"{http_protocol}://{url}/v2/send"
+    
+    return ws_url, api_url, protocol
+
+# ======================================
+# GERÄTE-FÄHIGKEITEN (CAPABILITIES)
+# ======================================
+DEVICE_CAPABILITIES = [
+    'txt_output',
+    'txt_input',
+]
+
+# ======================================
+# ENDE KONFIGURATION
+# ======================================
+
+# ======================================
+# LOGGING
+# ======================================
+
+log = logging.getLogger("signal_device")
+log_signal = logging.getLogger("signal_device.signal")
+log_iot = logging.getLogger("signal_device.iot")
+log_outbox = logging.getLogger("signal_device.outbox")
+log_stats = logging.getLogger("signal_device.stats")
+
+class TextLogFormatter(logging.Formatter):
+    """Lesbare Ausgabe wie bisher, Felder werden angehängt"""
+
+    def format(self, record):
+        text = record.getMessage()
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += "  " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        if record.stack_info:
+            text += "\n" + self.formatStack(record.stack_info)
+        return text
+
+class JsonLogFormatter(logging.Formatter):
+    """Eine JSON-Zeile pro Ereignis (ts, level, category, msg, Felder)"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "category": record.name.rpartition(".")[2],
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        # Statistik-Ausgaben: Rohwerte statt nur des formatierten Textes
+        stats = getattr(record, "stats", None)
+        if stats:
+            entry["stats"] = stats
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler für eine Queue im selben Prozess: der Record wird unverändert
+    weitergereicht, Formatieren (inkl. Traceback) übernimmt der Listener-Thread
+    """
+
+    def prepare(self, record):
+        return record
+
+class HotPathSampler:
+    """
+    Begrenzt Logs pro Nachricht: Token-Bucket pro Kategorie (`rate` pro
+    Sekunde) und optionale Stichprobe (`sample` = Anteil 0..1)
+    """
+
+    def __init__(self, rate=LOG_HOT_RATE, sample=LOG_HOT_SAMPLE):
+        self.rate = rate
+        self.sample = sample
+        # Kategorie -> [Tokens, letzter Zeitpunkt]
+        self.buckets = {}
+        self.suppressed = 0
+
+    def allow(self, category: str):
+        if self.sample < 1.0 and random.random() >= self.sample:
+            self.suppressed += 1
+            return False
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        bucket = self.buckets.get(category)
+        if bucket is None:
+            bucket = self.buckets[category] = [self.rate, now]
+        bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            self.suppressed += 1
+            return False
+        bucket[0] -= 1.0
+        return True
+
+hot_path_sampler = HotPathSampler()
+
+def log_event(logger, level, message, hot=False, **fields):
+    """
+    Schreibt ein Log-Ereignis mit strukturierten Feldern
+
+    Ist das Level deaktiviert, kostet der Aufruf nur den Level-Check.
+    `hot=True` kennzeichnet Logs pro Nachricht, die gedrosselt werden.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if hot and not hot_path_sampler.allow(logger.name):
+        return
+    logger.log(level, message, extra={"fields": fields} if fields else None)
+
+def redact_text(text):
+    """Nachrichtentext für Logs: maskiert (LOG_REDACT) oder gekürzt"""
+    if text is None:
+        return None
+    text = str(text)
+    if LOG_REDACT:
+        return f"<{len(text)} Zeichen>"
+    if LOG_PAYLOAD_MAX_CHARS > 0 and len(text) > LOG_PAYLOAD_MAX_CHARS:
+        return text[:LOG_PAYLOAD_MAX_CHARS] + "…"
+    return text
+
+def redact_number(number):
+    """Telefonnummer für Logs, mit LOG_REDACT bis auf Anfang/Ende maskiert"""
+    if not LOG_REDACT or not number or len(str(number)) <= 6:
+        return number
+    number = str(number)
+    return f"{number[:4]}***{number[-3:]}"
+
+def parse_log_levels(spec: str):
+    """'signal=DEBUG,iot=WARNING' -> {"signal": 10, "iot": 30}"""
+    levels = {}
+    for item in spec.split(","):
+        category, _, level = item.partition("=")
+        category, level = category.strip().lower(), level.strip().upper()
+        if category and isinstance(logging.getLevelName(level), int):
+            levels[category] = logging.getLevelName(level)
+    return levels
+
+def setup_logging():
+    """
+    Leitet alle Logs über eine QueueHandler/QueueListener-Kette: die Event-Loop
+    legt Einträge nur in eine Queue, ein Hintergrund-Thread formatiert und
+    schreibt sie nach stdout. Gibt den Listener zurück (stop() leert die Queue).
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonLogFormatter() if LOG_FORMAT == "json" else TextLogFormatter())
+
+    log_queue = queue.SimpleQueue()
+    log.handlers = [LocalQueueHandler(log_queue)]
+    log.setLevel(LOG_LEVEL if isinstance(logging.getLevelName(LOG_LEVEL), int) else logging.INFO)
+    log.propagate = False
+    for category, level in parse_log_levels(LOG_LEVELS).items():
+        logging.getLogger(f"signal_device.{category}").setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
+def log_separator():
+    """Trennlinie nur in der Textausgabe"""
+    if LOG_FORMAT != "json":
+        log.info("=" * 70)
+
+# ======================================
+# JSON-CODEC
+# ======================================
+
+class SignalAttachment:
+    """Anhang einer Signal-Nachricht; der Inhalt liegt bei signal-cli (/v1/attachments/{id})"""
+    __slots__ = ("id", "content_type", "filename", "size")
+
+    def __init__(self, id, content_type=None, filename=None, size=None):
+        self.id = id
+        self.content_type = content_type or "application/octet-stream"
+        self.filename = filename
+        self.size = size
+
+    @classmethod
+    def from_dict(cls, data):
+        """Aus einem Eintrag von dataMessage.attachments; None ohne ID"""
+        if not isinstance(data, dict) or not data.get('id'):
+            return None
+        size = data.get('size')
+        return cls(data['id'], data.get('contentType'), data.get('filename'),
+                   size if isinstance(size, int) else None)
+
+    def to_dict(self):
+        return {"id": self.id, "contentType": self.content_type, "filename": self.filename, "size": self.size}
+
+class SignalEnvelope:
+    """Die für die Weiterleitung relevanten Felder eines Signal-Envelopes"""
+    __slots__ = ("source_number", "source_uuid", "source_name", "timestamp", "message", "group_id", "attachments")
+
+    def __init__(self, source_number=None, source_uuid=None, source_name=None,
+                 timestamp=None, message=None, group_id=None, attachments=()):
+        self.source_number = source_number
+        self.source_uuid = source_uuid
+        self.source_name = source_name
+        self.timestamp = timestamp
+        self.message = message
+        self.group_id = group_id
+        self.attachments = attachments
+
+    @classmethod
+    def from_dict(cls, data):
+        """Aus einem generisch dekodierten Frame; None ohne (Text-)dataMessage"""
+        envelope = data.get('envelope') if isinstance(data, dict) else None
+        if not isinstance(envelope, dict) or 'typingMessage' in envelope:
+            return None
+        data_message = envelope.get('dataMessage')
+        if not isinstance(data_message, dict):
+            return None
+        attachments = [SignalAttachment.from_dict(item) for item in data_message.get('attachments') or ()]
+        return cls(
+            envelope.get('sourceNumber'), envelope.get('sourceUuid'), envelope.get('sourceName'),
+            envelope.get('timestamp'), data_message.get('message'),
+            (data_message.get('groupInfo') or {}).get('groupId'),
+            [attachment for attachment in attachments if attachment is not None],
+        )
+
+class JsonCodec:
+    """
+    Austauschbare JSON-Implementierung
+
+    `loads`/`dumps` arbeiten mit str (WebSocket-Textframes, SQLite TEXT).
+    `decode_signal_frame` dekodiert Signal-Frames direkt typisiert, falls die
+    Implementierung das kann (msgspec), sonst über ein dict.
+    """
+
+    def __init__(self, name, loads, dumps, decode_errors=(ValueError,), decode_signal_frame=None):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.decode_errors = decode_errors
+        self.decode_signal_frame = decode_signal_frame or (lambda raw: SignalEnvelope.from_dict(loads(raw)))
+
+def create_orjson_codec():
+    import orjson
+    return JsonCodec("orjson", orjson.loads, lambda obj: orjson.dumps(obj).decode("utf-8"))
+
+def create_msgspec_codec():
+    import msgspec
+
+    class GroupInfo(msgspec.Struct, rename="camel"):
+        group_id: Optional[str] = None
+
+    class Attachment(msgspec.Struct, rename="camel"):
+        id: Optional[str] = None
+        content_type: Optional[str] = None
+        filename: Optional[str] = None
+        size: Optional[int] = None
+
+    class DataMessage(msgspec.Struct, rename="camel"):
+        message: Optional[str] = None
+        group_info: Optional[GroupInfo] = None
+        attachments: Optional[List[Attachment]] = None
+
+    class Envelope(msgspec.Struct, rename="camel"):
+        source_number: Optional[str] = None
+        source_uuid: Optional[str] = None
+        source_name: Optional[str] = None
+        timestamp: Optional[int] = None
+        # Raw: nur Anwesenheit prüfen, Inhalt nicht dekodieren
+        typing_message: Optional[msgspec.Raw] = None
+        data_message: Optional[DataMessage] = None
+
+    class SignalFrame(msgspec.Struct):
+        envelope: Optional[Envelope] = None
+
+    decoder = msgspec.json.Decoder()
+    frame_decoder = msgspec.json.Decoder(SignalFrame)
+    encoder = msgspec.json.Encoder()
+
+    def decode_signal_frame(raw):
+        try:
+            frame = frame_decoder.decode(raw)
+        except msgspec.ValidationError:
+            # Unerwartete Typen (z.B. Zeitstempel als String): generisch dekodieren
+            return SignalEnvelope.from_dict(decoder.decode(raw))
+        envelope = frame.envelope
+        if envelope is None or envelope.typing_message is not None or envelope.data_message is None:
+            return None
+        data_message = envelope.data_message
+        return SignalEnvelope(
+            envelope.source_number, envelope.source_uuid, envelope.source_name, envelope.timestamp,
+            data_message.message, data_message.group_info.group_id if data_message.group_info else None,
+            [
+                SignalAttachment(item.id, item.content_type, item.filename, item.size)
+                for item in data_message.attachments or () if item.id
+            ],
+        )
+
+    return JsonCodec(
+        "msgspec", decoder.decode, lambda obj: encoder.encode(obj).decode("utf-8"),
+        (ValueError, msgspec.DecodeError), decode_signal_frame,
+    )
+
+JSON_CODECS = {"orjson": create_orjson_codec, "msgspec": create_msgspec_codec}
+
+def create_json_codec(preference=JSON_CODEC):
+    """Wählt den JSON-Codec; fehlende optionale Pakete fallen auf json zurück"""
+    candidates = ("orjson", "msgspec") if preference == "auto" else (preference,)
+    for name in candidates:
+        factory = JSON_CODECS.get(name)
+        if factory is None:
+            continue
+        try:
+            return factory()
+        except ImportError:
+            if preference != "auto":
+                log.warning(f"⚠️  JSON_CODEC '{name}' nicht installiert - nutze json")
+    return JsonCodec("json", json.loads, json.dumps)
+
+json_codec = create_json_codec()
+
+def is_signal_data_frame(raw):
+    """
+    Vorfilter ohne Dekodieren: Typing-, Empfangs- und Sync-Frames enthalten
+    keinen dataMessage-Schlüssel und werden so übersprungen
+    """
+    if isinstance(raw, (bytes, bytearray)):
+        return b'"dataMessage"' in raw
+    return '"dataMessage"' in raw
+
+def build_iot_ws_url(host=WS_HOST, port=WS_PORT, path=WS_PATH, device_name=DEVICE_NAME, api_key=API_KEY):
+    """
+    Baut die IoT Orchestrator WebSocket-URL mit Authentifizierung
+    """
+    return f"ws://{host}:{port}{path}?clientId={device_name}&secret={api_key}"
+
+# ======================================
+# STREAM-PUFFER (TXT OUTPUT)
+# ======================================
+
+class StreamSession:
+    """Gepufferte Chunks einer gestreamten Ausgabe"""
+    __slots__ = ("session_id", "header", "chunks", "size", "started", "updated",
+                 "received", "pending_since", "parts", "timer")
+
+    def __init__(self, session_id: str, header: dict):
+        self.session_id = session_id
+        self.header = header
+        self.chunks = []
+        self.size = 0
+        self.started = time.monotonic()
+        self.updated = self.started
+        self.received = 0
+        # Progressiver Modus: seit wann ungesendeter Text wartet, Anzahl Teile
+        self.pending_since = None
+        self.parts = 0
+        self.timer = None
+
+    @property
+    def chunk_count(self):
+        return self.received
+
+    def text(self):
+        return ''.join(self.chunks)
+
+class SessionBuffer:
+    """
+    Begrenzter Puffer für gestreamten TXT Output
+
+    Sitzungen liegen in einem OrderedDict in Reihenfolge des letzten Chunks:
+    Anhängen ist O(1), die älteste Sitzung steht immer vorne. Sitzungen ohne
+    neuen Chunk seit `ttl` Sekunden laufen ab; überschreitet der Puffer
+    `max_bytes` oder `max_sessions`, wird die am längsten inaktive Sitzung
+    verdrängt. Abgelaufene/verdrängte Sitzungen gibt der Puffer zurück, der
+    Aufrufer sendet sie je nach SESSION_EXPIRE_POLICY oder verwirft sie.
+    """
+
+    def __init__(self, ttl=SESSION_BUFFER_TTL, max_bytes=SESSION_BUFFER_MAX_BYTES,
+                 max_sessions=SESSION_BUFFER_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_sessions = max(1, max_sessions)
+        self.sessions = OrderedDict()
+        self.bytes = 0
+
+        self.expired = 0
+        self.evicted = 0
+
+        # Zeit vom ersten Chunk bis zur ersten gesendeten Signal-Nachricht einer Sitzung
+        self.first_send_count = 0
+        self.first_send_total = 0.0
+        self.first_send_max = 0.0
+
+    def __contains__(self, session_id):
+        return session_id in self.sessions
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def append(self, session_id: str, header: dict, chunk: str):
+        """
+        Hängt einen Chunk an und gibt Sitzungen zurück, die dafür weichen mussten
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = StreamSession(session_id, header)
+        else:
+            self.sessions.move_to_end(session_id)
+
+        # sys.getsizeof: tatsächlicher Speicherbedarf des Strings, O(1)
+        size = sys.getsizeof(chunk)
+        session.chunks.append(chunk)
+        session.size += size
+        session.received += 1
+        session.updated = time.monotonic()
+        if session.pending_since is None:
+            session.pending_since = session.updated
+        self.bytes += size
+
+        released = self.expire()
+        # Die aktuelle Sitzung steht hinten und weicht zuletzt, notfalls auch
+        # sie (eine endlose Ausgabe darf max_bytes nicht allein sprengen)
+        while self.sessions and (self.bytes > self.max_bytes or len(self.sessions) > self.max_sessions):
+            oldest_id = next(iter(self.sessions))
+            released.append(self._remove(oldest_id))
+            self.evicted += 1
+        return released
+
+    def get(self, session_id: str):
+        return self.sessions.get(session_id)
+
+    def take(self, session_id: str, count: int):
+        """
+        Entnimmt die ersten `count` Zeichen einer Sitzung (progressiver Modus),
+        der Rest bleibt als einzelner Chunk gepuffert
+        """
+        session = self.sessions[session_id]
+        text = session.text()
+        part, rest = text[:count], text[count:]
+        size = sys.getsizeof(rest) if rest else 0
+        self.bytes += size - session.size
+        session.size = size
+        session.chunks = [rest] if rest else []
+        session.pending_since = time.monotonic() if rest else None
+        return part
+
+    def record_first_send(self, elapsed: float):
+        """Zählt die Zeit bis zur ersten gesendeten Nachricht einer Sitzung"""
+        self.first_send_count += 1
+        self.first_send_total += elapsed
+        self.first_send_max = max(self.first_send_max, elapsed)
+
+    def pop(self, session_id: str):
+        """Entfernt eine Sitzung (finaler Frame) und gibt sie zurück"""
+        if session_id not in self.sessions:
+            return None
+        return self._remove(session_id)
+
+    def expire(self, now: Optional[float] = None):
+        """Entfernt alle abgelaufenen Sitzungen und gibt sie zurück"""
+        now = now if now is not None else time.monotonic()
+        released = []
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if now - session.updated < self.ttl:
+                break
+            released.append(self._remove(session.session_id))
+            self.expired += 1
+        return released
+
+    def stats(self):
+        """Speicher-Gauge und Zähler"""
+        return {
+            "sessions": len(self.sessions),
+            "bytes": self.bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "first_send_count": self.first_send_count,
+            "first_send_avg_ms": (self.first_send_total / self.first_send_count * 1000) if self.first_send_count else 0.0,
+            "first_send_max_ms": self.first_send_max * 1000,
+        }
+
+    def _remove(self, session_id):
+        session = self.sessions.pop(session_id)
+        self.bytes -= session.size
+        if session.timer is not None:
+            session.timer.cancel()
+            session.timer = None
+        return session
+
+# ======================================
+# IoT-FRAMING (PARALLELE STREAMS)
+# ======================================
+
+class IotStreamDemux:
+    """
+    Ordnet Payload-Frames vom IoT Orchestrator ihren Headern zu
+
+    Jeder Header kündigt genau einen Payload-Frame an. Header und Payloads
+    mehrerer Sitzungen dürfen sich überlappen (z.B. Header A, Header B,
+    Payload A, Payload B): Payloads werden den offenen Headern in FIFO-
+    Reihenfolge zugeordnet.
+
+    Trägt ein Header ein Feld `seq` (0, 1, 2, ... pro Sitzungs-`id`), werden
+    die Chunks einer Sitzung zusätzlich in Reihenfolge gebracht; vorzeitig
+    eintreffende Chunks warten, bis die Lücke gefüllt ist. Läuft eine Lücke
+    über `reorder_window` Chunks, wird sie übersprungen.
+
+    Wie bisher gilt ein nicht-finaler Header ohne `seq` auch für weitere
+    Payloads, solange kein neuer Header ansteht (ein Header, mehrere Chunks).
+    Chunks einer bereits abgeschlossenen Sitzung (finaler Chunk ausgeliefert)
+    werden verworfen.
+    """
+
+    def __init__(self, max_pending=IOT_MAX_PENDING_HEADERS, reorder_window=IOT_REORDER_WINDOW,
+                 max_sessions=SESSION_BUFFER_MAX_SESSIONS):
+        self.pending_headers = deque()
+        self.max_pending = max(1, max_pending)
+        self.reorder_window = max(1, reorder_window)
+        self.max_sessions = max(1, max_sessions)
+        # Sitzungs-id -> nächste erwartete seq (LRU-begrenzt)
+        self.next_seq = OrderedDict()
+        # Sitzungs-id -> {seq: (header, payload)}
+        self.held = {}
+        # Abgeschlossene Sitzungen, für verspätete Chunks (LRU-begrenzt)
+        self.finished = OrderedDict()
+        # Zuletzt zugeordneter, nicht-finaler Header (ein Header, mehrere Chunks)
+        self.sticky_header = None
+
+        self.orphans = 0
+        self.dropped_headers = 0
+        self.reordered = 0
+        self.gaps = 0
+
+    def push_header(self, header: dict):
+        """Merkt sich einen Header bis zum zugehörigen Payload"""
+        if len(self.pending_headers) >= self.max_pending:
+            self.pending_headers.popleft()
+            self.dropped_headers += 1
+        self.pending_headers.append(header)
+
+    def has_pending(self):
+        return bool(self.pending_headers) or self.sticky_header is not None
+
+    def push_payload(self, payload):
+        """
+        Ordnet einen Payload zu und gibt alle jetzt auslieferbaren
+        (header, payload)-Paare in Sitzungsreihenfolge zurück
+        """
+        if not self.pending_headers:
+            if self.sticky_header is not None:
+                return [(self.sticky_header, payload)]
+            self.orphans += 1
+            return []
+        header = self.pending_headers.popleft()
+
+        seq = header.get('seq')
+        if not isinstance(seq, int) or isinstance(seq, bool):
+            self.sticky_header = None if header.get('final', True) else header
+            return [(header, payload)]
+        # Header mit seq kündigen genau einen Payload an
+        self.sticky_header = None
+
+        session_id = header.get('id', 'unknown')
+        expected = self.next_seq.get(session_id, 0)
+        if seq < expected or session_id in self.finished:
+            # Verspätetes Duplikat oder bereits übersprungene Lücke
+            self.gaps += 1
+            return []
+
+        held = self.held.setdefault(session_id, {})
+        held[seq] = (header, payload)
+        if seq != expected:
+            self.reordered += 1
+            if len(held) <= self.reorder_window:
+                self._touch(session_id, expected)
+                return []
+            # Lücke zu groß: beim kleinsten vorhandenen Chunk weitermachen
+            self.gaps += 1
+            expected = min(held)
+
+        ready = []
+        while expected in held:
+            ready.append(held.pop(expected))
+            expected += 1
+
+        if ready and ready[-1][0].get('final', True) and not held:
+            self._forget(session_id)
+        else:
+            if not held:
+                self.held.pop(session_id, None)
+            self._touch(session_id, expected)
+        return ready
+
+    def stats(self):
+        return {
+            "pending_headers": len(self.pending_headers),
+            "sessions": len(self.next_seq),
+            "orphans": self.orphans,
+            "dropped_headers": self.dropped_headers,
+            "reordered": self.reordered,
+            "gaps": self.gaps,
+        }
+
+    def _touch(self, session_id, expected):
+        self.next_seq[session_id] = expected
+        self.next_seq.move_to_end(session_id)
+        while len(self.next_seq) > self.max_sessions:
+            oldest_id, _ = self.next_seq.popitem(last=False)
+            self.held.pop(oldest_id, None)
+
+    def _forget(self, session_id):
+        self.next_seq.pop(session_id, None)
+        self.held.pop(session_id, None)
+        self.finished[session_id] = True
+        while len(self.finished) > self.max_sessions:
+            self.finished.popitem(last=False)
+
+# ======================================
+# ANTWORT-ROUTING
+# ======================================
+
+class RoutingTable:
+    """
+    Ordnet Sitzungs-/Konversations-IDs dem Signal-Empfänger (Nummer oder Gruppe) zu
+
+    OrderedDict in Reihenfolge der letzten Nutzung: Nachschlagen und Eintragen
+    sind O(1). Jeder Treffer verlängert die TTL, daher liegen abgelaufene
+    Einträge immer vorne und werden dort abgeräumt; bei mehr als `max_entries`
+    Einträgen fällt der am längsten ungenutzte heraus (LRU).
+    """
+
+    def __init__(self, ttl=ROUTING_TTL, max_entries=ROUTING_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        # Schlüssel -> (Empfänger, Ablaufzeit)
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def add(self, key: str, recipient: str):
+        """Merkt sich den Empfänger für eine Sitzungs-ID"""
+        now = time.monotonic()
+        self._expire(now)
+        self.entries[key] = (recipient, now + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, *keys):
+        """Empfänger zum ersten bekannten Schlüssel oder None (zählt als ein Treffer/Fehlschlag)"""
+        now = time.monotonic()
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is None:
+                continue
+            recipient, expires = entry
+            if expires < now:
+                del self.entries[key]
+                self.expirations += 1
+                continue
+            self.entries[key] = (recipient, now + self.ttl)
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return recipient
+        self.misses += 1
+        return None
+
+    def stats(self):
+        """Treffer, Fehlschläge und Verdrängungen"""
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _expire(self, now):
+        while self.entries:
+            key, (_, expires) = next(iter(self.entries.items()))
+            if expires >= now:
+                break
+            del self.entries[key]
+            self.expirations += 1
+
+# Header-/Metadaten-Felder, über die der Orchestrator eine Ausgabe
+# der auslösenden Signal-Nachricht zuordnen kann (in dieser Reihenfolge)
+ROUTING_HEADER_KEYS = ("replyTo", "inputId", "sessionId", "conversationId", "id")
+
+def signal_group_recipient(group_id: str):
+    """
+    Wandelt die groupId aus einem Envelope in die Empfänger-ID der REST API um
+    """
+    return "group." + base64.b64encode(group_id.encode("utf-8")).decode("ascii")
+
+def resolve_reply_recipient(account, header):
+    """
+    Ermittelt den Signal-Empfänger für eine IoT-Ausgabe: expliziter Empfänger
+    in den Metadaten, sonst Routing-Tabelle, sonst None (Standard-Empfänger)
+    """
+    if not header:
+        return None
+    metadata = header.get('metadata') or {}
+    explicit = metadata.get('signalRecipient')
+    if explicit:
+        return explicit
+    if account.routes is None:
+        return None
+    keys = [metadata.get(key) or header.get(key) for key in ROUTING_HEADER_KEYS]
+    return account.routes.get(*[key for key in keys if key])
+
+# ======================================
+# METRIKEN
+# ======================================
+
+# Sekunden; deckt schnelle lokale Hops bis zu langsamen Signal-API-Antworten ab
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Ping/Pong-Roundtrip: im LAN deutlich unter 5ms
+RTT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Verbindungsverlust bis wieder bereit: sofortiger Retry bis Circuit Breaker
+RECONNECT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+# Dauer eines Medien-Transfers (Download + Streaming bzw. Spool + Upload)
+MEDIA_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+MEDIA_DIRECTIONS = ("signal_to_iot", "iot_to_signal")
+
+class Histogram:
+    """Einfaches Prometheus-Histogramm (feste Buckets, Sekunden)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(Obergrenze, kumulierte Anzahl) inkl. +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+class AccountMetrics:
+    """
+    Hot-Path-Metriken eines Kontos: Zähler, Latenz-Histogramme und
+    Reconnect-Zustand beider Verbindungen ("signal", "iot")
+    """
+
+    def __init__(self):
+        self.signal_received = 0
+        self.signal_frames_skipped = 0
+        self.iot_forwarded = 0
+        self.signal_sent = 0
+        self.signal_failed = 0
+
+        # Signal-Empfang -> an IoT gesendet
+        self.signal_to_iot = Histogram()
+        # Finaler IoT-Frame -> Signal-Nachricht gesendet (inkl. Coalescing und Queue)
+        self.iot_to_signal = Histogram()
+        # Erster Stream-Chunk -> erste Signal-Nachricht der Sitzung gesendet
+        self.first_send = Histogram()
+        # Dauer eines POST an die Signal REST API
+        self.signal_http = Histogram()
+        # Wartezeit in der Sende-Queue je Priorität und vor dem POST (Token Bucket, Retry-After)
+        self.send_wait = {priority: Histogram() for priority in SEND_PRIORITIES}
+        self.rate_limit_wait = Histogram()
+        # Antworten 429/413 der Signal API
+        self.rate_limited = 0
+
+        self.reconnects = {"signal": 0, "iot": 0}
+        self.backoff = {"signal": 0.0, "iot": 0.0}
+        self.connected = {"signal": 0, "iot": 0}
+
+        # Heartbeat: Ping/Pong-Roundtrip und als tot erkannte Verbindungen
+        self.ws_rtt = {"signal": Histogram(RTT_BUCKETS), "iot": Histogram(RTT_BUCKETS)}
+        self.ws_rtt_last = {"signal": 0.0, "iot": 0.0}
+        self.heartbeat_failures = {"signal": 0, "iot": 0}
+
+        # Reconnect: Verbindungsverlust bis wieder bereit, Zustand des Circuit Breakers
+        self.reconnect_ready = {"signal": Histogram(RECONNECT_BUCKETS), "iot": Histogram(RECONNECT_BUCKETS)}
+        self.breaker_open = {"signal": 0, "iot": 0}
+
+        # Medien je Richtung: übertragene Dateien/Bytes, Dauer, Durchsatz des
+        # letzten Transfers, abgelehnte (zu groß) und fehlgeschlagene Transfers
+        self.media_files = dict.fromkeys(MEDIA_DIRECTIONS, 0)
+        self.media_bytes = dict.fromkeys(MEDIA_DIRECTIONS, 0)
+        self.media_seconds = {direction: Histogram(MEDIA_BUCKETS) for direction in MEDIA_DIRECTIONS}
+        self.media_throughput = dict.fromkeys(MEDIA_DIRECTIONS, 0.0)
+        self.media_rejected = dict.fromkeys(MEDIA_DIRECTIONS, 0)
+        self.media_failed = dict.fromkeys(MEDIA_DIRECTIONS, 0)
+
+    def connection_up(self, name: str):
+        self.connected[name] = 1
+        self.backoff[name] = 0.0
+
+    def connection_down(self, name: str):
+        self.connected[name] = 0
+
+    def reconnect_scheduled(self, name: str, delay: float):
+        self.reconnects[name] += 1
+        self.backoff[name] = delay
+
+    def media_transferred(self, direction: str, size: int, seconds: float):
+        self.media_files[direction] += 1
+        self.media_bytes[direction] += size
+        self.media_seconds[direction].observe(seconds)
+        self.media_throughput[direction] = size / seconds if seconds > 0 else 0.0
+
+# ======================================
+# RECONNECT
+# ======================================
+
+CONNECTION_LABELS = {"signal": "Signal", "iot": "IoT"}
+
+class ReconnectPolicy:
+    """
+    Reconnect-Strategie einer Verbindung ("signal" oder "iot")
+
+    Nach einem Verbindungsverlust folgt der erste Versuch sofort (kurze
+    Neustarts des Gegenübers kosten so keine Wartezeit), danach
+    exponentielles Backoff mit "decorrelated jitter": zufällig zwischen
+    `base` und dem Dreifachen der letzten Wartezeit, höchstens `cap`. Viele
+    Geräte reconnecten dadurch nicht im Gleichschritt. Nach
+    `breaker_threshold` Fehlversuchen in Folge öffnet der Circuit Breaker,
+    dann folgt nur noch alle `breaker_cooldown` Sekunden ein Probeversuch,
+    bis eine Verbindung wieder steht.
+    """
+
+    CLOSED, OPEN = "closed", "open"
+
+    # Sekunden, die eine Verbindung halten muss, damit das Backoff zurückgesetzt wird
+    stable_after = 10.0
+
+    def __init__(self, name: str, metrics: AccountMetrics, base: float, cap=RECONNECT_MAX_DELAY,
+                 fast_retry=RECONNECT_FAST_RETRY, breaker_threshold=RECONNECT_BREAKER_THRESHOLD,
+                 breaker_cooldown=RECONNECT_BREAKER_COOLDOWN):
+        self.name = name
+        self.metrics = metrics
+        self.base = max(0.1, base)
+        self.cap = max(self.base, cap)
+        self.fast_retry = fast_retry
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.delay = 0.0
+        # Verbindung steht seit / ging verloren um (monotonic, sonst None)
+        self.connected_at = None
+        self.lost_at = None
+        self.attempts = 0
+
+    def ready(self):
+        """Verbindung steht und ist einsatzbereit"""
+        now = time.monotonic()
+        if self.lost_at is not None:
+            elapsed = now - self.lost_at
+            self.metrics.reconnect_ready[self.name].observe(elapsed)
+            log_event(
+                connection_logger(self.name), logging.INFO,
+                f"⏱️  [{CONNECTION_LABELS[self.name]}] Wieder bereit nach {elapsed:.2f}s",
+                attempts=self.attempts, ready_ms=round(elapsed * 1000)
+            )
+        if self.state == self.OPEN:
+            connection_logger(self.name).info(f"🟢 [{CONNECTION_LABELS[self.name]}] Circuit Breaker geschlossen")
+        self.state = self.CLOSED
+        self.connected_at = now
+        self.lost_at = None
+        self.attempts = 0
+        self.metrics.breaker_open[self.name] = 0
+        self.metrics.connection_up(self.name)
+
+    def next_delay(self):
+        """Wartezeit bis zum nächsten Versuch (zählt den Fehlversuch)"""
+        now = time.monotonic()
+        if self.connected_at is not None:
+            # Backoff nur nach einer stabilen Verbindung zurücksetzen, sonst
+            # würde ein Gegenüber, das sofort wieder trennt, ohne Pause angefragt
+            if now - self.connected_at >= self.stable_after:
+                self.failures = 0
+                self.delay = 0.0
+            self.connected_at = None
+            self.lost_at = now
+        self.failures += 1
+        self.attempts += 1
+
+        if self.breaker_threshold > 0 and self.failures >= self.breaker_threshold:
+            if self.state == self.CLOSED:
+                connection_logger(self.name).warning(
+                    f"🔴 [{CONNECTION_LABELS[self.name]}] Circuit Breaker offen nach {self.failures} Fehlversuchen, "
+                    f"Probeversuch alle {self.breaker_cooldown:g}s"
+                )
+            self.state = self.OPEN
+            self.metrics.breaker_open[self.name] = 1
+            # Etwas Jitter (nur nach unten), damit auch Probeversuche verteilt eintreffen
+            delay = self.breaker_cooldown * random.uniform(0.8, 1.0)
+        elif self.failures == 1 and self.fast_retry:
+            delay = 0.0
+        else:
+            self.delay = min(self.cap, random.uniform(self.base, max(self.base, self.delay * 3)))
+            delay = self.delay
+
+        self.metrics.reconnect_scheduled(self.name, delay)
+        return delay
+
+def connection_logger(name: str):
+    return log_iot if name == "iot" else log_signal
+
+# ======================================
+# SIGNAL-KONTEN (MULTI-ACCOUNT)
+# ======================================
+
+class SignalAccount:
+    """
+    Ein Signal-Konto mit zugehörigem IoT-Gerät
+
+    Hält die Konfiguration (Nummern, Gerät, URLs) und den Laufzeit-Zustand
+    (Outbox, Sende-Queue, Coalescer) eines Kontos. Jedes Konto läuft isoliert
+    mit eigener Signal- und IoT-Verbindung; nicht gesetzte Werte kommen aus
+    den Umgebungsvariablen. HTTP-Pool und SSL-Kontext teilen sich alle Konten.
+    """
+
+    def __init__(self, device_name=DEVICE_NAME, api_key=API_KEY,
+                 ws_host=WS_HOST, ws_port=WS_PORT, ws_path=WS_PATH, api_port=IOT_API_PORT,
+                 signal_server_url=SIGNAL_SERVER_URL, signal_protocol=SIGNAL_PROTOCOL,
+                 receive_number=SIGNAL_RECEIVE_NUMBER, send_number=SIGNAL_SEND_NUMBER,
+                 recipient_number=SIGNAL_RECIPIENT_NUMBER,
+                 outbox_path=OUTBOX_PATH, spill_file=SIGNAL_SEND_SPILL_FILE):
+        self.device_name = device_name
+        self.api_key = api_key
+        self.receive_number = receive_number
+        self.send_number = send_number or receive_number
+        self.recipient_number = recipient_number
+        self.outbox_path = outbox_path
+        self.spill_file = spill_file
+
+        self.signal_ws_url, self.signal_api_url, self.signal_protocol = build_signal_urls(
+            signal_server_url, signal_protocol, receive_number
+        )
+        self.iot_ws_url = build_iot_ws_url(ws_host, int(ws_port), ws_path, device_name, api_key)
+        self.ws_host = ws_host
+        self.register_url = f"http://{ws_host}:{int(api_port)}/api/devices"
+        self.signal_attachment_url = self.signal_api_url.rsplit("/v2/send", 1)[0] + "/v1/attachments"
+
+        # Antwort-Routing und Stream-Puffer überleben IoT-Reconnects
+        self.routes = RoutingTable() if ROUTING_ENABLED else None
+        self.session_buffer = SessionBuffer()
+        # Unvollständige Binärausgaben vom IoT Orchestrator: ID -> MediaUpload
+        self.media_uploads = OrderedDict()
+
+        # Laufzeit-Zustand, wird von run_account() aufgebaut
+        self.outbox = None
+        self.send_queue = None
+        self.coalescer = None
+        # Framing und Writer der aktuellen IoT-Verbindung
+        self.iot_demux = None
+        self.iot_writer = None
+        # Puffer zwischen Signal-Empfang und IoT, wird von run_account() erstellt
+        self.signal_inbox = None
+        # Hash der zuletzt erfolgreich registrierten Device-Daten und laufende Registrierung
+        self.registered_hash = None
+        self.register_task = None
+        self.metrics = AccountMetrics()
+        # Rate Limits gelten pro Absendernummer (auch über mehrere Konten)
+        self.rate_limiter = get_signal_rate_limiter(self.send_number)
+        # Über IoT-Reconnects hinweg, damit Backoff und Breaker erhalten bleiben
+        self.signal_reconnect = ReconnectPolicy("signal", self.metrics, SIGNAL_RECONNECT_DELAY)
+        self.iot_reconnect = ReconnectPolicy("iot", self.metrics, IOT_RECONNECT_DELAY)
+
+ACCOUNT_CONFIG_KEYS = (
+    "device_name", "api_key", "ws_host", "ws_port", "ws_path", "api_port",
+    "signal_server_url", "signal_protocol", "receive_number", "send_number",
+    "recipient_number", "outbox_path", "spill_file",
+)
+
+def load_accounts(path=ACCOUNTS_CONFIG):
+    """
+    Lädt die Konten aus ACCOUNTS_CONFIG (JSON oder YAML)
+
+    Format:
+        defaults:              # optional, gilt für alle Konten
+          signal_server_url: "signal.example.org"
+        accounts:
+          - device_name: "signal-device-1"
+            receive_number: "+4915100000001"
+            recipient_number: "+4917600000001"
+
+    Ohne Datei wird genau ein Konto aus den Umgebungsvariablen gebaut.
+    """
+    if not path:
+        return [SignalAccount()]
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML-Konfiguration benötigt PyYAML (pip install pyyaml)")
+            config = yaml.safe_load(f) or {}
+        else:
+            config = json.load(f)
+
+    if isinstance(config, list):
+        config = {"accounts": config}
+    defaults = config.get("defaults") or {}
+    entries = config.get("accounts") or []
+    if not entries:
+        raise ValueError(f"{path}: keine Konten unter 'accounts' definiert")
+
+    accounts = []
+    for index, entry in enumerate(entries):
+        settings = dict(defaults)
+        settings.update(entry or {})
+        unknown = sorted(set(settings) - set(ACCOUNT_CONFIG_KEYS))
+        if unknown:
+            raise ValueError(f"{path}: Konto {index + 1} hat unbekannte Felder: {', '.join(unknown)}")
+        if "device_name" not in (entry or {}):
+            raise ValueError(f"{path}: Konto {index + 1} benötigt 'device_name'")
+
+        # Eigene Nummer wird ohne Angabe auch zum Senden verwendet
+        if "receive_number" in settings:
+            settings.setdefault("send_number", settings["receive_number"])
+
+        # Pro Konto eigene Outbox-/Spill-Datei, sofern nicht explizit gesetzt
+        name = settings["device_name"]
+        settings.setdefault("outbox_path", os.path.join(os.path.dirname(OUTBOX_PATH), f"outbox-{name}.db"))
+        settings.setdefault(
+            "spill_file", os.path.join(os.path.dirname(SIGNAL_SEND_SPILL_FILE), f"signal-send-spill-{name}.jsonl")
+        )
+        accounts.append(SignalAccount(**settings))
+
+    for attribute in ("device_name", "receive_number", "outbox_path"):
+        values = [getattr(account, attribute) for account in accounts]
+        duplicates = sorted({value for value in values if values.count(value) > 1})
+        if duplicates:
+            raise ValueError(f"{path}: '{attribute}' mehrfach vergeben: {', '.join(duplicates)}")
+    return accounts
+
+def print_header(accounts):
+    """Zeigt den Header mit Konfiguration an"""
+    log_separator()
+    log.info("  IoT Orchestrator Signal Device Client (Stable Mode)")
+    log_separator()
+    if ACCOUNTS_CONFIG:
+        log.info(f"🗂️  Konten aus {ACCOUNTS_CONFIG}: {len(accounts)}")
+    for account in accounts:
+        log.info(f"📱 Gerät: {account.device_name}")
+        log.info(f"🔗 IoT Orchestrator: {account.iot_ws_url.split('&secret=')[0]}")
+        # Die Empfangsnummer steckt im Pfad der URL
+        signal_ws_url = account.signal_ws_url
+        if account.receive_number:
+            signal_ws_url = signal_ws_url.replace(account.receive_number, str(redact_number(account.receive_number)))
+        log.info(f"📲 Signal-Empfang: {signal_ws_url}")
+        log.info(f"📤 Signal-Senden: {account.signal_api_url}")
+        log.info(f"🔐 Signal-Protokoll: {account.signal_protocol.upper()}")
+        log.info(f"📞 Signal-Nummer (Empfang): {redact_number(account.receive_number)}")
+        log.info(f"📞 Signal-Nummer (Senden): {redact_number(account.send_number)}")
+        log.info(f"👤 Standard-Empfänger: {redact_number(account.recipient_number)}")
+    log.info(f"🧾 JSON-Codec: {json_codec.name}")
+    log.info(f"🌐 Signal HTTP-Pool: {SIGNAL_HTTP_MAX_CONNECTIONS} Verbindungen, Keep-Alive {SIGNAL_HTTP_KEEPALIVE_EXPIRY:g}s, HTTP/2: {'an' if SIGNAL_HTTP2 else 'aus'}")
+    log.info(f"📬 Signal Sende-Queue: {SIGNAL_SEND_QUEUE_SIZE} Plätze, {SIGNAL_SEND_WORKERS} Worker, Overflow: {SIGNAL_SEND_OVERFLOW}")
+    if SIGNAL_RATE_LIMIT > 0 or SIGNAL_RECIPIENT_RATE_LIMIT > 0:
+        log.info(
+            f"🚦 Signal Rate Limit: {SIGNAL_RATE_LIMIT:g}/s pro Absender (Burst {SIGNAL_RATE_BURST}), "
+            f"{SIGNAL_RECIPIENT_RATE_LIMIT:g}/s pro Empfänger (Burst {SIGNAL_RECIPIENT_RATE_BURST}); 0 = unbegrenzt"
+        )
+    if MEDIA_ENABLED:
+        log.info(f"📎 Medien: max {MEDIA_MAX_BYTES / 1024 / 1024:g} MiB, IoT-Chunks {MEDIA_CHUNK_SIZE // 1024} KiB")
+    if SIGNAL_COALESCE_ENABLED:
+        log.info(f"🧩 Signal Coalescing: {SIGNAL_COALESCE_WINDOW_MS}ms Fenster, max {SIGNAL_COALESCE_MAX_CHARS} Zeichen")
+    if METRICS_PORT > 0:
+        log.info(f"📈 Metriken: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    log.info(
+        f"🔄 Reconnect: {'sofort, dann ' if RECONNECT_FAST_RETRY else ''}Jitter ab {SIGNAL_RECONNECT_DELAY:g}s (Signal) / "
+        f"{IOT_RECONNECT_DELAY:g}s (IoT) bis {RECONNECT_MAX_DELAY:g}s, Verbindungsbudget {WS_CONNECT_TIMEOUT:g}s"
+    )
+    if RECONNECT_BREAKER_THRESHOLD > 0:
+        log.info(f"🔄 Circuit Breaker: nach {RECONNECT_BREAKER_THRESHOLD} Fehlversuchen alle {RECONNECT_BREAKER_COOLDOWN:g}s")
+    if WS_HEARTBEAT_INTERVAL > 0:
+        log.info(f"💓 Heartbeat: Ping alle {WS_HEARTBEAT_INTERVAL:g}s, Pong-Timeout {WS_HEARTBEAT_TIMEOUT:g}s, Idle-Timeout {WS_IDLE_TIMEOUT:g}s")
+
+# Gemeinsamer HTTP-Client (Connection-Pool) für die Signal REST API und die
+# Device-Registrierung beim IoT Orchestrator
+# Wird von signal_device_client() erstellt und beim Beenden geschlossen
+signal_http_client: Optional[httpx.AsyncClient] = None
+
+def create_signal_http_client():
+    """
+    Erstellt einen langlebigen HTTP-Client mit Keep-Alive Connection-Pool
+    (optional HTTP/2), damit nicht jede Nachricht einen neuen TCP/TLS-Handshake braucht
+    """
+    http2 = SIGNAL_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            log_signal.warning("⚠️  [Signal] HTTP/2 aktiviert, aber 'h2' nicht installiert - nutze HTTP/1.1 (pip install 'httpx[http2]')")
+            http2 = False
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(SIGNAL_HTTP_TIMEOUT, connect=SIGNAL_HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=SIGNAL_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=SIGNAL_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=SIGNAL_HTTP_KEEPALIVE_EXPIRY
+        ),
+        verify=SIGNAL_VERIFY_SSL,
+        http2=http2,
+        headers={"Content-Type": "application/json"}
+    )
+
+def get_signal_http_client():
+    """
+    Liefert den gemeinsamen HTTP-Client (wird bei Bedarf erstellt)
+    """
+    global signal_http_client
+    if signal_http_client is None or signal_http_client.is_closed:
+        signal_http_client = create_signal_http_client()
+    return signal_http_client
+
+async def close_signal_http_client():
+    """
+    Schließt den gemeinsamen HTTP-Client und alle offenen Verbindungen
+    """
+    global signal_http_client
+    if signal_http_client is not None:
+        client = signal_http_client
+        signal_http_client = None
+        await client.aclose()
+
+# Gemeinsamer SSL-Kontext für alle Signal WebSockets (wss://)
+signal_ssl_context: Optional[ssl.SSLContext] = None
+
+def get_signal_ssl_context():
+    """
+    Liefert den gemeinsamen SSL-Kontext (einmal erstellt, von allen Konten geteilt)
+    """
+    global signal_ssl_context
+    if signal_ssl_context is None:
+        signal_ssl_context = ssl.create_default_context()
+        if not SIGNAL_VERIFY_SSL:
+            signal_ssl_context.check_hostname = False
+            signal_ssl_context.verify_mode = ssl.CERT_NONE
+    return signal_ssl_context
+
+async def send_signal_message(account: SignalAccount, message: str, recipient: Optional[str] = None):
+    """
+    Sendet eine Nachricht über die Signal REST API (gemeinsamer Connection-Pool)
+    True: gesendet, False: vorübergehender Fehler, None: dauerhaft abgelehnt (4xx)
+    """
+    try:
+        recipient_number = recipient or account.recipient_number
+        
+        if not isinstance(message, str):
+            message = str(message)
+        
+        payload = {
+            "message": message,
+            "number": account.send_number,
+            "recipients": [recipient_number]
+        }
+        
+        response = await post_to_signal(account, recipient_number, lambda: {"json": payload})
+        if is_permanent_signal_error(response):
+            account.metrics.signal_failed += 1
+            log_signal.error(
+                f"❌ [Signal] Nachricht abgelehnt ({response.status_code}), wird nicht wiederholt: "
+                f"{response.text[:200]}"
+            )
+            return None
+        response.raise_for_status()
+        account.metrics.signal_sent += 1
+        log_event(
+            log_signal, logging.INFO, "✅ [Signal] Nachricht gesendet", hot=True,
+            recipient=redact_number(recipient_number), text=redact_text(message)
+        )
+        return True
+    except Exception as e:
+        account.metrics.signal_failed += 1
+        log_signal.error(f"❌ [Signal] Fehler beim Senden: {e}")
+        return False
+
+# ======================================
+# RATE LIMITS
+# ======================================
+
+# Antworten der Signal API bei überschrittenem Rate Limit
+SIGNAL_RATE_LIMIT_STATUS = (429, 413)
+
+class TokenBucket:
+    """
+    Token Bucket mit Reservierung: reserve() bucht sofort ein Token und
+    liefert die Wartezeit, bis es gedeckt ist (Reihenfolge der Aufrufer bleibt fair)
+    """
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+class SignalRateLimiter:
+    """
+    Rate Limits für den Signal-Versand einer Absendernummer
+
+    Ein Token Bucket für den Absender und je einer pro Empfänger (LRU,
+    höchstens `max_recipients`) begrenzen die Senderate. Meldet die Signal
+    API trotzdem ein Rate Limit, hält pause() den gesamten Versand der
+    Nummer für die Retry-After-Dauer an.
+    """
+
+    def __init__(self, rate=SIGNAL_RATE_LIMIT, burst=SIGNAL_RATE_BURST,
+                 recipient_rate=SIGNAL_RECIPIENT_RATE_LIMIT, recipient_burst=SIGNAL_RECIPIENT_RATE_BURST,
+                 max_recipients=ROUTING_MAX_ENTRIES):
+        self.bucket = TokenBucket(rate, burst)
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.max_recipients = max(1, max_recipients)
+        self.recipient_buckets = OrderedDict()
+        self.paused_until = 0.0
+
+        self.acquired = 0
+        self.delayed = 0
+        self.pauses = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def acquire(self, recipient: Optional[str] = None) -> float:
+        """Wartet, bis Absender und Empfänger senden dürfen; gibt die Wartezeit zurück"""
+        started = now = time.monotonic()
+        wait = self.bucket.reserve(now)
+        if recipient and self.recipient_rate > 0:
+            wait = max(wait, self._recipient_bucket(recipient).reserve(now))
+        while True:
+            # Eine Pause kann auch während des Wartens beginnen
+            wait = max(wait, self.paused_until - now)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+            now = time.monotonic()
+            wait = 0.0
+
+        waited = now - started
+        self.acquired += 1
+        if waited > 0:
+            self.delayed += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return waited
+
+    def pause(self, seconds: float):
+        """Hält den Versand für `seconds` an (verlängert eine laufende Pause)"""
+        self.pauses += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self):
+        return {
+            "recipients": len(self.recipient_buckets),
+            "acquired": self.acquired,
+            "delayed": self.delayed,
+            "pauses": self.pauses,
+            "paused_seconds": max(0.0, self.paused_until - time.monotonic()),
+            "wait_avg_ms": (self.wait_total / self.delayed * 1000) if self.delayed else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+    def _recipient_bucket(self, recipient: str):
+        bucket = self.recipient_buckets.get(recipient)
+        if bucket is None:
+            bucket = self.recipient_buckets[recipient] = TokenBucket(self.recipient_rate, self.recipient_burst)
+            while len(self.recipient_buckets) > self.max_recipients:
+                self.recipient_buckets.popitem(last=False)
+        else:
+            self.recipient_buckets.move_to_end(recipient)
+        return bucket
+
+# Absendernummer -> SignalRateLimiter (mehrere Konten können eine Nummer teilen)
+_signal_rate_limiters = {}
+
+def get_signal_rate_limiter(send_number: str):
+    limiter = _signal_rate_limiters.get(send_number)
+    if limiter is None:
+        limiter = _signal_rate_limiters[send_number] = SignalRateLimiter()
+    return limiter
+
+def parse_retry_after(value: Optional[str], default=SIGNAL_RETRY_AFTER_DEFAULT, limit=SIGNAL_RETRY_AFTER_MAX):
+    """Retry-After in Sekunden (Zahl oder HTTP-Datum), begrenzt auf `limit`"""
+    delay = default
+    if value:
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = (email.utils.parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                pass
+    return min(max(0.0, delay), limit)
+
+def is_permanent_signal_error(response):
+    """4xx außer Rate Limits: ein erneuter Versuch ändert nichts (z.B. ungültiger Empfänger)"""
+    return 400 <= response.status_code < 500 and response.status_code not in SIGNAL_RATE_LIMIT_STATUS
+
+async def post_to_signal(account: SignalAccount, recipient_number: str, build_request):
+    """
+    POST an /v2/send unter den Rate Limits der Absendernummer
+
+    Bei 429/413 wird der Versand für Retry-After pausiert und bis zu
+    SIGNAL_RATE_LIMIT_RETRIES mal wiederholt; danach (oder bei anderen
+    Statuscodes) geht die Antwort an den Aufrufer. `build_request` liefert
+    pro Versuch die Argumente für client.post().
+    """
+    limiter = account.rate_limiter
+    client = get_signal_http_client()
+    attempt = 0
+    while True:
+        account.metrics.rate_limit_wait.observe(await limiter.acquire(recipient_number))
+        started = time.monotonic()
+        response = await client.post(account.signal_api_url, **build_request())
+        account.metrics.signal_http.observe(time.monotonic() - started)
+        if response.status_code not in SIGNAL_RATE_LIMIT_STATUS:
+            return response
+        account.metrics.rate_limited += 1
+        if attempt >= SIGNAL_RATE_LIMIT_RETRIES:
+            return response
+        attempt += 1
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        limiter.pause(delay)
+        log_event(
+            log_signal, logging.WARNING, f"🚦 [Signal] Rate Limit ({response.status_code}), neuer Versuch in {delay:.1f}s",
+            hot=True, recipient=redact_number(recipient_number), attempt=attempt
+        )
+
+# ======================================
+# MEDIEN
+# ======================================
+
+# Header-Typen für Anhänge (beide Richtungen), Payloads sind Binärframes
+MEDIA_HEADER_TYPES = ("image", "audio", "video", "file")
+
+# Begrenzt gleichzeitige Downloads bei signal-cli (wird bei Bedarf erstellt)
+media_download_slots: Optional[asyncio.Semaphore] = None
+
+def get_media_download_slots():
+    global media_download_slots
+    if media_download_slots is None:
+        media_download_slots = asyncio.Semaphore(max(1, MEDIA_DOWNLOAD_CONCURRENCY))
+    return media_download_slots
+
+def media_type(content_type: Optional[str]):
+    """Header-Typ zu einem MIME-Typ (image/audio/video, sonst file)"""
+    kind = (content_type or "").split("/", 1)[0]
+    return kind if kind in MEDIA_HEADER_TYPES else "file"
+
+def build_media_header(header: dict, media_id: str, attachment: SignalAttachment):
+    """IoT-Header für einen Signal-Anhang, abgeleitet vom Header der Nachricht"""
+    metadata = dict(header["metadata"], mimeType=attachment.content_type, signalMessageId=header["id"])
+    if attachment.filename:
+        metadata["filename"] = attachment.filename
+    if attachment.size is not None:
+        metadata["size"] = attachment.size
+    return dict(header, id=media_id, type=media_type(attachment.content_type), metadata=metadata)
+
+class MediaUpload:
+    """
+    Binärausgabe des IoT Orchestrators, die gerade empfangen wird
+
+    Die Chunks landen in einem SpooledTemporaryFile: bis MEDIA_SPOOL_MEMORY
+    im Arbeitsspeicher, darüber in einer temporären Datei. Dateiname,
+    MIME-Typ und Bildunterschrift kommen aus den Header-Metadaten
+    (filename, mimeType, caption).
+    """
+    __slots__ = ("session_id", "header", "spool", "size", "started", "rejected")
+
+    def __init__(self, session_id: str, header: dict):
+        self.session_id = session_id
+        self.header = header
+        self.spool = tempfile.SpooledTemporaryFile(max_size=MEDIA_SPOOL_MEMORY)
+        self.size = 0
+        self.started = time.monotonic()
+        self.rejected = False
+
+    def write(self, chunk) -> bool:
+        """Hängt einen Chunk an; False, wenn MEDIA_MAX_BYTES überschritten würde"""
+        if self.size + len(chunk) > MEDIA_MAX_BYTES:
+            return False
+        self.spool.write(chunk)
+        self.size += len(chunk)
+        return True
+
+    def update(self, header: dict):
+        """Übernimmt Felder und Metadaten eines späteren (finalen) Headers"""
+        metadata = dict(self.header.get('metadata') or {})
+        metadata.update(header.get('metadata') or {})
+        self.header = dict(self.header)
+        self.header.update(header)
+        self.header['metadata'] = metadata
+
+    @property
+    def metadata(self):
+        return self.header.get('metadata') or {}
+
+    @property
+    def content_type(self):
+        content_type = self.metadata.get('mimeType') or mimetypes.guess_type(self.metadata.get('filename') or "")[0]
+        return (content_type or "application/octet-stream").split(";", 1)[0].strip()
+
+    @property
+    def filename(self):
+        filename = self.metadata.get('filename')
+        if not filename:
+            filename = self.session_id + (mimetypes.guess_extension(self.content_type) or "")
+        # Trennzeichen der Data-URI (;,) und Pfade vermeiden
+        return re.sub(r'[^\w.\-]', '_', os.path.basename(filename))
+
+    @property
+    def caption(self):
+        caption = self.metadata.get('caption')
+        return caption if isinstance(caption, str) else ""
+
+    def data_uri_prefix(self):
+        """Anfang des base64_attachments-Eintrags für signal-cli-rest-api"""
+        return f"data:{self.content_type};filename={self.filename};base64,"
+
+    def iter_base64(self, block_size: int = MEDIA_CHUNK_SIZE):
+        """Base64 des Inhalts blockweise (Blöcke durch 3 teilbar, daher ohne Padding dazwischen)"""
+        block_size = max(3, block_size - block_size % 3)
+        self.spool.seek(0)
+        while True:
+            data = self.spool.read(block_size)
+            if not data:
+                return
+            yield base64.b64encode(data)
+
+    def base64_length(self):
+        return 4 * ((self.size + 2) // 3)
+
+    def close(self):
+        self.spool.close()
+
+async def send_signal_attachment(account: SignalAccount, upload: MediaUpload, recipient: Optional[str] = None):
+    """
+    Sendet einen Anhang über die Signal REST API (base64_attachments)
+
+    Der JSON-Body wird gestreamt: vor und hinter dem Anhang steht fertiges
+    JSON, dazwischen wird der Spool blockweise Base64-kodiert. Weder die
+    Datei noch ihre Base64-Form liegen damit komplett im Speicher.
+    """
+    recipient_number = recipient or account.recipient_number
+    try:
+        marker = f"attachment-{uuid.uuid4().hex}"
+        body = json_codec.dumps({
+            "message": upload.caption,
+            "number": account.send_number,
+            "recipients": [recipient_number],
+            "base64_attachments": [marker],
+        })
+        head, _, tail = body.partition(json_codec.dumps(marker))
+        head = (head + json_codec.dumps(upload.data_uri_prefix())[:-1]).encode('utf-8')
+        tail = ('"' + tail).encode('utf-8')
+
+        async def stream_body():
+            yield head
+            for block in upload.iter_base64():
+                yield block
+            yield tail
+
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(head) + upload.base64_length() + len(tail)),
+        }
+        # Pro Versuch ein neuer Body-Stream (liest den Spool von vorn)
+        response = await post_to_signal(account, recipient_number, lambda: {
+            "content": stream_body(), "headers": headers, "timeout": MEDIA_HTTP_TIMEOUT,
+        })
+        if is_permanent_signal_error(response):
+            account.metrics.signal_failed += 1
+            account.metrics.media_rejected["iot_to_signal"] += 1
+            log_signal.error(f"❌ [Signal] Anhang {upload.session_id} abgelehnt ({response.status_code})")
+            return None
+        response.raise_for_status()
+        account.metrics.signal_sent += 1
+        account.metrics.media_transferred("iot_to_signal", upload.size, time.monotonic() - upload.started)
+        log_event(
+            log_signal, logging.INFO, "📎 [Signal] Anhang gesendet", hot=True,
+            recipient=redact_number(recipient_number), id=upload.session_id,
+            type=upload.content_type, size=upload.size
+        )
+        return True
+    except Exception as e:
+        account.metrics.signal_failed += 1
+        account.metrics.media_failed["iot_to_signal"] += 1
+        log_signal.error(f"❌ [Signal] Fehler beim Senden des Anhangs {upload.session_id}: {e}")
+        return False
+
+# ======================================
+# PERSISTENTE OUTBOX
+# ======================================
+
+class Outbox:
+    """
+    Absturzsichere Outbox für Signal-Versand und IoT-Weiterleitung (SQLite im WAL-Modus)
+
+    Jede ausgehende Nachricht wird unter Kanal und ID (session_id bzw.
+    Header-'id') eingetragen und nach erfolgreicher Zustellung bestätigt.
+    Unbestätigte Einträge werden nach Reconnect oder Neustart erneut gesendet
+    (at-least-once). Bereits bekannte IDs eines Kanals werden verworfen
+    (Deduplizierung); eine Antwort darf die ID der Eingabe tragen. Fehlversuche
+    werden pro Eintrag gezählt (fail()), damit der Aufrufer nach
+    OUTBOX_MAX_ATTEMPTS aufgeben kann.
+
+    Schreibzugriffe laufen gesammelt in einem eigenen Thread: alle Einträge
+    eines Flush-Intervalls landen in einer Transaktion (Group Commit, ein fsync
+    pro Batch statt pro Nachricht), die Event-Loop wird nie blockiert.
+    Zugestellte Einträge älter als `retention` werden im Speicher vorne
+    abgeräumt (Bestätigungsreihenfolge) und alle `prune_interval` Sekunden
+    aus der Datenbank gelöscht.
+    """
+
+    # Sekunden zwischen zwei DELETE der abgelaufenen Einträge
+    prune_interval = 60.0
+
+    def __init__(self, path, flush_interval_ms=OUTBOX_FLUSH_INTERVAL_MS,
+                 batch_size=OUTBOX_BATCH_SIZE, retention=OUTBOX_RETENTION):
+        self.path = path
+        self.flush_interval = max(0, flush_interval_ms) / 1000.0
+        self.batch_size = max(1, batch_size)
+        self.retention = retention
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+
+        # Offene Einträge: (channel, id) -> payload, in Einfügereihenfolge
+        self.pending = {}
+        # Zugestellte IDs zur Deduplizierung: (channel, id) -> Zeitpunkt der Zustellung,
+        # in Bestätigungsreihenfolge (älteste vorne)
+        self.delivered = OrderedDict()
+        # Fehlversuche offener Einträge: (channel, id) -> Anzahl
+        self.attempts = {}
+
+        self.adds = []
+        self.acks = []
+        self.failures = []
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.flush_task = None
+
+        self.batches = 0
+        self.records_written = 0
+        self.duplicates = 0
+        self.last_prune = time.monotonic()
+
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self._migrate()
+        self.db.execute(self.SCHEMA.format(table="outbox"))
+        self._load()
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS {table} ("
+        " id TEXT NOT NULL,"
+        " channel TEXT NOT NULL,"
+        " payload TEXT NOT NULL,"
+        " created REAL NOT NULL,"
+        " delivered REAL,"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " PRIMARY KEY (channel, id))"
+    )
+
+    def _migrate(self):
+        """
+        Datenbanken älterer Versionen (Primärschlüssel nur id, ohne
+        Versuchszähler) in das aktuelle Schema kopieren
+        """
+        columns = {row[1]: row[5] for row in self.db.execute("PRAGMA table_info(outbox)")}
+        if not columns or (columns.get("channel") and columns.get("id")):
+            return
+        attempts = "attempts" if "attempts" in columns else "0"
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute(self.SCHEMA.format(table="outbox_migrate"))
+            self.db.execute(
+                "INSERT OR IGNORE INTO outbox_migrate (id, channel, payload, created, delivered, attempts)"
+                f" SELECT id, channel, payload, created, delivered, {attempts} FROM outbox"
+            )
+            self.db.execute("DROP TABLE outbox")
+            self.db.execute("ALTER TABLE outbox_migrate RENAME TO outbox")
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _load(self):
+        cutoff = time.time() - self.retention
+        self.db.execute("DELETE FROM outbox WHERE delivered IS NOT NULL AND delivered < ?", (cutoff,))
+        rows = self.db.execute(
+            "SELECT id, channel, payload, attempts FROM outbox WHERE delivered IS NULL ORDER BY created"
+        ).fetchall()
+        for message_id, channel, payload, attempts in rows:
+            key = (channel, message_id)
+            self.pending[key] = json_codec.loads(payload)
+            if attempts:
+                self.attempts[key] = attempts
+        rows = self.db.execute(
+            "SELECT id, channel, delivered FROM outbox WHERE delivered IS NOT NULL ORDER BY delivered"
+        ).fetchall()
+        for message_id, channel, delivered in rows:
+            self.delivered[(channel, message_id)] = delivered
+
+    def start(self):
+        """Startet den Group-Commit-Task"""
+        self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Schreibt ausstehende Einträge und schließt die Datenbank"""
+        if self.flush_task:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+            self.flush_task = None
+        await self.flush()
+        self.executor.shutdown(wait=True)
+        self.db.close()
+
+    def add(self, channel: str, message_id: str, payload: dict):
+        """
+        Trägt eine ausgehende Nachricht ein. False, wenn die ID im Kanal bereits bekannt ist.
+        """
+        key = (channel, message_id)
+        if key in self.pending or key in self.delivered:
+            self.duplicates += 1
+            return False
+        self.pending[key] = payload
+        self.adds.append((message_id, channel, json_codec.dumps(payload), time.time()))
+        self.wakeup.set()
+        return True
+
+    def ack(self, channel: str, message_id: str):
+        """Markiert eine Nachricht als zugestellt"""
+        key = (channel, message_id)
+        if self.pending.pop(key, None) is None:
+            return
+        self.attempts.pop(key, None)
+        now = time.time()
+        self.delivered[key] = now
+        self.acks.append((now, channel, message_id))
+        self.wakeup.set()
+
+    def fail(self, channel: str, message_id: str):
+        """Zählt einen fehlgeschlagenen Zustellversuch; gibt die bisherige Anzahl zurück"""
+        key = (channel, message_id)
+        if key not in self.pending:
+            return 0
+        attempts = self.attempts[key] = self.attempts.get(key, 0) + 1
+        self.failures.append(key)
+        self.wakeup.set()
+        return attempts
+
+    def pending_items(self, channel: str):
+        """Alle unbestätigten Einträge eines Kanals ('signal' oder 'iot')"""
+        return [(message_id, payload) for (ch, message_id), payload in self.pending.items() if ch == channel]
+
+    def stats(self):
+        """Aktuelle Outbox-Metriken"""
+        return {
+            "pending": len(self.pending),
+            "delivered": len(self.delivered),
+            "duplicates": self.duplicates,
+            "batches": self.batches,
+            "avg_batch": (self.records_written / self.batches) if self.batches else 0.0,
+        }
+
+    async def flush(self):
+        """Schreibt alle gesammelten Einträge in einer Transaktion"""
+        async with self.flush_lock:
+            if not self.adds and not self.acks and not self.failures:
+                return
+            adds, self.adds = self.adds, []
+            acks, self.acks = self.acks, []
+            failures, self.failures = self.failures, []
+            prune_before = time.time() - self.retention
+            delivered = self.delivered
+            while delivered and next(iter(delivered.values())) < prune_before:
+                delivered.popitem(last=False)
+            # Das DELETE durchsucht alle aufbewahrten Zeilen, daher nicht bei jedem Batch
+            now = time.monotonic()
+            if now - self.last_prune >= self.prune_interval:
+                self.last_prune = now
+            else:
+                prune_before = None
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self._write_batch, adds, acks, failures, prune_before)
+            self.batches += 1
+            self.records_written += len(adds) + len(acks) + len(failures)
+
+    def _write_batch(self, adds, acks, failures, prune_before):
+        # Läuft im Outbox-Thread: eine Transaktion = ein fsync
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if adds:
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO outbox (id, channel, payload, created) VALUES (?, ?, ?, ?)", adds
+                )
+            if failures:
+                self.db.executemany("UPDATE outbox SET attempts = attempts + 1 WHERE channel = ? AND id = ?", failures)
+            if acks:
+                self.db.executemany("UPDATE outbox SET delivered = ? WHERE channel = ? AND id = ?", acks)
+            if prune_before is not None:
+                self.db.execute("DELETE FROM outbox WHERE delivered IS NOT NULL AND delivered < ?", (prune_before,))
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    async def _flush_loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            # Weitere Einträge sammeln, solange der Batch nicht voll ist
+            if len(self.adds) + len(self.acks) + len(self.failures) < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                log_outbox.error(f"❌ [Outbox] Schreiben fehlgeschlagen: {e}")
+
+def new_message_id(prefix: str):
+    """Erzeugt eine eindeutige Nachrichten-ID, wenn keine vorhanden ist"""
+    return f"{prefix}_{uuid.uuid4().hex}"
+
+# ======================================
+# SIGNAL SENDE-QUEUE
+# ======================================
+
+SEND_OVERFLOW_POLICIES = ("block", "drop-oldest", "spill")
+# Antworten auf Signal-Nachrichten vor Benachrichtigungen
+SEND_PRIORITIES = ("interactive", "bulk")
+
+def send_priority(header: dict, recipient: Optional[str] = None):
+    """
+    Sende-Priorität einer IoT-Ausgabe: explizit über metadata.priority,
+    sonst "interactive" für Antworten (Empfänger aus dem Antwort-Routing)
+    und "bulk" für alles an den Standard- oder einen festen Empfänger
+    """
+    metadata = (header or {}).get('metadata') or {}
+    priority = metadata.get('priority')
+    if priority in SEND_PRIORITIES:
+        return priority
+    return "interactive" if recipient and not metadata.get('signalRecipient') else "bulk"
+
+class SignalSendJob:
+    """Eine ausstehende Signal-Nachricht in der Sende-Queue"""
+    __slots__ = ("message", "recipient", "message_ids", "enqueued_at", "created_at", "stream_started",
+                 "attachment", "priority")
+
+    def __init__(self, message: str, recipient: Optional[str] = None,
+                 message_ids=(), enqueued_at: Optional[float] = None,
+                 created_at: Optional[float] = None, attachment=None, priority: str = "interactive",
+                 stream_started: Optional[float] = None):
+        self.message = message
+        self.recipient = recipient
+        # Outbox-IDs, die mit dieser Nachricht zugestellt sind (mehrere bei Coalescing)
+        self.message_ids = tuple(message_ids)
+        self.enqueued_at = enqueued_at if enqueued_at is not None else time.monotonic()
+        # Zeitpunkt von queue_signal_message() für die IoT->Signal-Latenz (fehlt bei Wiederholungen)
+        self.created_at = created_at
+        # Beginn der gestreamten Ausgabe, nur beim ersten Teil einer Sitzung gesetzt
+        self.stream_started = stream_started
+        # MediaUpload mit Anhang (wird nach dem Versand geschlossen)
+        self.attachment = attachment
+        self.priority = priority if priority in SEND_PRIORITIES else "bulk"
+
+class SendLanes:
+    """Eine FIFO-Spur pro Priorität; len() und Iteration über alle Spuren"""
+
+    def __init__(self):
+        self.lanes = {priority: deque() for priority in SEND_PRIORITIES}
+
+    def __len__(self):
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def __iter__(self):
+        for lane in self.lanes.values():
+            yield from lane
+
+class SignalPriorityQueue(asyncio.Queue):
+    """
+    asyncio.Queue mit Prioritäten (über die Hooks _init/_put/_get wie
+    asyncio.PriorityQueue)
+
+    "interactive" wird vor "bulk" ausgeliefert. Damit Benachrichtigungen
+    unter Dauerlast nicht verhungern, kommt nach `bulk_every` Antworten in
+    Folge eine wartende bulk-Nachricht dran.
+    """
+
+    def __init__(self, maxsize=0, bulk_every=SIGNAL_SEND_BULK_EVERY):
+        self.bulk_every = max(1, bulk_every)
+        self.streak = 0
+        self.take_lowest = False
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue = SendLanes()
+
+    def _put(self, job):
+        self._queue.lanes[job.priority].append(job)
+
+    def _get(self):
+        interactive = self._queue.lanes["interactive"]
+        bulk = self._queue.lanes["bulk"]
+        if self.take_lowest:
+            return (bulk or interactive).popleft()
+        if interactive and not (bulk and self.streak >= self.bulk_every):
+            self.streak += 1
+            return interactive.popleft()
+        self.streak = 0
+        return bulk.popleft()
+
+    def get_lowest_nowait(self):
+        """Älteste Nachricht der niedrigsten Priorität (für drop-oldest)"""
+        self.take_lowest = True
+        try:
+            return self.get_nowait()
+        finally:
+            self.take_lowest = False
+
+    def depth(self, priority: str):
+        return len(self._queue.lanes[priority])
+
+class SpillFile:
+    """
+    Auslagerungsdatei der Sende-Queue (eine JSON-Zeile pro Nachricht)
+
+    Angehängt wird am Ende, gelesen ab einem Offset, der in `<datei>.offset`
+    gespeichert wird (nach einem Neustart wird nichts doppelt nachgeladen).
+    Ist alles gelesen, wird die Datei geleert. Die Methoden sind blockierend
+    und laufen im Thread der Sende-Queue.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = path + ".offset"
+        self.offset = self._read_offset()
+
+    def append(self, lines):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    def count(self):
+        """Noch nicht gelesene Einträge"""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                return sum(1 for line in f if line.strip())
+        except OSError:
+            return 0
+
+    def read(self, max_lines: int):
+        """Bis zu `max_lines` Einträge ab dem Offset; gibt (Zeilen, noch offen) zurück"""
+        lines = []
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                while len(lines) < max_lines:
+                    line = f.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        lines.append(line.decode("utf-8"))
+                offset = f.tell()
+                more = bool(f.readline())
+        except OSError:
+            return lines, False
+        if more:
+            self._write_offset(offset)
+        else:
+            self._clear()
+        return lines, more
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_offset(self, offset):
+        self.offset = offset
+        temp_path = self.offset_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+        os.replace(temp_path, self.offset_path)
+
+    def _clear(self):
+        self.offset = 0
+        for path in (self.path, self.offset_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class SignalSendQueue:
+    """
+    Begrenzte Sende-Queue mit Worker-Pool für die Signal REST API
+
+    receive_iot_messages() legt Nachrichten nur noch ab, die Worker senden sie.
+    Ist die Queue voll, greift die Overflow-Policy:
+    - block:       Produzent wartet, bis wieder Platz ist (Backpressure)
+    - drop-oldest: älteste Nachricht wird verworfen
+    - spill:       Nachricht wird in eine Datei ausgelagert und später nachgeladen
+
+    Die Reihenfolge pro Empfänger bleibt erhalten (ein Lock pro Empfänger),
+    innerhalb einer Priorität auch über die Queue (siehe SignalPriorityQueue).
+    Nachrichten mit Anhang werden nie ausgelagert (bei 'spill' wird gewartet).
+    Dateizugriffe der Auslagerung laufen in einem eigenen Thread, die
+    Event-Loop (und damit der IoT-Empfang) wartet nie auf die Platte.
+    """
+
+    def __init__(self, account, maxsize=SIGNAL_SEND_QUEUE_SIZE, workers=SIGNAL_SEND_WORKERS,
+                 overflow=SIGNAL_SEND_OVERFLOW, spill_file=None):
+        if overflow not in SEND_OVERFLOW_POLICIES:
+            log_signal.warning(f"⚠️  [Signal] Unbekannte Overflow-Policy '{overflow}' - nutze 'block'")
+            overflow = "block"
+        self.account = account
+        self.queue = SignalPriorityQueue(maxsize=max(1, maxsize))
+        self.worker_count = max(1, workers)
+        self.overflow = overflow
+        self.spill_file = spill_file or account.spill_file
+        self.spill = SpillFile(self.spill_file)
+        # Ein Thread: Anhängen und Nachladen laufen in Aufrufreihenfolge
+        self.spill_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="spill")
+        self.reload_task = None
+        # Anzahl Auslagerungen seit dem Start (trennt sie von laufenden Lesevorgängen)
+        self.spill_appends = 0
+        # Noch nicht geschriebene Zeilen: (zeile, job)
+        self.spill_buffer = []
+        self.workers = []
+        self.recipient_locks = {}
+        # IDs aller Nachrichten in Queue/Spill/Versand (für Outbox-Replay)
+        self.inflight = set()
+
+        # Backpressure-Metriken
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_count = 0
+
+        # Nach einem Absturz liegengebliebene Nachrichten wieder einplanen
+        self.spill_pending = self.spill.count() if overflow == "spill" else 0
+
+    def start(self):
+        """Startet die Worker-Tasks"""
+        for index in range(self.worker_count):
+            self.workers.append(asyncio.create_task(self._worker(index)))
+        if self.spill_pending:
+            log_signal.info(f"📦 [Signal] {self.spill_pending} ausgelagerte Nachrichten werden nachgeladen")
+            self._reload_spilled()
+
+    async def stop(self, drain_timeout=SIGNAL_SEND_DRAIN_TIMEOUT):
+        """Wartet (begrenzt) auf das Leeren der Queue und beendet die Worker"""
+        if drain_timeout > 0 and not self.queue.empty():
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                log_signal.warning(f"⚠️  [Signal] Sende-Queue nicht geleert, {self.queue.qsize()} Nachrichten offen")
+        for worker in self.workers:
+            worker.cancel()
+        if self.reload_task is not None:
+            self.reload_task.cancel()
+        await asyncio.gather(*self.workers, *([self.reload_task] if self.reload_task else []),
+                             return_exceptions=True)
+        self.workers = []
+        self.reload_task = None
+        # Ausstehende Schreibzugriffe abschließen
+        self._write_spill_buffer()
+        await asyncio.get_running_loop().run_in_executor(self.spill_executor, lambda: None)
+        self.spill_executor.shutdown(wait=False)
+
+    async def put(self, message: str, recipient: Optional[str] = None, message_ids=(),
+                  created_at: Optional[float] = None, attachment=None, priority: str = "interactive",
+                  stream_started: Optional[float] = None):
+        """
+        Legt eine Nachricht in die Queue (blockiert nur bei Policy 'block')
+        """
+        job = SignalSendJob(message, recipient, message_ids, created_at=created_at,
+                            attachment=attachment, priority=priority, stream_started=stream_started)
+        self.inflight.update(job.message_ids)
+
+        # Solange ausgelagerte Nachrichten existieren, hinten anstellen (Reihenfolge)
+        if self.overflow == "spill" and self.spill_pending and attachment is None:
+            self._spill(job)
+            return True
+
+        if self.queue.full():
+            if self.overflow == "drop-oldest":
+                try:
+                    dropped_job = self.queue.get_lowest_nowait()
+                    self.queue.task_done()
+                    self.dropped += 1
+                    self._forget(dropped_job)
+                    log_event(log_signal, logging.WARNING, "⚠️  [Signal] Sende-Queue voll, älteste Nachricht verworfen", hot=True)
+                except asyncio.QueueEmpty:
+                    pass
+            elif self.overflow == "spill" and attachment is None:
+                self._spill(job)
+                return True
+
+        await self.queue.put(job)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def stats(self):
+        """Aktuelle Backpressure-Metriken"""
+        return {
+            "depth": self.queue.qsize(),
+            "depth_interactive": self.queue.depth("interactive"),
+            "depth_bulk": self.queue.depth("bulk"),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "spill_pending": self.spill_pending,
+            "wait_avg_ms": (self.wait_total / self.wait_count * 1000) if self.wait_count else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+    async def _worker(self, index):
+        while True:
+            job = await self.queue.get()
+            try:
+                wait = time.monotonic() - job.enqueued_at
+                self.wait_total += wait
+                self.wait_count += 1
+                self.wait_max = max(self.wait_max, wait)
+                self.account.metrics.send_wait[job.priority].observe(wait)
+
+                # Ein Lock pro Empfänger erhält die Reihenfolge [lock, nutzer]
+                lock_key = job.recipient or self.account.recipient_number
+                entry = self.recipient_locks.get(lock_key)
+                if entry is None:
+                    entry = self.recipient_locks[lock_key] = [asyncio.Lock(), 0]
+                entry[1] += 1
+                try:
+                    async with entry[0]:
+                        if job.attachment is not None:
+                            sent = await send_signal_attachment(self.account, job.attachment, job.recipient)
+                        else:
+                            sent = await send_signal_message(self.account, job.message, job.recipient)
+                        if sent:
+                            self.sent += 1
+                            if job.created_at is not None:
+                                self.account.metrics.iot_to_signal.observe(time.monotonic() - job.created_at)
+                            if job.stream_started is not None:
+                                record_first_send(self.account, job.stream_started)
+                            if self.account.outbox is not None:
+                                for message_id in job.message_ids:
+                                    self.account.outbox.ack("signal", message_id)
+                        else:
+                            # Bleibt in der Outbox und wird später erneut versucht (außer abgelehnt/zu oft versucht)
+                            self.failed += 1
+                            record_signal_failure(self.account, job.message_ids, permanent=sent is None)
+                finally:
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self.recipient_locks[lock_key]
+            except Exception as e:
+                self.failed += 1
+                log_signal.error(f"❌ [Signal] Worker {index} Fehler: {e}")
+            finally:
+                self.inflight.difference_update(job.message_ids)
+                if job.attachment is not None:
+                    job.attachment.close()
+                self.queue.task_done()
+
+            if self.spill_pending and self.queue.qsize() < self.queue.maxsize // 2:
+                self._reload_spilled()
+
+    def _spill(self, job):
+        line = json_codec.dumps({
+            "message": job.message,
+            "recipient": job.recipient,
+            "ids": job.message_ids,
+            "priority": job.priority
+        }) + "\n"
+        self.spilled += 1
+        self.spill_pending += 1
+        self.spill_appends += 1
+        # Gesammelt in einem Schreibzugriff pro Durchlauf der Event-Loop
+        if not self.spill_buffer:
+            asyncio.get_running_loop().call_soon(self._write_spill_buffer)
+        self.spill_buffer.append((line, job))
+
+    def _write_spill_buffer(self):
+        batch, self.spill_buffer = self.spill_buffer, []
+        if not batch:
+            return
+        future = asyncio.get_running_loop().run_in_executor(
+            self.spill_executor, self.spill.append, [line for line, _ in batch]
+        )
+        future.add_done_callback(lambda done: self._spill_written(done, batch))
+
+    def _spill_written(self, future, batch):
+        if future.cancelled() or future.exception() is None:
+            return
+        # Bleibt in der Outbox (falls aktiv) und wird von dort erneut versucht
+        self.spill_pending = max(0, self.spill_pending - len(batch))
+        self.dropped += len(batch)
+        for _, job in batch:
+            self.inflight.difference_update(job.message_ids)
+        log_signal.error(f"❌ [Signal] Auslagern fehlgeschlagen, {len(batch)} Nachrichten verworfen: {future.exception()}")
+
+    def _forget(self, job):
+        """Bewusst verworfene Nachricht auch aus der Outbox austragen"""
+        self.inflight.difference_update(job.message_ids)
+        if job.attachment is not None:
+            job.attachment.close()
+        if self.account.outbox is not None:
+            for message_id in job.message_ids:
+                self.account.outbox.ack("signal", message_id)
+
+    def _reload_spilled(self):
+        """Lädt ausgelagerte Nachrichten im Hintergrund zurück, soweit Platz in der Queue ist"""
+        if self.reload_task is None or self.reload_task.done():
+            self.reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        loop = asyncio.get_running_loop()
+        free = max(1, self.queue.maxsize - self.queue.qsize())
+        # Gesammelte Zeilen vor dem Lesen schreiben (gleicher Thread, in Reihenfolge)
+        self._write_spill_buffer()
+        appends = self.spill_appends
+        try:
+            lines, more = await loop.run_in_executor(self.spill_executor, self.spill.read, free)
+        except OSError as e:
+            log_signal.warning(f"⚠️  [Signal] Spill-Datei konnte nicht gelesen werden: {e}")
+            return
+
+        for line in lines:
+            try:
+                entry = json_codec.loads(line)
+            except json_codec.decode_errors:
+                continue
+            job = SignalSendJob(entry.get("message", ""), entry.get("recipient"), entry.get("ids") or (),
+                                priority=entry.get("priority", "interactive"))
+            self.inflight.update(job.message_ids)
+            # Anhänge können den Platz inzwischen belegt haben
+            await self.queue.put(job)
+            self.enqueued += 1
+        if more:
+            self.spill_pending = max(1, self.spill_pending - len(lines))
+        else:
+            # Datei war leer gelesen, offen ist nur, was seitdem ausgelagert wurde
+            self.spill_pending = self.spill_appends - appends
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+def record_signal_failure(account: SignalAccount, message_ids, permanent: bool = False):
+    """
+    Fehlgeschlagener Signal-Versand: dauerhaft abgelehnte Nachrichten und
+    solche nach OUTBOX_MAX_ATTEMPTS Versuchen werden aus der Outbox ausgetragen
+    """
+    if account.outbox is None:
+        return
+    for message_id in message_ids:
+        if permanent:
+            account.outbox.ack("signal", message_id)
+            continue
+        attempts = account.outbox.fail("signal", message_id)
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            account.outbox.ack("signal", message_id)
+            log_outbox.error(f"❌ [Outbox] Nachricht {message_id} nach {attempts} Versuchen aufgegeben")
+
+def record_first_send(account: SignalAccount, stream_started: float):
+    """Erste Nachricht einer gestreamten Ausgabe ist bei Signal angenommen"""
+    elapsed = time.monotonic() - stream_started
+    account.metrics.first_send.observe(elapsed)
+    account.session_buffer.record_first_send(elapsed)
+
+async def queue_signal_message(account: SignalAccount, message: str, recipient: Optional[str] = None,
+                               message_id: Optional[str] = None, priority: str = "interactive",
+                               stream_started: Optional[float] = None):
+    """
+    Übergibt eine Nachricht an die Sende-Queue (ohne laufende Queue: direkter Versand)
+    Mit Outbox wird die Nachricht vorher eingetragen und per ID dedupliziert,
+    mit aktivem Coalescing zuerst im Zeitfenster des Empfängers gesammelt.
+    `stream_started` (erster Teil einer gestreamten Ausgabe) wird erst nach
+    dem Versand als Zeit bis zur ersten Nachricht gemessen.
+    """
+    created_at = time.monotonic()
+    message_ids = ()
+    if account.outbox is not None:
+        message_id = message_id or new_message_id("out")
+        if not account.outbox.add("signal", message_id,
+                                  {"message": message, "recipient": recipient, "priority": priority}):
+            log_outbox.info(f"♻️  [Signal] Nachricht {message_id} bereits bekannt, übersprungen")
+            return False
+        message_ids = (message_id,)
+
+    if account.send_queue is None:
+        sent = await send_signal_message(account, message, recipient)
+        if sent:
+            account.metrics.iot_to_signal.observe(time.monotonic() - created_at)
+            if stream_started is not None:
+                record_first_send(account, stream_started)
+            if account.outbox is not None:
+                account.outbox.ack("signal", message_id)
+            return True
+        record_signal_failure(account, message_ids, permanent=sent is None)
+        return False
+    if account.coalescer is not None:
+        return await account.coalescer.add(message, recipient, message_ids, created_at, priority, stream_started)
+    return await account.send_queue.put(message, recipient, message_ids, created_at, priority=priority,
+                                        stream_started=stream_started)
+
+async def queue_signal_attachment(account: SignalAccount, upload: MediaUpload, recipient: Optional[str] = None,
+                                  priority: str = "interactive"):
+    """
+    Übergibt einen Anhang an die Sende-Queue (ohne laufende Queue: direkter Versand)
+    Anhänge laufen weder über die Outbox noch über Coalescing; der Spool wird
+    nach dem Versand geschlossen.
+    """
+    created_at = time.monotonic()
+    if account.send_queue is None:
+        try:
+            return await send_signal_attachment(account, upload, recipient)
+        finally:
+            upload.close()
+    return await account.send_queue.put(upload.caption, recipient, (), created_at, attachment=upload, priority=priority)
+
+def split_signal_message(text: str, limit: int = SIGNAL_MAX_MESSAGE_LENGTH):
+    """
+    Teilt einen Text in Stücke von höchstens `limit` Zeichen, bevorzugt an
+    Absatz-, Zeilen-, Satz- und Wortgrenzen
+    """
+    if limit <= 0 or len(text) <= limit:
+        return [text]
+
+    parts = []
+    rest = text
+    while len(rest) > limit:
+        window = rest[:limit]
+        cut = -1
+        for boundary in ("\n\n", "\n", ". ", "! ", "? ", " "):
+            index = window.rfind(boundary)
+            # Nicht zu früh schneiden, sonst entstehen viele Mini-Nachrichten
+            if index >= limit // 2:
+                cut = index + len(boundary)
+                break
+        if cut <= 0:
+            cut = limit
+        part = rest[:cut].rstrip()
+        if part:
+            parts.append(part)
+        rest = rest[cut:].lstrip()
+    rest = rest.rstrip()
+    if rest:
+        parts.append(rest)
+    return parts
+
+class SignalCoalescer:
+    """
+    Fasst kurz aufeinanderfolgende Nachrichten an denselben Empfänger zusammen
+
+    Die erste Nachricht öffnet ein Zeitfenster von `window_ms`; alles, was bis
+    dahin für denselben Empfänger eintrifft, wird mit `separator` verbunden und
+    als eine Nachricht versendet. Überschreitet der Puffer `max_chars`, wird
+    sofort gesendet. Zu lange Texte werden an sicheren Grenzen auf
+    `max_length` Zeichen aufgeteilt.
+    """
+
+    def __init__(self, account, window_ms=SIGNAL_COALESCE_WINDOW_MS, max_chars=SIGNAL_COALESCE_MAX_CHARS,
+                 max_length=SIGNAL_MAX_MESSAGE_LENGTH, separator=SIGNAL_COALESCE_SEPARATOR):
+        self.account = account
+        self.window = max(0, window_ms) / 1000.0
+        self.max_chars = max_chars
+        self.max_length = max_length
+        self.separator = separator
+        # Empfänger -> {"recipient", "parts", "ids", "size", "timer", "created_at", "priority", "stream_started"}
+        self.buffers = {}
+
+        self.messages_in = 0
+        self.messages_out = 0
+        self.http_calls = 0
+
+    async def add(self, message: str, recipient: Optional[str] = None, message_ids=(),
+                  created_at: Optional[float] = None, priority: str = "interactive",
+                  stream_started: Optional[float] = None):
+        """Nimmt eine Nachricht ins Zeitfenster des Empfängers auf (Antworten heben das Fenster auf interactive)"""
+        key = recipient or self.account.recipient_number
+        self.messages_in += 1
+
+        buffer = self.buffers.get(key)
+        if buffer and buffer["size"] + len(self.separator) + len(message) > self.max_chars:
+            await self._flush(key)
+            buffer = None
+
+        if buffer is None:
+            buffer = self.buffers[key] = {
+                "recipient": recipient, "parts": [], "ids": [], "size": 0, "timer": None,
+                "created_at": created_at, "priority": priority, "stream_started": None
+            }
+            buffer["timer"] = asyncio.create_task(self._flush_later(key, buffer))
+        else:
+            buffer["size"] += len(self.separator)
+
+        if priority == "interactive":
+            buffer["priority"] = priority
+        if buffer["stream_started"] is None:
+            buffer["stream_started"] = stream_started
+        buffer["parts"].append(message)
+        buffer["ids"].extend(message_ids)
+        buffer["size"] += len(message)
+
+        if buffer["size"] >= self.max_chars:
+            await self._flush(key)
+        return True
+
+    def pending_ids(self):
+        """Outbox-IDs, die gerade im Zeitfenster warten"""
+        return {message_id for buffer in self.buffers.values() for message_id in buffer["ids"]}
+
+    async def close(self):
+        """Sendet alle offenen Zeitfenster sofort"""
+        for key in list(self.buffers):
+            await self._flush(key)
+
+    def stats(self):
+        """Wie viele HTTP-Aufrufe das Zusammenfassen gespart hat"""
+        return {
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "http_calls": self.http_calls,
+            "calls_saved": self.messages_out - self.http_calls,
+            "open_windows": len(self.buffers),
+        }
+
+    async def _flush_later(self, key, buffer):
+        await asyncio.sleep(self.window)
+        if self.buffers.get(key) is buffer:
+            await self._flush(key)
+
+    async def _flush(self, key):
+        buffer = self.buffers.pop(key, None)
+        if buffer is None:
+            return
+        timer = buffer["timer"]
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+        text = self.separator.join(buffer["parts"])
+        parts = split_signal_message(text, self.max_length)
+        self.messages_out += len(buffer["parts"])
+        self.http_calls += len(parts)
+        for index, (part, ids) in enumerate(self._part_entries(buffer, parts)):
+            if ids is None:
+                continue
+            # Die erste Nachricht geht mit dem ersten Teil raus
+            stream_started = buffer["stream_started"] if index == 0 else None
+            await self.account.send_queue.put(part, buffer["recipient"], ids, buffer["created_at"],
+                                              priority=buffer["priority"], stream_started=stream_started)
+
+    def _part_entries(self, buffer, parts):
+        """
+        Outbox-IDs je Teil: ein einzelner Teil trägt alle gesammelten IDs. Wird
+        geteilt, bekommt jeder Teil einen eigenen Eintrag ({erste ID}_c{n}) und
+        die gesammelten Einträge sind damit erledigt, so wird jeder Teil für
+        sich wiederholt. None: Teil bereits bekannt, nicht erneut senden.
+        """
+        ids = buffer["ids"]
+        outbox = self.account.outbox
+        if len(parts) == 1 or outbox is None or not ids:
+            return [(part, tuple(ids) if index == len(parts) - 1 else ()) for index, part in enumerate(parts)]
+
+        entries = []
+        for index, part in enumerate(parts):
+            part_id = f"{ids[0]}_c{index}"
+            payload = {"message": part, "recipient": buffer["recipient"], "priority": buffer["priority"]}
+            entries.append((part, (part_id,) if outbox.add("signal", part_id, payload) else None))
+        # Vor dem ersten await eintragen, damit der Outbox-Retry die Teile nicht doppelt einplant
+        self.account.send_queue.inflight.update(part_ids[0] for _, part_ids in entries if part_ids)
+        for message_id in ids:
+            outbox.ack("signal", message_id)
+        return entries
+
+async def retry_signal_outbox_periodically(account: SignalAccount, interval=OUTBOX_RETRY_INTERVAL):
+    """
+    Plant unbestätigte Signal-Nachrichten aus der Outbox erneut ein
+    (direkt nach dem Start und danach alle `interval` Sekunden)
+    """
+    while True:
+        if account.outbox is not None and account.send_queue is not None:
+            waiting = account.coalescer.pending_ids() if account.coalescer is not None else set()
+            items = [
+                (message_id, payload) for message_id, payload in account.outbox.pending_items("signal")
+                if message_id not in account.send_queue.inflight and message_id not in waiting
+            ]
+            if items:
+                log_outbox.info(f"📦 [Outbox] {len(items)} Signal-Nachrichten werden erneut gesendet")
+            for message_id, payload in items:
+                await account.send_queue.put(payload.get("message", ""), payload.get("recipient"), (message_id,),
+                                             priority=payload.get("priority", "interactive"))
+        await asyncio.sleep(max(1, interval))
+
+async def log_stats_periodically(accounts, interval=STATS_INTERVAL):
+    """
+    Gibt regelmäßig Laufzeit-Statistiken aus
+    """
+    while True:
+        await asyncio.sleep(interval)
+        for account in accounts:
+            log_account_stats(account, prefix=f"{account.device_name}: " if len(accounts) > 1 else "")
+        if hot_path_sampler.suppressed:
+            log_stats.info(f"📊 [Stats] Logging: {hot_path_sampler.suppressed} Einträge pro Nachricht gedrosselt")
+
+def log_account_stats(account: SignalAccount, prefix=""):
+    """
+    Gibt die Statistiken eines Kontos aus
+    """
+    stats = account.session_buffer.stats()
+    if stats["sessions"] or stats["expired"] or stats["evicted"]:
+        log_stats.info(
+            f"📊 [Stats] {prefix}Stream-Puffer: {stats['sessions']} Sitzungen, {stats['bytes'] / 1024:.1f} KiB, "
+            f"{stats['expired']} abgelaufen, {stats['evicted']} verdrängt",
+            extra={"stats": dict(stats, component="session_buffer", account=account.device_name)}
+        )
+    if stats["first_send_count"]:
+        log_stats.info(
+            f"📊 [Stats] {prefix}Stream bis zur ersten Nachricht: Ø {stats['first_send_avg_ms']:.0f}ms / "
+            f"max {stats['first_send_max_ms']:.0f}ms ({stats['first_send_count']} Sitzungen, Modus {SIGNAL_STREAM_MODE})"
+        )
+    if account.iot_demux is not None:
+        stats = account.iot_demux.stats()
+        if stats["pending_headers"] or stats["sessions"] or stats["orphans"] or stats["gaps"]:
+            log_stats.info(
+                f"📊 [Stats] {prefix}IoT-Framing: {stats['pending_headers']} offene Header, "
+                f"{stats['sessions']} Sitzungen in Reihenfolge, {stats['reordered']} umsortiert, "
+                f"{stats['gaps']} Lücken, {stats['orphans']} Payloads ohne Header",
+                extra={"stats": dict(stats, component="iot_framing", account=account.device_name)}
+            )
+    if account.routes is not None:
+        stats = account.routes.stats()
+        log_stats.info(
+            f"📊 [Stats] {prefix}Routing: {stats['entries']} Einträge, {stats['hits']} Treffer, "
+            f"{stats['misses']} Fehlschläge, {stats['evictions']} verdrängt, {stats['expirations']} abgelaufen",
+            extra={"stats": dict(stats, component="routing", account=account.device_name)}
+        )
+    if account.outbox is not None:
+        stats = account.outbox.stats()
+        log_stats.info(
+            f"📊 [Stats] {prefix}Outbox: {stats['pending']} offen, {stats['duplicates']} Duplikate, "
+            f"{stats['batches']} Commits (Ø {stats['avg_batch']:.1f} Einträge)",
+            extra={"stats": dict(stats, component="outbox", account=account.device_name)}
+        )
+    if account.coalescer is not None:
+        stats = account.coalescer.stats()
+        log_stats.info(
+            f"📊 [Stats] {prefix}Coalescing: {stats['messages_out']} Nachrichten in {stats['http_calls']} "
+            f"HTTP-Aufrufen, {stats['calls_saved']} Aufrufe gespart",
+            extra={"stats": dict(stats, component="coalescer", account=account.device_name)}
+        )
+    if account.send_queue is not None:
+        stats = account.send_queue.stats()
+        log_stats.info(
+            f"📊 [Stats] {prefix}Signal-Queue: {stats['depth']} (max {stats['max_depth']}, "
+            f"{stats['depth_interactive']} Antworten / {stats['depth_bulk']} bulk), "
+            f"gesendet {stats['sent']}, Fehler {stats['failed']}, "
+            f"verworfen {stats['dropped']}, ausgelagert {stats['spill_pending']}, "
+            f"Wartezeit Ø {stats['wait_avg_ms']:.1f}ms / max {stats['wait_max_ms']:.1f}ms",
+            extra={"stats": dict(stats, component="send_queue", account=account.device_name)}
+        )
+    stats = account.rate_limiter.stats()
+    if stats["delayed"] or stats["pauses"]:
+        log_stats.info(
+            f"📊 [Stats] {prefix}Rate Limit: {stats['delayed']} von {stats['acquired']} Sendungen verzögert "
+            f"(Ø {stats['wait_avg_ms']:.0f}ms / max {stats['wait_max_ms']:.0f}ms), {stats['pauses']} Pausen (429/413)",
+            extra={"stats": dict(stats, component="rate_limiter", account=account.device_name)}
+        )
+
+# Komponenten, deren stats() zusätzlich exportiert werden
+METRICS_STATS_SOURCES = (
+    ("session_buffer", lambda account: account.session_buffer),
+    ("iot_framing", lambda account: account.iot_demux),
+    ("iot_writer", lambda account: account.iot_writer),
+    ("signal_inbox", lambda account: account.signal_inbox),
+    ("routing", lambda account: account.routes),
+    ("outbox", lambda account: account.outbox),
+    ("coalescer", lambda account: account.coalescer),
+    ("send_queue", lambda account: account.send_queue),
+    ("rate_limiter", lambda account: account.rate_limiter),
+)
+
+# Typ und Beschreibung der stats()-Werte je Komponente; Zähler erhalten das Suffix _total.
+# Nicht aufgeführte Werte werden nicht exportiert.
+METRICS_STATS_FIELDS = {
+    "session_buffer": {
+        "sessions": ("gauge", "Gepufferte Stream-Sitzungen"),
+        "bytes": ("gauge", "Speicher der gepufferten Chunks (Bytes)"),
+        "expired": ("counter", "Stream-Sitzungen nach SESSION_BUFFER_TTL abgelaufen"),
+        "evicted": ("counter", "Stream-Sitzungen wegen Speicher- oder Sitzungsgrenze verdrängt"),
+        "first_send_count": ("counter", "Stream-Sitzungen mit gemessener Zeit bis zur ersten Nachricht"),
+        "first_send_avg_ms": ("gauge", "Durchschnittliche Zeit bis zur ersten Nachricht einer Sitzung (ms)"),
+        "first_send_max_ms": ("gauge", "Längste Zeit bis zur ersten Nachricht einer Sitzung (ms)"),
+    },
+    "iot_framing": {
+        "pending_headers": ("gauge", "IoT-Header, die auf ihren Payload warten"),
+        "sessions": ("gauge", "IoT-Sitzungen mit seq in der Umordnung"),
+        "orphans": ("counter", "IoT-Payloads ohne zugehörigen Header"),
+        "dropped_headers": ("counter", "Verworfene IoT-Header (IOT_MAX_PENDING_HEADERS)"),
+        "reordered": ("counter", "Vorzeitig eingetroffene IoT-Chunks"),
+        "gaps": ("counter", "Übersprungene Lücken und verspätete IoT-Chunks"),
+    },
+    "iot_writer": {
+        "queue": ("gauge", "Nachrichten in der Schreib-Queue der IoT-Verbindung"),
+        "messages": ("counter", "An IoT geschriebene Nachrichten (aktuelle Verbindung)"),
+        "batches": ("counter", "Socket-Writes an IoT (aktuelle Verbindung)"),
+        "avg_batch": ("gauge", "Durchschnittliche Nachrichten pro Socket-Write"),
+        "max_batch": ("gauge", "Größter Socket-Write an IoT (Nachrichten)"),
+    },
+    "signal_inbox": {
+        "depth": ("gauge", "Nachrichten im Signal-Eingangspuffer"),
+        "max_depth": ("gauge", "Höchster Füllstand des Signal-Eingangspuffers"),
+        "received": ("counter", "Im Signal-Eingangspuffer abgelegte Nachrichten"),
+        "dropped": ("counter", "Aus dem vollen Signal-Eingangspuffer verdrängte Nachrichten"),
+    },
+    "routing": {
+        "entries": ("gauge", "Einträge in der Routing-Tabelle"),
+        "hits": ("counter", "Antworten mit Empfänger aus der Routing-Tabelle"),
+        "misses": ("counter", "Antworten ohne Treffer in der Routing-Tabelle"),
+        "evictions": ("counter", "Wegen ROUTING_MAX_ENTRIES verdrängte Routing-Einträge"),
+        "expirations": ("counter", "Nach ROUTING_TTL abgelaufene Routing-Einträge"),
+    },
+    "outbox": {
+        "pending": ("gauge", "Unbestätigte Outbox-Einträge"),
+        "delivered": ("gauge", "Zugestellte IDs im Deduplizierungsfenster"),
+        "duplicates": ("counter", "Als Duplikat erkannte Outbox-Einträge"),
+        "batches": ("counter", "Outbox-Transaktionen (Group Commits)"),
+        "avg_batch": ("gauge", "Durchschnittliche Datensätze pro Outbox-Transaktion"),
+    },
+    "coalescer": {
+        "messages_in": ("counter", "Vom Coalescing angenommene Nachrichten"),
+        "messages_out": ("counter", "Vom Coalescing zusammengefasst gesendete Nachrichten"),
+        "http_calls": ("counter", "HTTP-Aufrufe nach dem Coalescing"),
+        "calls_saved": ("counter", "Durch Coalescing gesparte HTTP-Aufrufe"),
+        "open_windows": ("gauge", "Offene Coalescing-Zeitfenster"),
+    },
+    "send_queue": {
+        "depth": ("gauge", "Nachrichten in der Sende-Queue"),
+        "depth_interactive": ("gauge", "Nachrichten in der Sende-Queue (interactive)"),
+        "depth_bulk": ("gauge", "Nachrichten in der Sende-Queue (bulk)"),
+        "max_depth": ("gauge", "Höchster Füllstand der Sende-Queue"),
+        "enqueued": ("counter", "In die Sende-Queue gelegte Nachrichten"),
+        "sent": ("counter", "Von der Sende-Queue gesendete Nachrichten"),
+        "failed": ("counter", "Fehlgeschlagene Sendeversuche der Sende-Queue"),
+        "dropped": ("counter", "Von der Sende-Queue verworfene Nachrichten"),
+        "spilled": ("counter", "In die Spill-Datei ausgelagerte Nachrichten"),
+        "spill_pending": ("gauge", "Noch ausgelagerte Nachrichten"),
+        "wait_avg_ms": ("gauge", "Durchschnittliche Wartezeit in der Sende-Queue (ms)"),
+        "wait_max_ms": ("gauge", "Längste Wartezeit in der Sende-Queue (ms)"),
+    },
+    "rate_limiter": {
+        "recipients": ("gauge", "Empfänger mit eigenem Token Bucket"),
+        "acquired": ("counter", "Vom Rate Limiter freigegebene Sendungen"),
+        "delayed": ("counter", "Vom Rate Limiter verzögerte Sendungen"),
+        "pauses": ("counter", "Pausen wegen 429/413 der Signal API"),
+        "paused_seconds": ("gauge", "Verbleibende Pause wegen Retry-After (Sekunden)"),
+        "wait_avg_ms": ("gauge", "Durchschnittliche Wartezeit im Rate Limiter (ms)"),
+        "wait_max_ms": ("gauge", "Längste Wartezeit im Rate Limiter (ms)"),
+    },
+}
+
+def escape_metric_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_metric_value(value):
+    """
+    Zahl verlustfrei für das Textformat: Ganzzahlen exakt (`{:g}` rundet
+    Zähler ab 1e6 auf 6 Stellen), Floats per repr()
+    """
+    if isinstance(value, (bool, int)):
+        return str(int(value))
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+def render_metrics(accounts):
+    """
+    Alle Konten im Prometheus-Textformat (ein Label `account` pro Gerät)
+    """
+    families = OrderedDict()
 
-# Signal-Konfiguration
-SIGNAL_SERVER_URL = os.getenv("SIGNAL_SERVER_URL", "signal.local.chase295.de")
-SIGNAL_RECEIVE_NUMBER = os.getenv("SIGNAL_RECEIVE_NUMBER", "+4915122215051")
-SIGNAL_SEND_NUMBER = os.getenv("SIGNAL_SEND_NUMBER", "+4915122215051")
-SIGNAL_RECIPIENT_NUMBER = os.getenv("SIGNAL_RECIPIENT_NUMBER", "+4917681328005")
+    def add(name, kind, help_text, labels, value):
+        family = families.get(name)
+        if family is None:
+            family = families[name] = (kind, help_text, [])
+        label_text = ",".join(f'{key}="{escape_metric_label(val)}"' for key, val in labels.items())
+        value = format_metric_value(value)
+        family[2].append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
 
-# Protokoll-Konfiguration
-SIGNAL_PROTOCOL = os.getenv("SIGNAL_PROTOCOL", "https").lower()
+    def add_histogram(name, help_text, labels, histogram):
+        family = families.get(name)
+        if family is None:
+            family = families[name] = ("histogram", help_text, [])
+        base = ",".join(f'{key}="{escape_metric_label(val)}"' for key, val in labels.items())
+        for bound, count in histogram.cumulative():
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            family[2].append(f'{name}_bucket{{{base},le="{le}"}} {count}')
+        family[2].append(f"{name}_sum{{{base}}} {format_metric_value(histogram.sum)}")
+        family[2].append(f"{name}_count{{{base}}} {format_metric_value(histogram.count)}")
 
-# SSL-Konfiguration
-SIGNAL_VERIFY_SSL = os.getenv("SIGNAL_VERIFY_SSL", "False").lower() in ('true', '1', 't')
+    for account in accounts:
+        labels = {"account": account.device_name}
+        metrics = account.metrics
+        add("signal_device_signal_received_total", "counter", "Von Signal empfangene Nachrichten",
+            labels, metrics.signal_received)
+        add("signal_device_signal_frames_skipped_total", "counter",
+            "Signal-Frames ohne dataMessage (Typing, Empfangsbestätigungen), vor dem Dekodieren verworfen",
+            labels, metrics.signal_frames_skipped)
+        add("signal_device_iot_forwarded_total", "counter", "An den IoT Orchestrator weitergeleitete Nachrichten",
+            labels, metrics.iot_forwarded)
+        add("signal_device_signal_sent_total", "counter", "Über die Signal REST API gesendete Nachrichten",
+            labels, metrics.signal_sent)
+        add("signal_device_signal_failed_total", "counter", "Fehlgeschlagene Sendeversuche an die Signal REST API",
+            labels, metrics.signal_failed)
+        add_histogram("signal_device_signal_to_iot_seconds", "Signal-Empfang bis Weiterleitung an IoT",
+                      labels, metrics.signal_to_iot)
+        add_histogram("signal_device_iot_to_signal_seconds", "Finaler IoT-Frame bis gesendete Signal-Nachricht",
+                      labels, metrics.iot_to_signal)
+        add_histogram("signal_device_stream_first_send_seconds",
+                      "Erster Stream-Chunk bis zur ersten gesendeten Signal-Nachricht der Sitzung",
+                      labels, metrics.first_send)
+        add_histogram("signal_device_signal_http_seconds", "Dauer eines POST an die Signal REST API",
+                      labels, metrics.signal_http)
+        for priority in SEND_PRIORITIES:
+            add_histogram("signal_device_send_queue_wait_seconds", "Wartezeit in der Sende-Queue je Priorität",
+                          dict(labels, priority=priority), metrics.send_wait[priority])
+        add_histogram("signal_device_rate_limit_wait_seconds", "Wartezeit vor dem POST (Token Bucket, Retry-After)",
+                      labels, metrics.rate_limit_wait)
+        add("signal_device_rate_limited_total", "counter", "Rate-Limit-Antworten (429/413) der Signal API",
+            labels, metrics.rate_limited)
+        for connection in ("signal", "iot"):
+            connection_labels = dict(labels, connection=connection)
+            add("signal_device_reconnects_total", "counter", "Geplante Reconnects je Verbindung",
+                connection_labels, metrics.reconnects[connection])
+            add("signal_device_reconnect_backoff_seconds", "gauge", "Aktuelle Reconnect-Wartezeit (0 = verbunden)",
+                connection_labels, metrics.backoff[connection])
+            add("signal_device_connected", "gauge", "Verbindung steht (1) oder nicht (0)",
+                connection_labels, metrics.connected[connection])
+            add_histogram("signal_device_ws_rtt_seconds", "WebSocket Ping/Pong-Roundtrip",
+                          connection_labels, metrics.ws_rtt[connection])
+            add("signal_device_ws_rtt_last_seconds", "gauge", "Letzter gemessener Ping/Pong-Roundtrip",
+                connection_labels, metrics.ws_rtt_last[connection])
+            add("signal_device_heartbeat_failures_total", "counter",
+                "Verbindungen, die wegen Pong- oder Idle-Timeout getrennt wurden",
+                connection_labels, metrics.heartbeat_failures[connection])
+            add_histogram("signal_device_reconnect_ready_seconds", "Verbindungsverlust bis Verbindung wieder bereit",
+                          connection_labels, metrics.reconnect_ready[connection])
+            add("signal_device_circuit_breaker_open", "gauge", "Circuit Breaker offen (1) oder geschlossen (0)",
+                connection_labels, metrics.breaker_open[connection])
+        for direction in MEDIA_DIRECTIONS:
+            direction_labels = dict(labels, direction=direction)
+            add("signal_device_media_files_total", "counter", "Übertragene Anhänge", direction_labels,
+                metrics.media_files[direction])
+            add("signal_device_media_bytes_total", "counter", "Übertragene Anhang-Bytes", direction_labels,
+                metrics.media_bytes[direction])
+            add_histogram("signal_device_media_transfer_seconds", "Dauer eines Anhang-Transfers",
+                          direction_labels, metrics.media_seconds[direction])
+            add("signal_device_media_throughput_bytes_per_second", "gauge", "Durchsatz des letzten Anhang-Transfers",
+                direction_labels, metrics.media_throughput[direction])
+            add("signal_device_media_rejected_total", "counter", "Wegen MEDIA_MAX_BYTES abgelehnte Anhänge",
+                direction_labels, metrics.media_rejected[direction])
+            add("signal_device_media_failed_total", "counter", "Fehlgeschlagene Anhang-Transfers",
+                direction_labels, metrics.media_failed[direction])
+        add("signal_device_media_uploads_active", "gauge", "Unvollständige Binärausgaben vom IoT Orchestrator",
+            labels, len(account.media_uploads))
 
-# Reconnect-Konfiguration
-SIGNAL_RECONNECT_DELAY = int(os.getenv("SIGNAL_RECONNECT_DELAY", "10"))
-IOT_RECONNECT_DELAY = int(os.getenv("IOT_RECONNECT_DELAY", "10"))
+        for component, getter in METRICS_STATS_SOURCES:
+            source = getter(account)
+            if source is None:
+                continue
+            fields = METRICS_STATS_FIELDS[component]
+            for key, value in source.stats().items():
+                if key not in fields or isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                kind, help_text = fields[key]
+                name = f"signal_device_{component}_{key}" + ("_total" if kind == "counter" else "")
+                add(name, kind, help_text, labels, value)
 
-# Signal-URLs intelligent konstruieren
-def build_signal_urls():
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+async def handle_metrics_request(reader, writer, accounts):
+    """Minimaler HTTP/1.1-Handler: GET /metrics, sonst 404"""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=10)
+        # Header überspringen
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=10)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] in ("GET", "HEAD") and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", render_metrics(accounts).encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1")
+        )
+        if parts and parts[0] != "HEAD":
+            writer.write(body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(accounts, host=METRICS_HOST, port=METRICS_PORT):
+    """Startet den /metrics Endpoint in der laufenden Event-Loop"""
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_metrics_request(reader, writer, accounts), host, port
+    )
+    log.info(f"📈 [Metriken] http://{host}:{port}/metrics")
+    return server
+
+# ======================================
+# HEARTBEAT
+# ======================================
+
+class ConnectionHeartbeat:
     """
-    Baut Signal WebSocket und REST API URLs basierend auf SIGNAL_SERVER_URL und SIGNAL_PROTOCOL
+    Erkennt halboffene WebSocket-Verbindungen
+
+    Sendet alle `interval` Sekunden einen Ping und misst den Roundtrip bis
+    zum Pong. Bleibt der Pong länger als `timeout` aus oder wurde
+    `idle_timeout` Sekunden lang nichts empfangen (Nachrichten über touch(),
+    Pongs zählen mit), wird der Transport sofort abgebrochen: `async for`
+    endet mit ConnectionClosed und der Reconnect der Verbindung greift,
+    statt auf das TCP-Timeout des Kernels zu warten.
     """
-    url = SIGNAL_SERVER_URL.strip()
-    protocol = SIGNAL_PROTOCOL
-    
-    if url.startswith("http://"):
-        protocol = "http"
-        url = url[7:]
-    elif url.startswith("https://"):
-        protocol = "https"
-        url = url[8:]
-    elif url.startswith("ws://"):
-        protocol = "http"
-        url = url[5:]
-    elif url.startswith("wss://"):
-        protocol = "https"
-        url = url[6:]
-    
-    if protocol not in ("http", "https"):
-        protocol = "https"
-    
-    url = url.rstrip("/")
-    
-    ws_protocol = "wss" if protocol == "https" else "ws"
-    http_protocol = protocol
-    
-    ws_url = f"{ws_protocol}://{url}/v1/receive/{SIGNAL_RECEIVE_NUMBER}"
-    api_url = f"{http_protocol}://{url}/v2/send"
-    
-    return ws_url, api_url, protocol
 
-SIGNAL_WS_URL, SIGNAL_API_URL, SIGNAL_ACTUAL_PROTOCOL = build_signal_urls()
+    def __init__(self, name: str, connection, metrics: AccountMetrics,
+                 interval=WS_HEARTBEAT_INTERVAL, timeout=WS_HEARTBEAT_TIMEOUT, idle_timeout=WS_IDLE_TIMEOUT):
+        self.name = name
+        self.connection = connection
+        self.metrics = metrics
+        self.interval = interval
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.last_activity = time.monotonic()
+        self.task = None
+
+    def start(self):
+        if self.interval > 0 or self.idle_timeout > 0:
+            self.task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def touch(self):
+        """Vom Empfangs-Loop pro Nachricht aufgerufen"""
+        self.last_activity = time.monotonic()
+
+    async def _run(self):
+        tick = min(value for value in (self.interval, self.idle_timeout / 2) if value > 0)
+        next_ping = time.monotonic() + self.interval
+        while True:
+            await asyncio.sleep(tick)
+            if self.connection.close_code is not None:
+                return
+            now = time.monotonic()
+            if self.idle_timeout > 0 and now - self.last_activity > self.idle_timeout:
+                self._fail(f"seit {now - self.last_activity:.0f}s nichts empfangen")
+                return
+            if self.interval > 0 and now >= next_ping:
+                next_ping = now + self.interval
+                if not await self._ping():
+                    return
+
+    async def _ping(self):
+        start = time.monotonic()
+        try:
+            # Auch das Senden begrenzen: bei halboffener Verbindung kann drain() hängen
+            async def ping():
+                pong_waiter = await self.connection.ping()
+                await pong_waiter
+            await asyncio.wait_for(ping(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._fail(f"kein Pong nach {self.timeout:g}s")
+            return False
+        except websockets.exceptions.ConnectionClosed:
+            return False
+        rtt = time.monotonic() - start
+        self.last_activity = time.monotonic()
+        self.metrics.ws_rtt[self.name].observe(rtt)
+        self.metrics.ws_rtt_last[self.name] = rtt
+        log_event(connection_logger(self.name), logging.DEBUG,
+                  f"💓 [{CONNECTION_LABELS[self.name]}] Pong", rtt_ms=round(rtt * 1000, 1))
+        return True
+
+    def _fail(self, reason: str):
+        self.metrics.heartbeat_failures[self.name] += 1
+        connection_logger(self.name).warning(
+            f"💔 [{CONNECTION_LABELS[self.name]}] Verbindung tot ({reason}), trenne für Reconnect"
+        )
+        transport = getattr(self.connection, "transport", None)
+        if transport is not None:
+            transport.abort()
 
 # ======================================
-# GERÄTE-FÄHIGKEITEN (CAPABILITIES)
+# SIGNAL-EINGANG
 # ======================================
-DEVICE_CAPABILITIES = [
-    'txt_output',
-    'txt_input',
-]
+
+class SignalInbox:
+    """
+    Begrenzter Ringpuffer zwischen Signal-Empfang und IoT-Verbindung
+
+    Der Signal-Empfang läuft unabhängig von der IoT-Verbindung und legt
+    Nachrichten hier ab; forward_signal_inbox() leert den Puffer in die
+    jeweils aktuelle IoT-Verbindung. Ist der Puffer voll, wird die älteste
+    Nachricht verdrängt (mit Outbox bleibt sie dort offen und wird beim
+    nächsten IoT-Connect nachgeliefert).
+
+    Einträge: (session_id, header, message, received_at); bei Anhängen ist
+    message ein SignalAttachment, der Inhalt wird erst beim Weiterleiten geladen.
+    """
+
+    def __init__(self, max_items=SIGNAL_INBOX_SIZE):
+        self.max_items = max(1, max_items)
+        self.items = deque()
+        self.ready = asyncio.Event()
+
+        self.received = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        """Legt eine Nachricht ab; gibt die verdrängte zurück (sonst None)"""
+        dropped = None
+        if len(self.items) >= self.max_items:
+            dropped = self.items.popleft()
+            self.dropped += 1
+        self.items.append(item)
+        self.received += 1
+        self.max_depth = max(self.max_depth, len(self.items))
+        self.ready.set()
+        return dropped
+
+    def requeue(self, items):
+        """Nicht zugestellte Nachrichten in ursprünglicher Reihenfolge zurück an den Anfang"""
+        for item in reversed(items):
+            if len(self.items) >= self.max_items:
+                self.dropped += 1
+                continue
+            self.items.appendleft(item)
+        if self.items:
+            self.ready.set()
+
+    async def get_batch(self, max_items: int):
+        """Wartet auf mindestens eine Nachricht und liefert bis zu `max_items`"""
+        while not self.items:
+            self.ready.clear()
+            await self.ready.wait()
+        batch = []
+        while self.items and len(batch) < max_items:
+            batch.append(self.items.popleft())
+        return batch
+
+    def session_ids(self):
+        return {item[0] for item in self.items}
+
+    def stats(self):
+        return {
+            "depth": len(self.items),
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
 
 # ======================================
-# ENDE KONFIGURATION
+# IoT-SCHREIBER
 # ======================================
 
-# Vollständige IoT Orchestrator WebSocket-URL mit Authentifizierung
-IOT_WS_URL = f"ws://{WS_HOST}:{WS_PORT}{WS_PATH}?clientId={DEVICE_NAME}&secret={API_KEY}"
+# websockets-Versionen, gegen die der gebündelte Write getestet ist (siehe requirements.txt)
+WEBSOCKETS_BATCH_VERSIONS = ((16, 0), (18, 0))
 
-def print_header():
-    """Zeigt den Header mit Konfiguration an"""
-    print("\n" + "="*70)
-    print("  IoT Orchestrator Signal Device Client (Stable Mode)")
-    print("="*70 + "\n")
-    print(f"📱 Gerät: {DEVICE_NAME}")
-    print(f"🔗 IoT Orchestrator: {IOT_WS_URL}")
-    print(f"📲 Signal-Empfang: {SIGNAL_WS_URL}")
-    print(f"📤 Signal-Senden: {SIGNAL_API_URL}")
-    print(f"🔐 Signal-Protokoll: {SIGNAL_ACTUAL_PROTOCOL.upper()}")
-    print(f"📞 Signal-Nummer (Empfang): {SIGNAL_RECEIVE_NUMBER}")
-    print(f"📞 Signal-Nummer (Senden): {SIGNAL_SEND_NUMBER}")
-    print(f"👤 Standard-Empfänger: {SIGNAL_RECIPIENT_NUMBER}")
-    print(f"🔄 Signal Reconnect: {SIGNAL_RECONNECT_DELAY}s")
-    print(f"🔄 IoT Reconnect: {IOT_RECONNECT_DELAY}s\n")
-
-async def send_signal_message(message: str, recipient: Optional[str] = None):
-    """
-    Sendet eine Nachricht über die Signal REST API
+def websockets_version(version=None):
+    """websockets-Version als (major, minor); None, wenn nicht lesbar"""
+    if version is None:
+        version = getattr(getattr(websockets, "version", None), "version", "")
+    match = re.match(r"(\d+)\.(\d+)", version or "")
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+def iot_batch_write_supported(connection, version=None):
+    """
+    Gebündelter Write nutzt Interna von websockets.asyncio (send_context(),
+    send_in_progress, protocol, transport); nur in getesteten Versionen und
+    bei passender Verbindungsklasse, sonst Frame für Frame über send()
     """
+    version = websockets_version(version)
+    low, high = WEBSOCKETS_BATCH_VERSIONS
+    if version is None or not low <= version < high:
+        return False
     try:
-        recipient_number = recipient or SIGNAL_RECIPIENT_NUMBER
-        
-        if not isinstance(message, str):
-            message = str(message)
-        
-        payload = {
-            "message": message,
-            "number": SIGNAL_SEND_NUMBER,
-            "recipients": [recipient_number]
-        }
-        
-        verify_ssl = SIGNAL_VERIFY_SSL if SIGNAL_ACTUAL_PROTOCOL == "https" else False
-        
-        async with httpx.AsyncClient(timeout=10.0, verify=verify_ssl) as client:
-            response = await client.post(
-                SIGNAL_API_URL,
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            print(f"✅ [Signal] Nachricht gesendet an {recipient_number}")
-            print(f"   → Nachricht: {message[:100]}")
-            return True
-    except Exception as e:
-        print(f"❌ [Signal] Fehler beim Senden: {e}")
+        from websockets.asyncio.connection import Connection
+    except ImportError:
         return False
+    if not isinstance(connection, Connection):
+        return False
+    return all(hasattr(connection, name) for name in ("protocol", "send_context", "send_in_progress", "transport"))
+
+class IotWriter:
+    """
+    Einziger Schreiber einer IoT-Verbindung
+
+    Alle Sender (Signal-Empfang, Outbox-Replay) legen Header und Payload
+    gemeinsam in eine Queue; ein Writer-Task schreibt sie, sodass sich Paare
+    nie überlappen. Was beim Schreiben bereits wartet, wird als ein Batch mit
+    einem einzigen Socket-Write und einem Drain gesendet (nur mit getesteter
+    websockets-Version, sonst Frame für Frame). Mit `binary_payload` geht
+    der Payload als Binärframe (UTF-8) raus.
+    """
+
+    def __init__(self, connection, binary_payload=IOT_BINARY_PAYLOAD, max_batch=IOT_WRITE_BATCH):
+        self.connection = connection
+        self.binary_payload = binary_payload
+        self.max_batch = max(1, max_batch)
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.closed_exc = None
+        self.batch_write = iot_batch_write_supported(connection)
+
+        self.messages = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self._fail_pending(self.closed_exc or websockets.exceptions.ConnectionClosedOK(None, None))
+
+    async def send(self, header: dict, message):
+        """Sendet Header + Payload und wartet, bis beides geschrieben ist"""
+        if self.closed_exc is not None:
+            raise self.closed_exc
+        if isinstance(message, str) and self.binary_payload:
+            message = message.encode('utf-8')
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((json_codec.dumps(header), message, future))
+        return await future
+
+    def stats(self):
+        return {
+            "queue": self.queue.qsize(),
+            "messages": self.messages,
+            "batches": self.batches,
+            "avg_batch": self.messages / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+        }
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._write(batch)
+            except asyncio.CancelledError:
+                for _, _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if isinstance(e, websockets.exceptions.ConnectionClosed):
+                    self.closed_exc = e
+                    self._fail_pending(e)
+                    return
+                continue
+            self.messages += len(batch)
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(True)
+
+    async def _write(self, batch):
+        connection = self.connection
+        if not self.batch_write:
+            # Ungetestete websockets-Version oder andere Verbindung: Frame für Frame
+            for header, message, _ in batch:
+                await connection.send(header)
+                await connection.send(message)
+            return
 
-async def safe_send_to_iot(iot_websocket, header, message):
+        # Wie connection.send(): keine Frames zwischen die Fragmente einer
+        # laufenden fragmentierten Nachricht schieben
+        while connection.send_in_progress is not None:
+            await asyncio.shield(connection.send_in_progress)
+
+        # websockets.asyncio: alle Frames erzeugen, als ein Write senden,
+        # Fehlerbehandlung und Drain übernimmt send_context()
+        protocol = connection.protocol
+        async with connection.send_context():
+            for header, message, _ in batch:
+                protocol.send_text(header.encode('utf-8'))
+                if isinstance(message, str):
+                    protocol.send_text(message.encode('utf-8'))
+                else:
+                    protocol.send_binary(message)
+            # Reine Datenframes: data_to_send() enthält hier kein EOF-Signal
+            data = b"".join(protocol.data_to_send())
+            if data:
+                connection.transport.write(data)
+
+    def _fail_pending(self, exc):
+        while not self.queue.empty():
+            _, _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(exc)
+
+async def safe_send_to_iot(account: SignalAccount, iot_writer: IotWriter, header, message):
     """
-    Sendet Nachricht an IoT mit Error-Handling
+    Sendet Nachricht an IoT mit Error-Handling (über den Writer der Verbindung)
     """
     try:
-        await iot_websocket.send(json.dumps(header))
-        await iot_websocket.send(message)
+        await iot_writer.send(header, message)
         return True
     except websockets.exceptions.ConnectionClosed:
-        print("⚠️  [Signal] IoT-Verbindung geschlossen, Nachricht verworfen")
+        log_signal.warning("⚠️  [Signal] IoT-Verbindung geschlossen, Nachricht wird nach dem Reconnect zugestellt")
         return False
     except Exception as e:
-        print(f"⚠️  [Signal] Fehler beim Senden an IoT: {e}")
+        log_signal.warning(f"⚠️  [Signal] Fehler beim Senden an IoT: {e}")
+        return False
+
+async def stream_signal_attachment(account: SignalAccount, iot_writer: IotWriter, header: dict,
+                                   attachment: SignalAttachment):
+    """
+    Lädt einen Anhang bei signal-cli und streamt ihn in Binärframes zu
+    MEDIA_CHUNK_SIZE an IoT (Header mit seq, letzter Chunk final). Jeder
+    Chunk wird geschrieben, bevor der nächste gelesen wird. Höchstens
+    MEDIA_DOWNLOAD_CONCURRENCY Downloads laufen gleichzeitig.
+
+    True: zugestellt, False: IoT-Verbindung weg oder vorübergehender Fehler
+    von signal-cli (Timeout, 5xx; wird erneut versucht), None: dauerhaft
+    nicht zustellbar (zu groß, nicht vorhanden, abgelehnt; aus der Outbox
+    ausgetragen)
+    """
+    media_id = header['id']
+    started = time.monotonic()
+    sent = size = 0
+    pending = None
+    problem = None
+    permanent = False
+    if attachment.size is not None and attachment.size > MEDIA_MAX_BYTES:
+        problem, permanent = "zu groß", True
+    else:
+        try:
+            client = get_signal_http_client()
+            url = f"{account.signal_attachment_url}/{attachment.id}"
+            async with get_media_download_slots():
+                async with client.stream("GET", url, timeout=MEDIA_HTTP_TIMEOUT) as response:
+                    if response.status_code in (404, 410):
+                        problem, permanent = "nicht gefunden", True
+                    elif is_permanent_signal_error(response):
+                        problem, permanent = f"abgelehnt ({response.status_code})", True
+                    else:
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes(MEDIA_CHUNK_SIZE):
+                            size += len(chunk)
+                            if size > MEDIA_MAX_BYTES:
+                                problem, permanent = "zu groß", True
+                                break
+                            # Letzten Chunk zurückhalten, er geht mit final=True raus
+                            if pending is not None:
+                                if not await safe_send_to_iot(account, iot_writer, dict(header, final=False, seq=sent), pending):
+                                    return False
+                                sent += 1
+                            pending = chunk
+        except (httpx.HTTPError, httpx.StreamError) as e:
+            problem = str(e) or type(e).__name__
+
+    if problem is None:
+        if not await safe_send_to_iot(account, iot_writer, dict(header, final=True, seq=sent), pending or b""):
+            return False
+        account.metrics.media_transferred("signal_to_iot", size, time.monotonic() - started)
+        log_event(log_signal, logging.INFO, "📎 [Signal] Anhang an IoT gestreamt", hot=True,
+                  id=media_id, size=size, chunks=sent + 1)
+        return True
+
+    if problem == "zu groß":
+        account.metrics.media_rejected["signal_to_iot"] += 1
+    else:
+        account.metrics.media_failed["signal_to_iot"] += 1
+    log_signal.warning(f"⚠️  [Signal] Anhang {media_id} nicht weitergeleitet: {problem}")
+    if sent:
+        # Begonnenen Stream für den Empfänger abschließen
+        await safe_send_to_iot(account, iot_writer, dict(header, final=True, seq=sent, aborted=True), b"")
+    if not permanent:
         return False
+    if account.outbox is not None:
+        account.outbox.ack("iot", media_id)
+    return None
+
+async def send_item_to_iot(account: SignalAccount, iot_writer: IotWriter, header: dict, message):
+    """
+    Text direkt, Anhänge per stream_signal_attachment() (None: nicht zustellbar)
+    """
+    if isinstance(message, SignalAttachment):
+        return await stream_signal_attachment(account, iot_writer, header, message)
+    return await safe_send_to_iot(account, iot_writer, header, message)
 
-async def receive_signal_messages(iot_websocket, stop_event):
+def iot_outbox_payload(header: dict, message):
+    """Outbox-Eintrag einer IoT-Weiterleitung (Anhänge nur als Verweis)"""
+    if isinstance(message, SignalAttachment):
+        return {"header": header, "attachment": message.to_dict()}
+    return {"header": header, "message": message}
+
+def iot_outbox_message(payload: dict):
+    if "attachment" in payload:
+        return SignalAttachment.from_dict(payload["attachment"])
+    return payload.get("message", "")
+
+async def replay_iot_outbox(account: SignalAccount, iot_writer: IotWriter):
+    """
+    Sendet nach einem (Re-)Connect alle unbestätigten IoT-Weiterleitungen erneut
+    (auf einmal eingereiht, der Writer schreibt sie in Batches). Was dabei
+    scheitert, geht in den Signal-Eingang und wird von forward_signal_inbox()
+    wiederholt.
+    """
+    if account.outbox is None:
+        return
+    # Was noch im Signal-Eingang liegt, liefert forward_signal_inbox()
+    queued = account.signal_inbox.session_ids()
+    items = [(message_id, payload) for message_id, payload in account.outbox.pending_items("iot")
+             if message_id not in queued]
+    if not items:
+        return
+    log_outbox.info(f"📦 [Outbox] {len(items)} Nachrichten werden an IoT nachgeliefert")
+    results = await asyncio.gather(*(
+        send_item_to_iot(account, iot_writer, payload["header"], iot_outbox_message(payload))
+        for _, payload in items
+    ), return_exceptions=True)
+    failed = []
+    for (message_id, payload), delivered in zip(items, results):
+        if isinstance(delivered, BaseException):
+            log_outbox.warning(f"⚠️  [Outbox] Nachlieferung von {message_id} fehlgeschlagen: "
+                               f"{delivered or type(delivered).__name__}")
+            delivered = False
+        if delivered is None:
+            continue
+        if not delivered:
+            failed.append((message_id, payload["header"], iot_outbox_message(payload), time.monotonic()))
+            continue
+        account.outbox.ack("iot", message_id)
+        account.metrics.iot_forwarded += 1
+    if failed:
+        account.signal_inbox.requeue(failed)
+
+async def forward_signal_inbox(account: SignalAccount, iot_writer: IotWriter):
+    """
+    Leitet gepufferte Signal-Nachrichten an die aktuelle IoT-Verbindung weiter
+    (alles Wartende auf einmal, der Writer schreibt es in Batches). Endet,
+    sobald die Verbindung weg ist; der Rest bleibt im Puffer. Andere Fehler
+    (z.B. abgebrochener Anhang-Download) werden nach IOT_RECONNECT_DELAY
+    erneut versucht, höchstens OUTBOX_MAX_ATTEMPTS Mal pro Nachricht.
+    """
+    inbox = account.signal_inbox
+    attempts = {}
+    while True:
+        items = await inbox.get_batch(IOT_WRITE_BATCH)
+        try:
+            results = await asyncio.gather(*(
+                send_item_to_iot(account, iot_writer, header, message)
+                for _, header, message, _ in items
+            ), return_exceptions=True)
+        except asyncio.CancelledError:
+            # Verbindung wird abgebaut: lieber doppelt als verloren
+            inbox.requeue(items)
+            raise
+
+        failed = []
+        for item, delivered in zip(items, results):
+            session_id, _, _, received_at = item
+            if isinstance(delivered, BaseException):
+                log_signal.warning(f"⚠️  [Signal] Weiterleitung von {session_id} fehlgeschlagen: "
+                                   f"{delivered or type(delivered).__name__}")
+                delivered = False
+            if delivered is None:
+                attempts.pop(session_id, None)
+                continue
+            if not delivered:
+                failed.append(item)
+                continue
+            attempts.pop(session_id, None)
+            account.metrics.iot_forwarded += 1
+            account.metrics.signal_to_iot.observe(time.monotonic() - received_at)
+            if account.outbox is not None:
+                account.outbox.ack("iot", session_id)
+            log_event(log_signal, logging.INFO, "✅ [Signal] An IoT Orchestrator weitergeleitet", hot=True, id=session_id)
+        if not failed:
+            continue
+        if iot_writer.closed_exc is not None:
+            inbox.requeue(failed)
+            return
+
+        # Verbindung steht noch: erneut versuchen, dauerhaft scheiternde Nachrichten aufgeben
+        retry = []
+        for item in failed:
+            session_id = item[0]
+            attempts[session_id] = attempts.get(session_id, 0) + 1
+            if attempts[session_id] < OUTBOX_MAX_ATTEMPTS:
+                retry.append(item)
+                continue
+            del attempts[session_id]
+            if account.outbox is not None:
+                account.outbox.ack("iot", session_id)
+            log_signal.error(f"❌ [Signal] Nachricht {session_id} nach {OUTBOX_MAX_ATTEMPTS} Versuchen "
+                             f"nicht an IoT zugestellt, aufgegeben")
+        inbox.requeue(retry)
+        await asyncio.sleep(IOT_RECONNECT_DELAY)
+
+async def receive_signal_messages(account: SignalAccount, stop_event):
     """
     Empfängt Signal-Nachrichten über WebSocket mit Auto-Reconnect
-    IoT-Verbindung bleibt stabil, auch wenn Signal disconnected!
+    Läuft unabhängig von der IoT-Verbindung und legt Nachrichten im
+    Signal-Eingang ab (siehe SignalInbox)
     """
-    reconnect_delay = SIGNAL_RECONNECT_DELAY
+    reconnect = account.signal_reconnect
     
     while not stop_event.is_set():
         signal_websocket = None
+        heartbeat = None
         try:
-            print("⏳ [Signal] Verbinde zu Signal WebSocket...")
+            log_signal.info(f"⏳ [Signal] Verbinde zu Signal WebSocket ({redact_number(account.receive_number)})...")
             
-            ssl_context = None
-            if SIGNAL_ACTUAL_PROTOCOL == "https" and not SIGNAL_VERIFY_SSL:
-                ssl_context = ssl.SSLContext()
-                ssl_context.check_hostname = False
-                ssl_context.verify_mode = ssl.CERT_NONE
+            # Gemeinsamer SSL-Kontext, nur für wss:// erlaubt
+            ssl_context = get_signal_ssl_context() if account.signal_protocol == "https" else None
             
+            # Keepalive der Bibliothek aus, Pings sendet ConnectionHeartbeat
             async with websockets.connect(
-                SIGNAL_WS_URL,
+                account.signal_ws_url,
                 ping_interval=None,
+                open_timeout=WS_CONNECT_TIMEOUT,
                 close_timeout=10,
                 ssl=ssl_context
             ) as signal_websocket:
-                print("✅ [Signal] WebSocket verbunden!\n")
+                log_signal.info(f"✅ [Signal] WebSocket verbunden ({redact_number(account.receive_number)})!")
                 
-                # Reset reconnect delay bei erfolgreicher Verbindung
-                reconnect_delay = SIGNAL_RECONNECT_DELAY
+                # Backoff und Circuit Breaker zurücksetzen
+                reconnect.ready()
+                heartbeat = ConnectionHeartbeat("signal", signal_websocket, account.metrics).start()
                 
                 async for message in signal_websocket:
                     if stop_event.is_set():
                         break
+                    received_at = time.monotonic()
+                    heartbeat.touch()
                         
-                    try:
-                        data = json.loads(message)
+                    # Typing-/Empfangsbestätigungen vor dem Dekodieren verwerfen
+                    if not is_signal_data_frame(message):
+                        account.metrics.signal_frames_skipped += 1
+                        continue
                         
-                        envelope = data.get('envelope', {})
-                        if 'typingMessage' in envelope:
-                            continue
+                    try:
+                        envelope = json_codec.decode_signal_frame(message)
                         
-                        if 'dataMessage' in envelope:
-                            signal_message = envelope['dataMessage'].get('message', '')
-                            source_number = envelope.get('sourceNumber', 'unknown')
-                            source_name = envelope.get('sourceName', 'unknown')
+                        if envelope is not None:
+                            signal_message = envelope.message
+                            source_number = envelope.source_number or 'unknown'
+                            source_name = envelope.source_name or 'unknown'
+                            group_id = envelope.group_id
+                            attachments = envelope.attachments if MEDIA_ENABLED else ()
                             
-                            if signal_message:
-                                print(f"📩 [Signal] Nachricht empfangen")
-                                print(f"   → Von: {source_name} ({source_number})")
-                                print(f"   → Nachricht: {signal_message}")
+                            if signal_message or attachments:
+                                account.metrics.signal_received += 1
+                                log_event(
+                                    log_signal, logging.INFO, "📩 [Signal] Nachricht empfangen", hot=True,
+                                    source=redact_number(source_number), name=redact_text(source_name),
+                                    text=redact_text(signal_message or ""), attachments=len(attachments)
+                                )
                                 
-                                session_id = f"signal_{DEVICE_NAME}_{int(datetime.now().timestamp() * 1000)}"
+                                # Absender + Signal-Zeitstempel als stabile ID: erneut zugestellte
+                                # Envelopes werden so von der Outbox erkannt, gleichzeitige
+                                # Nachrichten verschiedener Absender nicht
+                                signal_timestamp = envelope.timestamp or int(datetime.now().timestamp() * 1000)
+                                sender = re.sub(r'\W', '', envelope.source_uuid or envelope.source_number or '') or 'unknown'
+                                session_id = f"signal_{account.device_name}_{sender}_{signal_timestamp}"
                                 header = {
                                     "id": session_id,
                                     "type": "text",
-                                    "sourceId": DEVICE_NAME,
+                                    "sourceId": account.device_name,
                                     "timestamp": int(datetime.now().timestamp() * 1000),
                                     "final": True,
                                     "metadata": {
                                         "signalSource": source_number,
                                         "signalSourceName": source_name,
-                                        "signalAccount": SIGNAL_RECEIVE_NUMBER
+                                        "signalAccount": account.receive_number
                                     }
                                 }
+                                if group_id:
+                                    header["metadata"]["signalGroupId"] = group_id
+
+                                # Antwort-Route merken: Gruppe oder Absender (Nummer bzw. UUID)
+                                reply_to = (
+                                    signal_group_recipient(group_id) if group_id
+                                    else envelope.source_number or envelope.source_uuid
+                                )
+
+                                # Text und jeder Anhang sind eigene IoT-Nachrichten ({id}_a{n})
+                                items = [(session_id, header, signal_message)] if signal_message else []
+                                for index, attachment in enumerate(attachments):
+                                    media_id = f"{session_id}_a{index}"
+                                    items.append((media_id, build_media_header(header, media_id, attachment), attachment))
+                                    log_event(
+                                        log_signal, logging.INFO, "📎 [Signal] Anhang empfangen", hot=True,
+                                        id=media_id, type=attachment.content_type, size=attachment.size
+                                    )
                                 
-                                # Sende an IoT mit Error-Handling
-                                if await safe_send_to_iot(iot_websocket, header, signal_message):
-                                    print("✅ [Signal] An IoT Orchestrator weitergeleitet\n")
+                                for item_id, item_header, item_message in items:
+                                    if account.outbox is not None and not account.outbox.add(
+                                        "iot", item_id, iot_outbox_payload(item_header, item_message)
+                                    ):
+                                        log_outbox.info(f"♻️  [Signal] Nachricht {item_id} bereits weitergeleitet, übersprungen")
+                                        continue
+                                    # Route erst für angenommene Nachrichten, ein Duplikat darf sie nicht umbiegen
+                                    if account.routes is not None and reply_to:
+                                        account.routes.add(item_id, reply_to)
+
+                                    # Weiterleitung an IoT übernimmt forward_signal_inbox()
+                                    dropped = account.signal_inbox.put((item_id, item_header, item_message, received_at))
+                                    if dropped is not None:
+                                        log_event(
+                                            log_signal, logging.WARNING, "⚠️  [Signal] Eingangspuffer voll, älteste Nachricht verdrängt",
+                                            hot=True, id=dropped[0], outbox=account.outbox is not None
+                                        )
                         
-                    except json.JSONDecodeError:
+                    except json_codec.decode_errors:
                         pass
                     except Exception as e:
-                        print(f"❌ [Signal] Fehler beim Verarbeiten: {e}")
-                        import traceback
-                        traceback.print_exc()
+                        log_signal.exception(f"❌ [Signal] Fehler beim Verarbeiten: {e}")
                         
         except websockets.exceptions.WebSocketException as e:
-            print(f"❌ [Signal] WebSocket-Fehler: {e}")
+            log_signal.error(f"❌ [Signal] WebSocket-Fehler: {e}")
         except Exception as e:
-            print(f"❌ [Signal] Verbindungsfehler: {e}")
+            log_signal.error(f"❌ [Signal] Verbindungsfehler: {e}")
+        if heartbeat is not None:
+            await heartbeat.stop()
+        account.metrics.connection_down("signal")
         
         # Reconnect nur wenn nicht gestoppt
         if not stop_event.is_set():
-            print(f"🔌 [Signal] Reconnect in {reconnect_delay} Sekunden...")
-            await asyncio.sleep(reconnect_delay)
-            # Exponentielles Backoff (max 60s)
-            reconnect_delay = min(reconnect_delay * 1.5, 60)
+            delay = reconnect.next_delay()
+            log_signal.info(f"🔌 [Signal] Reconnect ({redact_number(account.receive_number)}) in {delay:.1f} Sekunden...")
+            await asyncio.sleep(delay)
         else:
             break
     
-    print("👋 [Signal] Signal-Listener beendet")
+    log_signal.info("👋 [Signal] Signal-Listener beendet")
+
+async def release_stream_sessions(account: SignalAccount, sessions, reason: str):
+    """
+    Behandelt abgelaufene oder verdrängte Stream-Sitzungen gemäß SESSION_EXPIRE_POLICY
+    """
+    for session in sessions:
+        if not session.chunks:
+            # Progressiver Modus: alles bereits gesendet
+            continue
+        if SESSION_EXPIRE_POLICY == "discard":
+            log_iot.warning(f"🗑️  [IoT] TXT Output {session.session_id} verworfen ({reason}, {session.chunk_count} Chunks)")
+            continue
+        log_iot.warning(f"⚠️  [IoT] TXT Output {session.session_id} unvollständig gesendet ({reason}, {session.chunk_count} Chunks)")
+        # Eigene ID, damit weder ein verspäteter finaler Frame noch eine erneut
+        # verdrängte Fortsetzung derselben Sitzung als Duplikat gilt
+        recipient = resolve_reply_recipient(account, session.header)
+        await queue_signal_message(
+            account, session.text(), recipient, new_message_id(f"{session.session_id}_expired"),
+            send_priority(session.header, recipient)
+        )
+
+async def sweep_session_buffer_periodically(account: SignalAccount):
+    """
+    Räumt abgelaufene Stream-Sitzungen auch ohne neue IoT-Frames ab
+    """
+    interval = max(1, min(SESSION_BUFFER_TTL / 4, 30))
+    while True:
+        await asyncio.sleep(interval)
+        expired = account.session_buffer.expire()
+        if expired:
+            await release_stream_sessions(account, expired, "Timeout")
+        expire_media_uploads(account)
+
+def expire_media_uploads(account: SignalAccount, ttl=SESSION_BUFFER_TTL):
+    """
+    Verwirft Binärausgaben, deren finaler Frame nicht innerhalb von `ttl` kam
+    """
+    deadline = time.monotonic() - ttl
+    uploads = account.media_uploads
+    while uploads:
+        session_id, upload = next(iter(uploads.items()))
+        if upload.started > deadline:
+            break
+        del uploads[session_id]
+        upload.close()
+        account.metrics.media_failed["iot_to_signal"] += 1
+        log_iot.warning(f"🗑️  [IoT] Binärausgabe {session_id} verworfen (Timeout, {upload.size} Bytes)")
+
+STREAM_BOUNDARY_RE = re.compile(r'[.!?…]+["\')\]]*(?=\s)|\n')
+
+def find_stream_boundary(text: str, min_chars: int, force: bool = False):
+    """
+    Liefert die Position, bis zu der ein gestreamter Text gesendet werden kann
+    (letzte Satz- oder Absatzgrenze ab `min_chars` Zeichen), sonst 0. Mit
+    `force` wird notfalls am letzten Leerzeichen bzw. am Ende geschnitten.
+    """
+    cut = 0
+    for match in STREAM_BOUNDARY_RE.finditer(text):
+        if match.end() >= min_chars or force:
+            cut = match.end()
+    if not cut and force:
+        space = text.rfind(' ')
+        cut = space + 1 if space > 0 else len(text)
+    return cut
+
+async def flush_stream_progress(account: SignalAccount, session_id: str, force: bool = False):
+    """
+    Progressiver Modus: sendet den fertigen Teil einer gestreamten Ausgabe vorab
+    """
+    session_buffer = account.session_buffer
+    session = session_buffer.get(session_id)
+    if session is None or session.pending_since is None:
+        return
+
+    budget = SIGNAL_STREAM_LATENCY_MS / 1000
+    waited = time.monotonic() - session.pending_since
+    cut = find_stream_boundary(session.text(), SIGNAL_STREAM_MIN_CHARS, force or waited >= budget)
+    if cut:
+        part = session_buffer.take(session_id, cut).strip()
+        if part:
+            session.parts += 1
+            log_event(log_iot, logging.INFO, f"📤 [IoT] TXT Output Teil {session.parts}", hot=True, id=session_id, length=len(part))
+            recipient = resolve_reply_recipient(account, session.header)
+            await queue_signal_message(
+                account, part, recipient, f"{session_id}_p{session.parts}",
+                send_priority(session.header, recipient),
+                session.started if session.parts == 1 else None
+            )
+
+    # Latenzbudget auch ohne weitere Chunks einhalten
+    if session.pending_since is not None and session.timer is None and session_id in session_buffer:
+        delay = max(0.0, budget - (time.monotonic() - session.pending_since))
+        session.timer = asyncio.create_task(flush_stream_after(account, session, delay))
+
+async def flush_stream_after(account: SignalAccount, session: StreamSession, delay: float):
+    await asyncio.sleep(delay)
+    session.timer = None
+    await flush_stream_progress(account, session.session_id, force=True)
+
+async def handle_iot_text_payload(account: SignalAccount, header: dict, payload: str):
+    """
+    Verarbeitet einen TXT-Payload: Chunks puffern, beim finalen Frame an Signal senden
+    (im progressiven Modus zusätzlich Teilnachrichten vorab)
+    """
+    is_final = header.get('final', True)
+    session_id = header.get('id', 'unknown')
+    session_buffer = account.session_buffer
+
+    if not is_final:
+        if session_id not in session_buffer:
+            log_event(log_iot, logging.INFO, "📝 [IoT] TXT Output gestartet", hot=True, id=session_id)
+        released = session_buffer.append(session_id, header, payload)
+        if released:
+            await release_stream_sessions(account, released, "Pufferlimit")
+        if SIGNAL_STREAM_MODE == "progressive":
+            await flush_stream_progress(account, session_id)
+        return
+
+    recipient = resolve_reply_recipient(account, header)
+    priority = send_priority(header, recipient)
+    session = session_buffer.pop(session_id)
+    if session is not None:
+        full_text = session.text() + payload
+        if session.parts:
+            full_text = full_text.strip()
+        
+        log_event(
+            log_iot, logging.INFO, "✅ [IoT] TXT Output abgeschlossen!", hot=True,
+            id=session_id, chunks=session.chunk_count + 1, parts=session.parts, length=len(full_text)
+        )
+        
+        if full_text:
+            await queue_signal_message(account, full_text, recipient, session_id, priority,
+                                       None if session.parts else session.started)
+    else:
+        log_event(log_iot, logging.INFO, "📝 [IoT] TXT Output", hot=True, text=redact_text(payload))
+        await queue_signal_message(account, payload, recipient, header.get('id') or None, priority)
 
-async def receive_iot_messages(iot_websocket):
+async def handle_iot_media_payload(account: SignalAccount, header: dict, payload):
     """
-    Empfängt TXT Output-Nachrichten vom IoT Orchestrator und sendet sie über Signal
+    Verarbeitet einen Medien-Payload (image/audio/video/file): Chunks in den
+    Spool schreiben, beim finalen Frame als Anhang an Signal senden.
+    Textframes gelten als Base64.
     """
-    last_uso_header = None
-    session_buffer = {}
+    session_id = header.get('id', 'unknown')
+    upload = account.media_uploads.get(session_id)
+    if upload is None:
+        upload = account.media_uploads[session_id] = MediaUpload(session_id, header)
+        log_event(log_iot, logging.INFO, "📎 [IoT] Binärausgabe gestartet", hot=True, id=session_id, type=header.get('type'))
+
+    if isinstance(payload, str):
+        try:
+            payload = base64.b64decode(payload, validate=True)
+        except ValueError:
+            log_iot.warning(f"⚠️  [IoT] Binärausgabe {session_id}: ungültiges Base64, Chunk verworfen")
+            payload = b""
+    if not upload.rejected and not upload.write(payload):
+        upload.rejected = True
+        account.metrics.media_rejected["iot_to_signal"] += 1
+        log_iot.warning(f"⚠️  [IoT] Binärausgabe {session_id} größer als {MEDIA_MAX_BYTES} Bytes, wird verworfen")
+
+    if not header.get('final', True):
+        return
+    del account.media_uploads[session_id]
+    if upload.rejected or header.get('aborted'):
+        upload.close()
+        return
+    upload.update(header)
+    log_event(log_iot, logging.INFO, "✅ [IoT] Binärausgabe abgeschlossen!", hot=True, id=session_id, size=upload.size)
+    recipient = resolve_reply_recipient(account, upload.header)
+    await queue_signal_attachment(account, upload, recipient, send_priority(upload.header, recipient))
+
+async def dispatch_iot_frame(account: SignalAccount, header: dict, payload):
+    """
+    Verarbeitet ein zugeordnetes Header/Payload-Paar je nach Typ
+    """
+    if MEDIA_ENABLED and header.get('type') in MEDIA_HEADER_TYPES:
+        await handle_iot_media_payload(account, header, payload)
+        return
+    if header.get('type') != 'text':
+        return
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.decode('utf-8')
+    await handle_iot_text_payload(account, header, payload)
+
+async def receive_iot_messages(account: SignalAccount, iot_websocket, heartbeat: ConnectionHeartbeat = None):
+    """
+    Empfängt TXT Output- und Medien-Nachrichten vom IoT Orchestrator und sendet sie über Signal
+    Mehrere Streams dürfen sich überlappen, siehe IotStreamDemux.
+    """
+    demux = account.iot_demux = IotStreamDemux()
     
     try:
         async for message in iot_websocket:
-            if isinstance(message, (bytes, bytearray)):
-                if last_uso_header and last_uso_header.get('type') == 'text':
-                    payload = message.decode('utf-8')
-                    is_final = last_uso_header.get('final', True)
-                    session_id = last_uso_header.get('id', 'unknown')
-                    
-                    if not is_final:
-                        if session_id not in session_buffer:
-                            session_buffer[session_id] = {'chunks': [], 'chunk_count': 0}
-                            print("\n📝 [IoT] TXT Output gestartet")
-                        
-                        session = session_buffer[session_id]
-                        session['chunks'].append(payload)
-                        session['chunk_count'] += 1
-                    else:
-                        if session_id in session_buffer:
-                            session = session_buffer[session_id]
-                            full_text = ''.join(session['chunks']) + payload
-                            
-                            print(f"\n✅ [IoT] TXT Output abgeschlossen!")
-                            print(f"   • Chunks: {session['chunk_count']}")
-                            print(f"   • Länge: {len(full_text)} Zeichen")
-                            
-                            await send_signal_message(full_text)
-                            del session_buffer[session_id]
-                        else:
-                            print(f"\n📝 [IoT] TXT Output: {payload}")
-                            await send_signal_message(payload)
-                    
-                    if is_final:
-                        last_uso_header = None
-                        
-            elif isinstance(message, str):
-                try:
-                    data = json.loads(message)
-                    
-                    if data.get('type') == 'welcome' or 'connectionId' in data:
+            if heartbeat is not None:
+                heartbeat.touch()
+            if isinstance(message, str):
+                # Header beginnen mit "{": Text-Payloads ohne Dekodierversuch durchreichen
+                data = None
+                if message[:1] == "{":
+                    try:
+                        data = json_codec.loads(message)
+                    except json_codec.decode_errors:
                         pass
-                    elif 'id' in data and 'type' in data:
-                        last_uso_header = data
-                        
-                except json.JSONDecodeError:
-                    if last_uso_header and last_uso_header.get('type') == 'text':
-                        payload = message
-                        is_final = last_uso_header.get('final', True)
-                        session_id = last_uso_header.get('id', 'unknown')
-                        
-                        if not is_final:
-                            if session_id not in session_buffer:
-                                session_buffer[session_id] = {'chunks': [], 'chunk_count': 0}
-                                print("\n📝 [IoT] TXT Output gestartet")
-                            
-                            session = session_buffer[session_id]
-                            session['chunks'].append(payload)
-                            session['chunk_count'] += 1
-                        else:
-                            if session_id in session_buffer:
-                                session = session_buffer[session_id]
-                                full_text = ''.join(session['chunks']) + payload
-                                
-                                print(f"\n✅ [IoT] TXT Output abgeschlossen!")
-                                print(f"   • Chunks: {session['chunk_count']}")
-                                print(f"   • Länge: {len(full_text)} Zeichen")
-                                
-                                await send_signal_message(full_text)
-                                del session_buffer[session_id]
-                            else:
-                                print(f"\n📝 [IoT] TXT Output: {payload}")
-                                await send_signal_message(payload)
-                        
-                        if is_final:
-                            last_uso_header = None
+                
+                if isinstance(data, dict):
+                    if data.get('type') == 'welcome' or 'connectionId' in data:
+                        continue
+                    if 'id' in data and 'type' in data:
+                        demux.push_header(data)
+                        continue
+                
+                # Kein Header: Payload (auch Text, der zufällig gültiges JSON ist)
+                if not demux.has_pending():
+                    continue
+            
+            for header, payload in demux.push_payload(message):
+                await dispatch_iot_frame(account, header, payload)
                         
     except websockets.exceptions.ConnectionClosed:
-        print("❌ [IoT] WebSocket-Verbindung geschlossen")
+        log_iot.error("❌ [IoT] WebSocket-Verbindung geschlossen")
         raise  # Propagiere den Fehler, damit IoT reconnected
     except Exception as e:
-        print(f"❌ [IoT] Fehler beim Empfangen: {e}")
+        log_iot.error(f"❌ [IoT] Fehler beim Empfangen: {e}")
         raise
 
-def register_device_sync():
+def build_registration_payload(account: SignalAccount):
     """
-    Registriert das Device über die REST API (synchron)
+    Device-Daten für die REST API des IoT Orchestrators
     """
-    import urllib.request
-    import urllib.error
-    
-    try:
-        url = f'http://{WS_HOST}:3000/api/devices'
-        data = json.dumps({
-            'clientId': DEVICE_NAME,
-            'name': DEVICE_NAME,
-            'capabilities': DEVICE_CAPABILITIES,
-            'metadata': {
-                'type': 'signal-client',
-                'platform': sys.platform,
-                'signalReceiveNumber': SIGNAL_RECEIVE_NUMBER,
-                'signalSendNumber': SIGNAL_SEND_NUMBER,
-                'stableMode': True
-            }
-        }).encode('utf-8')
-        
-        req = urllib.request.Request(
-            url,
-            data=data,
-            headers={'Content-Type': 'application/json'}
-        )
-        
-        with urllib.request.urlopen(req, timeout=5) as response:
-            if response.status in (200, 201):
-                print("✅ [IoT] Device registriert")
-            return True
-    except Exception:
+    return {
+        'clientId': account.device_name,
+        'name': account.device_name,
+        'capabilities': DEVICE_CAPABILITIES,
+        'metadata': {
+            'type': 'signal-client',
+            'platform': sys.platform,
+            'signalReceiveNumber': account.receive_number,
+            'signalSendNumber': account.send_number,
+            'stableMode': True
+        }
+    }
+
+def registration_hash(payload: dict):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+async def register_device(account: SignalAccount):
+    """
+    Registriert das Device über die REST API (gemeinsamer HTTP-Client)
+
+    Wiederholt Netzwerkfehler, 5xx, 408 und 429 bis zu IOT_REGISTER_RETRIES
+    Mal mit Backoff. Sind die Device-Daten seit der letzten erfolgreichen
+    Registrierung unverändert, passiert nichts. Gibt True zurück, wenn das
+    Device registriert ist.
+    """
+    payload = build_registration_payload(account)
+    digest = registration_hash(payload)
+    if digest == account.registered_hash:
         return True
 
-async def register_device():
+    client = get_signal_http_client()
+    attempts = max(1, IOT_REGISTER_RETRIES)
+    for attempt in range(1, attempts + 1):
+        try:
+            response = await client.post(account.register_url, json=payload, timeout=IOT_REGISTER_TIMEOUT)
+            if response.status_code in (200, 201):
+                account.registered_hash = digest
+                log_iot.info(f"✅ [IoT] Device registriert ({account.device_name})")
+                return True
+            if response.status_code < 500 and response.status_code not in (408, 429):
+                log_iot.error(f"❌ [IoT] Registrierung abgelehnt: HTTP {response.status_code} - {response.text[:200]}")
+                return False
+            reason = f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            reason = str(e) or type(e).__name__
+
+        if attempt < attempts:
+            delay = min(0.5 * 2 ** (attempt - 1), 10) * random.uniform(0.8, 1.2)
+            log_iot.warning(f"⚠️  [IoT] Registrierung fehlgeschlagen ({reason}), neuer Versuch in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        else:
+            log_iot.warning(f"⚠️  [IoT] Registrierung fehlgeschlagen ({reason}), nächster Versuch nach dem Reconnect")
+    return False
+
+def schedule_registration(account: SignalAccount):
     """
-    Wrapper für synchrone Registrierung
+    Startet die Registrierung im Hintergrund, parallel zum WebSocket-Connect
+    (nur wenn keine läuft und sich die Device-Daten geändert haben)
     """
-    import concurrent.futures
-    loop = asyncio.get_event_loop()
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        await loop.run_in_executor(executor, register_device_sync)
+    if account.register_task is not None and not account.register_task.done():
+        return
+    if registration_hash(build_registration_payload(account)) == account.registered_hash:
+        return
+    account.register_task = asyncio.create_task(register_device(account))
 
 async def signal_device_client():
     """
-    Hauptfunktion: Verbindet Signal und IoT Orchestrator
+    Hauptfunktion: Verbindet Signal und IoT Orchestrator für alle Konten
     Signal hat eigenen Reconnect-Loop, IoT bleibt stabil
     """
-    print_header()
-    await register_device()
+    try:
+        accounts = load_accounts()
+    except (OSError, ValueError) as e:
+        log.error(f"❌ Konten-Konfiguration ungültig: {e}")
+        sys.exit(1)
+
+    print_header(accounts)
+
+    # Gemeinsamer HTTP Connection-Pool für alle Signal-Sendungen aller Konten
+    get_signal_http_client()
+
+    stats_task = None
+    if STATS_INTERVAL > 0:
+        stats_task = asyncio.create_task(log_stats_periodically(accounts))
+
+    metrics_server = None
+    if METRICS_PORT > 0:
+        try:
+            metrics_server = await start_metrics_server(accounts)
+        except OSError as e:
+            log.warning(f"⚠️  [Metriken] Endpoint konnte nicht gestartet werden: {e}")
+
+    try:
+        # Jedes Konto läuft isoliert in derselben Event-Loop
+        await asyncio.gather(*(supervise_account(account) for account in accounts))
+    finally:
+        if stats_task:
+            stats_task.cancel()
+            await asyncio.gather(stats_task, return_exceptions=True)
+        if metrics_server is not None:
+            metrics_server.close()
+            await metrics_server.wait_closed()
+        await close_signal_http_client()
+
+    log.info("✅ Signal Device-Client beendet.")
+
+async def supervise_account(account: SignalAccount):
+    """
+    Startet ein Konto neu, falls es unerwartet abbricht - andere Konten laufen weiter
+    """
+    while True:
+        try:
+            await run_account(account)
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception(f"❌ [{account.device_name}] Konto abgebrochen: {e}")
+        log.info(f"🔌 [{account.device_name}] Neustart in {ACCOUNT_RESTART_DELAY} Sekunden...")
+        await asyncio.sleep(ACCOUNT_RESTART_DELAY)
+
+async def run_account(account: SignalAccount):
+    """
+    Baut Outbox, Sende-Queue und Coalescer eines Kontos auf und hält dessen
+    IoT-Verbindung aufrecht
+    """
+    # Persistente Outbox: nicht zugestellte Nachrichten überleben Reconnect und Neustart
+    if OUTBOX_ENABLED:
+        account.outbox = Outbox(account.outbox_path)
+        account.outbox.start()
+        log_outbox.info(f"📦 [Outbox] {account.outbox_path}: {len(account.outbox.pending)} offene Nachrichten")
 
-    reconnect_delay = IOT_RECONNECT_DELAY
+    # Sende-Queue mit Worker-Pool: IoT-Empfang wartet nie auf Signal-HTTP
+    account.send_queue = SignalSendQueue(account)
+    account.send_queue.start()
+    if SIGNAL_COALESCE_ENABLED:
+        account.coalescer = SignalCoalescer(account)
+    background_tasks = [asyncio.create_task(sweep_session_buffer_periodically(account))]
+    if account.outbox is not None:
+        background_tasks.append(asyncio.create_task(retry_signal_outbox_periodically(account)))
+
+    # Signal-Empfang lebt unabhängig von IoT-Reconnects
+    account.signal_inbox = SignalInbox()
+    signal_stop = asyncio.Event()
+    background_tasks.append(asyncio.create_task(receive_signal_messages(account, signal_stop)))
+
+    try:
+        # Registrierung läuft parallel zum ersten Connect
+        schedule_registration(account)
+        await run_iot_connection(account)
+    finally:
+        signal_stop.set()
+        if account.register_task is not None:
+            account.register_task.cancel()
+            background_tasks.append(account.register_task)
+            account.register_task = None
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        account.signal_inbox = None
+        if account.coalescer is not None:
+            await account.coalescer.close()
+            account.coalescer = None
+        await account.send_queue.stop()
+        account.send_queue = None
+        if account.outbox is not None:
+            await account.outbox.close()
+            account.outbox = None
+
+async def run_iot_connection(account: SignalAccount):
+    """
+    IoT Reconnect-Schleife: Hält die Verbindung zum IoT Orchestrator aufrecht
+    """
+    reconnect = account.iot_reconnect
     
     # UNENDLICHE IoT RECONNECT-SCHLEIFE
     while True:
-        signal_task = None
-        stop_event = asyncio.Event()
+        forward_task = None
+        iot_writer = None
+        heartbeat = None
         
         try:
-            print("⏳ [IoT] Verbinde zu IoT Orchestrator...")
+            log_iot.info(f"⏳ [IoT] Verbinde zu IoT Orchestrator ({account.device_name})...")
             
+            # Keepalive der Bibliothek aus, Pings sendet ConnectionHeartbeat
+            connect_deadline = time.monotonic() + WS_CONNECT_TIMEOUT
             async with websockets.connect(
-                IOT_WS_URL,
+                account.iot_ws_url,
                 ping_interval=None,
+                open_timeout=WS_CONNECT_TIMEOUT,
                 close_timeout=10
             ) as iot_websocket:
-                print("✅ [IoT] Verbindung hergestellt!\n")
+                log_iot.info(f"✅ [IoT] Verbindung hergestellt ({account.device_name})!")
                 
-                # Warte auf Willkommensnachricht
+                # Warte auf Willkommensnachricht (Rest des Verbindungsbudgets)
                 try:
-                    welcome_msg = await asyncio.wait_for(iot_websocket.recv(), timeout=5)
+                    welcome_timeout = max(0.5, connect_deadline - time.monotonic())
+                    welcome_msg = await asyncio.wait_for(iot_websocket.recv(), timeout=welcome_timeout)
                     if isinstance(welcome_msg, str):
                         welcome_data = json.loads(welcome_msg)
                         connection_id = welcome_data.get('connectionId', 'unknown')
-                        print(f"✅ [IoT] Connection ID: {connection_id}")
+                        log_iot.info(f"✅ [IoT] Connection ID: {connection_id}")
                 except asyncio.TimeoutError:
-                    print("⚠️  [IoT] Keine Willkommensnachricht")
+                    log_iot.warning("⚠️  [IoT] Keine Willkommensnachricht")
 
-                print("\n" + "="*70)
-                print("✅ Device verbunden und bereit")
-                print(f"💡 Device '{DEVICE_NAME}' verfügbar in TXT Input/Output Nodes")
-                print(f"🔄 Signal läuft unabhängig mit Auto-Reconnect")
-                print("="*70 + "\n")
+                log_separator()
+                log.info("✅ Device verbunden und bereit")
+                log.info(f"💡 Device '{account.device_name}' verfügbar in TXT Input/Output Nodes")
+                log.info("🔄 Signal läuft unabhängig mit Auto-Reconnect")
+                log_separator()
 
-                # Reset reconnect delay bei erfolgreicher Verbindung
-                reconnect_delay = IOT_RECONNECT_DELAY
+                # Backoff und Circuit Breaker zurücksetzen
+                reconnect.ready()
+                # Erneut registrieren, falls fehlgeschlagen oder Device-Daten geändert
+                schedule_registration(account)
+                heartbeat = ConnectionHeartbeat("iot", iot_websocket, account.metrics).start()
 
-                # Starte beide Tasks - Signal mit eigenem Reconnect
-                signal_task = asyncio.create_task(
-                    receive_signal_messages(iot_websocket, stop_event)
-                )
-                iot_task = asyncio.create_task(receive_iot_messages(iot_websocket))
+                # Ein Writer-Task pro Verbindung: Header/Payload-Paare bleiben zusammen
+                iot_writer = account.iot_writer = IotWriter(iot_websocket)
+                iot_writer.start()
+
+                # Während der Verbindungspause liegengebliebene Nachrichten nachliefern
+                await replay_iot_outbox(account, iot_writer)
+
+                # Signal-Eingang in diese Verbindung leeren (Signal selbst läuft weiter)
+                forward_task = asyncio.create_task(forward_signal_inbox(account, iot_writer))
+                iot_task = asyncio.create_task(receive_iot_messages(account, iot_websocket, heartbeat))
 
                 # Warte NUR auf IoT-Task - Signal läuft unabhängig
                 try:
                     await iot_task
                 except Exception as e:
-                    print(f"❌ [IoT] IoT-Task Fehler: {e}")
+                    log_iot.error(f"❌ [IoT] IoT-Task Fehler: {e}")
                 
-                print("❌ [IoT] IoT-Verbindung verloren")
+                log_iot.warning("❌ [IoT] IoT-Verbindung verloren")
 
         except websockets.exceptions.InvalidStatusCode as e:
-            print(f"❌ [IoT] Verbindung fehlgeschlagen! Status: {e.status_code}")
-            print("💡 Überprüfe API-Key und Backend-Status")
+            log_iot.error(f"❌ [IoT] Verbindung fehlgeschlagen! Status: {e.status_code} - Überprüfe API-Key und Backend-Status")
             
         except ConnectionRefusedError:
-            print("❌ [IoT] Verbindung abgelehnt! Server läuft nicht?")
+            log_iot.error("❌ [IoT] Verbindung abgelehnt! Server läuft nicht?")
             
         except KeyboardInterrupt:
-            print("\n👋 Beende Signal Device-Client...")
-            stop_event.set()
-            if signal_task:
-                signal_task.cancel()
-                try:
-                    await signal_task
-                except asyncio.CancelledError:
-                    pass
+            log.info("👋 Beende Signal Device-Client...")
             break
             
         except Exception as e:
-            print(f"❌ [IoT] Fehler: {e}")
+            log_iot.error(f"❌ [IoT] Fehler: {e}")
 
         finally:
-            # Stoppe Signal-Task wenn noch aktiv
-            stop_event.set()
-            if signal_task and not signal_task.done():
-                signal_task.cancel()
-                try:
-                    await signal_task
-                except asyncio.CancelledError:
-                    pass
+            account.metrics.connection_down("iot")
+            # Weiterleitung stoppen, Signal-Empfang läuft weiter
+            if forward_task is not None:
+                forward_task.cancel()
+                await asyncio.gather(forward_task, return_exceptions=True)
+            if iot_writer is not None:
+                await iot_writer.stop()
+                iot_writer = account.iot_writer = None
+            if heartbeat is not None:
+                await heartbeat.stop()
 
         # AUTOMATISCHER IoT RECONNECT
-        print(f"🔌 [IoT] Reconnect in {reconnect_delay} Sekunden...\n")
-        await asyncio.sleep(reconnect_delay)
-        # Exponentielles Backoff (max 60s)
-        reconnect_delay = min(reconnect_delay * 1.5, 60)
-
-    print("\n✅ Signal Device-Client beendet.\n")
+        delay = reconnect.next_delay()
+        log_iot.info(f"🔌 [IoT] Reconnect ({account.device_name}) in {delay:.1f} Sekunden...")
+        await asyncio.sleep(delay)
 
 def main():
     """Entry Point"""
@@ -509,7 +4156,12 @@ def main():
             print("❌ Python 3.7 oder höher erforderlich!")
             sys.exit(1)
 
-        asyncio.run(signal_device_client())
+        listener = setup_logging()
+        try:
+            asyncio.run(signal_device_client())
+        finally:
+            # Restliche Log-Einträge aus der Queue schreiben
+            listener.stop()
 
     except KeyboardInterrupt:
         print("\n⚠️  Abgebrochen.\n")
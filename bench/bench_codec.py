@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Dekodieren von Signal-Frames und Kodieren von IoT-Headern
+====================================================================
+Vergleicht den alten Pfad (json.loads auf jeden Frame, dann dict-Zugriffe)
+mit dem Codec-Pfad aus device-signal.py (Vorfilter für Typing-/
+Empfangsframes, dann typisiertes Dekodieren) für jeden installierten Codec
+(json, orjson, msgspec).
+
+Als Korpus dient eine JSONL-Datei mit Frames, wie sie /v1/receive liefert
+(eine Zeile pro Frame, z.B. mitgeschnitten mit `websocat`). Ohne --corpus
+wird ein synthetischer Korpus mit typischer Mischung erzeugt.
+
+Verwendung:
+    python3 bench/bench_codec.py --frames 50000
+    python3 bench/bench_codec.py --corpus aufnahme.jsonl
+"""
+
+import argparse
+import json
+import random
+import time
+
+from common import load_device_module
+
+
+def synthetic_corpus(frames, typing_share, receipt_share, seed=1):
+    """Frames in der Form von signal-cli-rest-api (json-rpc Modus)"""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(frames):
+        timestamp = 1730000000000 + index
+        envelope = {
+            "source": "+4915112345678",
+            "sourceNumber": "+4915112345678",
+            "sourceUuid": "6b4c1a2e-8f1d-4c55-9c1e-0d3f4a5b6c7d",
+            "sourceName": "Max Mustermann",
+            "sourceDevice": 1,
+            "timestamp": timestamp,
+            "serverReceivedTimestamp": timestamp + 40,
+            "serverDeliveredTimestamp": timestamp + 80,
+        }
+        roll = rng.random()
+        if roll < typing_share:
+            envelope["typingMessage"] = {"action": rng.choice(["STARTED", "STOPPED"]), "timestamp": timestamp}
+        elif roll < typing_share + receipt_share:
+            envelope["receiptMessage"] = {
+                "when": timestamp, "isDelivery": True, "isRead": False, "isViewed": False,
+                "timestamps": [timestamp - 1000],
+            }
+        else:
+            data_message = {
+                "timestamp": timestamp,
+                "message": "Schalte bitte das Licht im Wohnzimmer an " * rng.randint(1, 4),
+                "expiresInSeconds": 0,
+                "viewOnce": False,
+            }
+            if rng.random() < 0.3:
+                data_message["groupInfo"] = {"groupId": "bGFzdHRlc3QtZ3J1cHBlLWlk", "type": "DELIVER"}
+            envelope["dataMessage"] = data_message
+        corpus.append(json.dumps({"envelope": envelope, "account": "+4917600000000"}))
+    return corpus
+
+
+def legacy_decode(raw):
+    """Alter Pfad aus receive_signal_messages(): json.loads + dict-Zugriffe"""
+    data = json.loads(raw)
+    envelope = data.get('envelope', {})
+    if 'typingMessage' in envelope:
+        return None
+    if 'dataMessage' in envelope:
+        message = envelope['dataMessage'].get('message', '')
+        source = envelope.get('sourceNumber', 'unknown')
+        group_id = (envelope['dataMessage'].get('groupInfo') or {}).get('groupId')
+        return message, source, group_id
+    return None
+
+
+def measure(name, corpus, decode, rounds):
+    best = None
+    forwarded = 0
+    for _ in range(rounds):
+        forwarded = 0
+        start = time.perf_counter()
+        for raw in corpus:
+            if decode(raw) is not None:
+                forwarded += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    per_frame_us = best / len(corpus) * 1_000_000
+    print(f"{name:<34} {per_frame_us:7.2f}µs/Frame  {len(corpus) / best:11,.0f} Frames/s  ({forwarded} Nachrichten)")
+    return per_frame_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="JSONL-Datei mit aufgezeichneten /v1/receive-Frames")
+    parser.add_argument("--frames", type=int, default=20000, help="Größe des synthetischen Korpus")
+    parser.add_argument("--typing-share", type=float, default=0.45, help="Anteil Typing-Frames (synthetisch)")
+    parser.add_argument("--receipt-share", type=float, default=0.35, help="Anteil Empfangsbestätigungen (synthetisch)")
+    parser.add_argument("--rounds", type=int, default=5, help="Durchläufe (bester zählt)")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    else:
+        corpus = synthetic_corpus(args.frames, args.typing_share, args.receipt_share)
+
+    device = load_device_module()
+    codecs = []
+    for name in ("json", "orjson", "msgspec"):
+        codec = device.create_json_codec(name)
+        if codec.name == name:
+            codecs.append(codec)
+
+    print(f"Korpus: {len(corpus)} Frames")
+    print("-- Signal-Frames dekodieren --")
+    baseline = measure("alt: json.loads + dict", corpus, legacy_decode, args.rounds)
+    for codec in codecs:
+        def decode(raw, codec=codec):
+            if not device.is_signal_data_frame(raw):
+                return None
+            envelope = codec.decode_signal_frame(raw)
+            return envelope if envelope is not None and envelope.message else None
+        result = measure(f"neu: Vorfilter + {codec.name}", corpus, decode, args.rounds)
+        print(f"{'':<34} Faktor {baseline / result:5.1f}x")
+
+    print("-- IoT-Header kodieren --")
+    header = {
+        "id": "signal_signal-device_1730000000000",
+        "type": "text",
+        "sourceId": "signal-device",
+        "timestamp": 1730000000123,
+        "final": True,
+        "metadata": {
+            "signalSource": "+4915112345678",
+            "signalSourceName": "Max Mustermann",
+            "signalAccount": "+4917600000000",
+        },
+    }
+    headers = [header] * len(corpus)
+    for codec in codecs:
+        measure(f"{codec.name}.dumps(header)", headers, codec.dumps, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
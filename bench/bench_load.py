@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Lasttest: device-signal.py gegen lokale Stand-ins (komplett offline)
+====================================================================
+Startet MockSignalServer und MockGateway (siehe mock_servers.py), startet
+app/device-signal.py als Subprozess dagegen und treibt Last in beide
+Richtungen:
+
+- Signal -> IoT: Envelopes über /v1/receive, gemessen bis zum Eintreffen
+  von Header + Payload am Gateway
+- IoT -> Signal: TXT Output (optional in N Chunks gestreamt), gemessen bis
+  zum POST /v2/send
+
+Berichtet Ende-zu-Ende-Latenz (p50/p95/p99), Nachrichten/s, verlorene
+Nachrichten sowie CPU-Zeit und RSS des Client-Prozesses (über /proc).
+
+Verwendung:
+    python3 bench/bench_load.py --rate 200 --duration 10 --size 500 --chunks 5
+    python3 bench/bench_load.py --direction iot-to-signal --env SIGNAL_COALESCE_ENABLED=true
+    python3 bench/bench_load.py --direction iot-to-signal --server-rate-limit 50
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import time
+
+from common import DEVICE_SCRIPT, summarize
+from mock_servers import MockGateway, MockSignalServer
+
+DEVICE_NAME = "loadtest-device"
+RECEIVE_NUMBER = "+4911111111"
+RECIPIENT_NUMBER = "+4922222222"
+
+# Markierung im Nachrichtentext: lt:<richtung>:<nummer>:
+MARKER_RE = re.compile(r"lt:([si]):(\d+):")
+
+
+def make_text(direction, seq, size):
+    marker = f"lt:{direction}:{seq}:"
+    return marker + "x" * max(0, size - len(marker))
+
+
+class ProcessSampler:
+    """CPU-Zeit und RSS eines Prozesses aus /proc (nur Linux)"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.rss_max_kb = 0
+        self.rss_last_kb = 0
+        self.available = os.path.exists(f"/proc/{pid}/stat")
+
+    def cpu_seconds(self):
+        if not self.available:
+            return 0.0
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rpartition(")")[2].split()
+            # utime und stime (Felder 14 und 15, nach comm ab Index 11)
+            return (int(fields[11]) + int(fields[12])) / self.ticks
+        except (OSError, IndexError, ValueError):
+            return 0.0
+
+    def sample_rss(self):
+        if not self.available:
+            return
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        self.rss_last_kb = int(line.split()[1])
+                        self.rss_max_kb = max(self.rss_max_kb, self.rss_last_kb)
+                        break
+        except (OSError, ValueError):
+            pass
+
+
+async def wait_until(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+async def run(args):
+    sent_at = {"s": {}, "i": {}}
+    latencies = {"s": [], "i": []}
+
+    def record(direction, text):
+        now = time.perf_counter()
+        for match in MARKER_RE.finditer(text):
+            if match.group(1) != direction:
+                continue
+            started = sent_at[direction].pop(int(match.group(2)), None)
+            if started is not None:
+                latencies[direction].append((now - started) * 1000.0)
+
+    signal = await MockSignalServer(
+        on_send=lambda body: record("i", body.get("message", "")),
+        send_delay_ms=args.server_delay_ms,
+        rate_limit=args.server_rate_limit,
+    ).start()
+    gateway = await MockGateway(
+        on_forward=lambda header, payload: record(
+            "s", payload if isinstance(payload, str) else payload.decode("utf-8", "replace")
+        ),
+    ).start()
+
+    workdir = tempfile.mkdtemp(prefix="signal-loadtest-")
+    env = dict(
+        os.environ,
+        WS_HOST="127.0.0.1",
+        WS_PORT=str(gateway.port),
+        DEVICE_NAME=DEVICE_NAME,
+        SIGNAL_SERVER_URL=f"127.0.0.1:{signal.port}",
+        SIGNAL_PROTOCOL="http",
+        SIGNAL_RECEIVE_NUMBER=RECEIVE_NUMBER,
+        SIGNAL_SEND_NUMBER=RECEIVE_NUMBER,
+        SIGNAL_RECIPIENT_NUMBER=RECIPIENT_NUMBER,
+        OUTBOX_PATH=os.path.join(workdir, "outbox.db"),
+        SIGNAL_SEND_SPILL_FILE=os.path.join(workdir, "signal-send-spill.jsonl"),
+        STATS_INTERVAL="0",
+        LOG_LEVEL=args.log_level,
+    )
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-u", DEVICE_SCRIPT,
+        cwd=workdir, env=env,
+        stdout=asyncio.subprocess.DEVNULL if not args.show_output else None,
+        stderr=asyncio.subprocess.STDOUT if not args.show_output else None,
+    )
+    sampler = ProcessSampler(process.pid)
+
+    try:
+        ready = await wait_until(
+            lambda: gateway.connected(DEVICE_NAME) and signal.connected(RECEIVE_NUMBER), args.startup_timeout
+        )
+        if not ready:
+            print("❌ Client nicht verbunden (Gateway/Signal) - Abbruch")
+            return 1
+
+        directions = ["s", "i"] if args.direction == "both" else [
+            "s" if args.direction == "signal-to-iot" else "i"
+        ]
+        interval = 1.0 / args.rate if args.rate > 0 else 0.0
+        total = int(args.rate * args.duration)
+
+        cpu_start = sampler.cpu_seconds()
+        wall_start = time.perf_counter()
+
+        async def drive(direction):
+            # Open Loop: feste Sendezeitpunkte, unabhängig von der Antwortzeit
+            for seq in range(total):
+                target = wall_start + seq * interval
+                delay = target - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                text = make_text(direction, seq, args.size)
+                sent_at[direction][seq] = time.perf_counter()
+                if direction == "s":
+                    # Signal-Zeitstempel sind nur pro Absender eindeutig: ein Absender pro Nachricht
+                    signal.push(RECEIVE_NUMBER, text, source_number=f"+49{seq:010d}")
+                else:
+                    await gateway.send_text(DEVICE_NAME, f"lt_{seq}", text, args.chunks)
+
+        async def sample_rss():
+            while True:
+                sampler.sample_rss()
+                await asyncio.sleep(0.2)
+
+        rss_task = asyncio.create_task(sample_rss())
+        await asyncio.gather(*(drive(direction) for direction in directions))
+        send_done = time.perf_counter()
+        await wait_until(lambda: not any(sent_at[d] for d in directions), args.drain_timeout)
+        wall = time.perf_counter() - wall_start
+        cpu = sampler.cpu_seconds() - cpu_start
+        rss_task.cancel()
+        sampler.sample_rss()
+
+        print(f"Last: {args.rate:g} msg/s je Richtung, {args.duration:g}s, {args.size} Zeichen, "
+              f"{args.chunks} Chunk(s), Signal-Latenz {args.server_delay_ms:g}ms")
+        if args.server_rate_limit > 0:
+            print(f"{'Signal Rate Limit':<28} {args.server_rate_limit:g}/s, {signal.rate_limited} Antworten mit 429")
+        names = {"s": "Signal -> IoT", "i": "IoT -> Signal"}
+        for direction in directions:
+            delivered = len(latencies[direction])
+            print(summarize(names[direction], latencies[direction]))
+            print(f"{'':<28} zugestellt {delivered}/{total}, verloren {len(sent_at[direction])}, "
+                  f"{delivered / wall:.1f} msg/s (Senden {send_done - wall_start:.1f}s, gesamt {wall:.1f}s)")
+        if sampler.available:
+            print(f"{'Client-Prozess':<28} CPU {cpu:.2f}s ({cpu / wall * 100:.0f}% eines Kerns), "
+                  f"RSS max {sampler.rss_max_kb / 1024:.1f} MiB / Ende {sampler.rss_last_kb / 1024:.1f} MiB")
+        else:
+            print(f"{'Client-Prozess':<28} CPU/RSS nicht verfügbar (kein /proc)")
+        return 0
+    finally:
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                process.kill()
+        await gateway.close()
+        await signal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=100.0, help="Nachrichten pro Sekunde je Richtung")
+    parser.add_argument("--duration", type=float, default=10.0, help="Dauer der Lastphase in Sekunden")
+    parser.add_argument("--size", type=int, default=200, help="Zeichen pro Nachricht")
+    parser.add_argument("--chunks", type=int, default=1, help="Chunks pro TXT Output (1 = ein finaler Frame)")
+    parser.add_argument("--direction", choices=("both", "signal-to-iot", "iot-to-signal"), default="both")
+    parser.add_argument("--server-delay-ms", type=float, default=0.0, help="Künstliche Latenz von /v2/send")
+    parser.add_argument("--server-rate-limit", type=float, default=0.0,
+                        help="Rate Limit von /v2/send in Sendungen/s (darüber 429 mit Retry-After)")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="Max. Wartezeit auf ausstehende Nachrichten")
+    parser.add_argument("--startup-timeout", type=float, default=20.0, help="Max. Wartezeit auf die Verbindungen")
+    parser.add_argument("--log-level", default="WARNING", help="LOG_LEVEL des Clients")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Zusätzliche Umgebungsvariable für den Client (mehrfach möglich)")
+    parser.add_argument("--show-output", action="store_true", help="Ausgabe des Clients anzeigen")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
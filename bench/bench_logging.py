@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Log-Kosten pro Nachricht auf dem Event-Loop-Thread
+=============================================================
+Misst, wie lange ein Log-Aufruf im Hot Path (gesendete Nachricht) den
+aufrufenden Thread blockiert:
+
+- vorher:  zwei print()-Aufrufe pro Nachricht direkt nach stdout
+- nachher: log_event() über QueueHandler, geschrieben von einem
+           Hintergrund-Thread (Text, JSON, gedrosselt, deaktiviert)
+
+Mit --stdout-delay-us wird ein langsames stdout simuliert (z.B. volle Pipe
+von `docker logs`); jeder write() blockiert dann so lange.
+
+Verwendung:
+    python3 bench/bench_logging.py --messages 20000 --stdout-delay-us 50
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import time
+
+from common import load_device_module, percentile
+
+
+class SlowSink:
+    """stdout-Ersatz, dessen write() eine feste Zeit blockiert"""
+
+    def __init__(self, delay_us):
+        self.delay = delay_us / 1_000_000.0
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def summarize_us(name, values_us):
+    return (
+        f"{name:<32} n={len(values_us):<7} "
+        f"mean={statistics.mean(values_us):8.2f}µs "
+        f"p50={percentile(values_us, 50):8.2f}µs "
+        f"p99={percentile(values_us, 99):8.2f}µs"
+    )
+
+
+def measure(call, messages):
+    timings = []
+    for i in range(messages):
+        start = time.perf_counter_ns()
+        call(i)
+        timings.append((time.perf_counter_ns() - start) / 1000.0)
+    return timings
+
+
+def run_logging(device, args, log_format, level="INFO", hot_rate=0.0):
+    """Ein Durchlauf mit QueueHandler; gibt (Timings, Drain-Zeit in ms) zurück"""
+    sink = SlowSink(args.stdout_delay_us)
+    device.LOG_FORMAT = log_format
+    device.LOG_LEVEL = level
+    device.hot_path_sampler = device.HotPathSampler(rate=hot_rate, sample=1.0)
+    stdout, sys.stdout = sys.stdout, sink
+    try:
+        listener = device.setup_logging()
+
+        def call(i):
+            device.log_event(
+                device.log_signal, logging.INFO, "✅ [Signal] Nachricht gesendet", hot=True,
+                recipient=device.redact_number("+4915112345678"),
+                text=device.redact_text(f"Benchmark-Nachricht {i} " + "x" * 200),
+            )
+
+        timings = measure(call, args.messages)
+        drain_start = time.perf_counter()
+        listener.stop()
+        drain_ms = (time.perf_counter() - drain_start) * 1000.0
+    finally:
+        sys.stdout = stdout
+    return timings, drain_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="Anzahl Log-Aufrufe pro Durchlauf")
+    parser.add_argument("--stdout-delay-us", type=float, default=0.0, help="Simulierte Blockierzeit pro stdout-write")
+    args = parser.parse_args()
+
+    device = load_device_module()
+
+    # Vorher: zwei print() pro Nachricht wie im alten send_signal_message()
+    sink = SlowSink(args.stdout_delay_us)
+
+    def print_call(i):
+        message = f"Benchmark-Nachricht {i} " + "x" * 200
+        print("✅ [Signal] Nachricht gesendet an +4915112345678", file=sink)
+        print(f"   → Nachricht: {message[:100]}", file=sink)
+
+    results = [("print() direkt", measure(print_call, args.messages), None)]
+    for name, log_format, level, hot_rate in (
+        ("log_event Text (Queue)", "text", "INFO", 0.0),
+        ("log_event JSON (Queue)", "json", "INFO", 0.0),
+        ("log_event JSON, 50/s gedrosselt", "json", "INFO", 50.0),
+        ("log_event deaktiviert (WARNING)", "json", "WARNING", 0.0),
+    ):
+        timings, drain_ms = run_logging(device, args, log_format, level, hot_rate)
+        results.append((name, timings, drain_ms))
+
+    for name, timings, drain_ms in results:
+        line = summarize_us(name, timings)
+        if drain_ms is not None:
+            line += f"  Hintergrund-Drain {drain_ms:8.1f}ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
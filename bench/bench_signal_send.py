@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Signal-Versand mit neuem Client pro Nachricht vs. gemeinsamem Pool
+=============================================================================
+Startet einen lokalen Stub für signal-cli-rest-api (/v2/send) und misst die
+Latenz von send_signal_message():
+
+- vorher:  neuer httpx.AsyncClient pro Nachricht (altes Verhalten)
+- nachher: gemeinsamer, langlebiger Client mit Keep-Alive Connection-Pool
+
+Verwendung:
+    python3 bench/bench_signal_send.py --messages 500 --server-delay-ms 1
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+import httpx
+
+from common import load_device_module, start_http_stub, summarize
+
+
+async def run(args):
+    sent = 0
+
+    async def handler(method, path, headers, body):
+        nonlocal sent
+        if args.server_delay_ms:
+            await asyncio.sleep(args.server_delay_ms / 1000.0)
+        sent += 1
+        return 201, b'{"timestamp":"1"}'
+
+    server, port = await start_http_stub(handler)
+    device = load_device_module(
+        SIGNAL_SERVER_URL=f"http://127.0.0.1:{port}",
+        SIGNAL_PROTOCOL="http",
+    )
+    account = device.SignalAccount()
+
+    async def send_with_new_client(message):
+        # Altes Verhalten: neuer Client (und neue TCP-Verbindung) pro Nachricht
+        payload = {
+            "message": message,
+            "number": account.send_number,
+            "recipients": [account.recipient_number],
+        }
+        async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
+            response = await client.post(
+                account.signal_api_url,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+            )
+            response.raise_for_status()
+
+    async def send_with_pool(message):
+        await device.send_signal_message(account, message)
+
+    async def measure(send):
+        latencies = []
+        for i in range(args.messages):
+            start = time.perf_counter()
+            await send(f"Benchmark-Nachricht {i}")
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        return latencies
+
+    # Log-Ausgaben des Clients nicht mitmessen
+    with contextlib.redirect_stdout(io.StringIO()):
+        before = await measure(send_with_new_client)
+        device.get_signal_http_client()
+        try:
+            after = await measure(send_with_pool)
+        finally:
+            await device.close_signal_http_client()
+
+    server.close()
+    await server.wait_closed()
+
+    print(summarize("neuer Client pro Nachricht", before))
+    print(summarize("gemeinsamer Pool", after))
+    print(f"Stub hat {sent} Nachrichten empfangen")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300, help="Anzahl Nachrichten pro Durchlauf")
+    parser.add_argument("--server-delay-ms", type=float, default=0.0, help="Künstliche Stub-Latenz in ms")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Gemeinsame Hilfsfunktionen für die Benchmarks
+=============================================
+Lädt app/device-signal.py als Modul (Dateiname mit Bindestrich) und
+stellt einfache Statistik- und Stub-Server-Helfer bereit.
+"""
+
+import asyncio
+import importlib.util
+import os
+import statistics
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEVICE_SCRIPT = os.path.join(ROOT_DIR, "app", "device-signal.py")
+
+
+def load_device_module(**env):
+    """
+    Importiert device-signal.py als Modul 'device_signal'.
+    Zusätzliche Keyword-Argumente werden vorher als Umgebungsvariablen gesetzt,
+    da die Konfiguration beim Import gelesen wird.
+    """
+    for key, value in env.items():
+        os.environ[key] = str(value)
+    spec = importlib.util.spec_from_file_location("device_signal", DEVICE_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(values, pct):
+    """Perzentil (nearest-rank) einer Liste von Werten"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(name, values_ms):
+    """Formatiert Latenzwerte (in ms) als eine Ergebniszeile"""
+    if not values_ms:
+        return f"{name:<28} keine Messwerte"
+    return (
+        f"{name:<28} n={len(values_ms):<6} "
+        f"mean={statistics.mean(values_ms):7.3f}ms "
+        f"p50={percentile(values_ms, 50):7.3f}ms "
+        f"p95={percentile(values_ms, 95):7.3f}ms "
+        f"p99={percentile(values_ms, 99):7.3f}ms"
+    )
+
+
+async def start_http_stub(handler, host="127.0.0.1", port=0):
+    """
+    Minimaler HTTP/1.1-Server mit Keep-Alive.
+    handler(method, path, headers, body) -> (status, body_bytes) (darf async sein)
+    Gibt (server, port) zurück.
+    """
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                body = await reader.readexactly(length) if length else b""
+
+                result = handler(method, path, headers, body)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                status, response_body = result
+
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(response_body)}\r\n"
+                    f"\r\n".encode("latin-1") + response_body
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    return server, server.sockets[0].getsockname()[1]
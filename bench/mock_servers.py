@@ -0,0 +1,307 @@
+"""
+Lokale Stand-ins für signal-cli-rest-api und das IoT Orchestrator Gateway
+=========================================================================
+Beide laufen in der asyncio-Loop des Lasttests und zeichnen auf, was der
+Client sendet:
+
+- MockSignalServer: WebSocket /v1/receive/{number}, POST /v2/send und
+  GET /v1/attachments/{id} auf einem Port (wie signal-cli-rest-api). Das WebSocket-Protokoll ist von Hand
+  implementiert, weil die websockets-Bibliothek keine POST-Requests
+  annimmt.
+- MockGateway: WebSocket /ws/external mit Willkommensnachricht; sendet
+  Header/Payload-Frames (auch gestreamt in mehreren Chunks) und sammelt
+  die weitergeleiteten Signal-Nachrichten.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import time
+
+import websockets
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+def encode_ws_frame(payload, opcode=OPCODE_TEXT):
+    """Ein unmaskierter Server-Frame (FIN gesetzt)"""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_ws_frame(reader):
+    """Liest einen (maskierten) Client-Frame: (opcode, payload)"""
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", await reader.readexactly(8))
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length) if length else b""
+    if mask:
+        payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+    return opcode, payload
+
+
+class MockSignalServer:
+    """
+    signal-cli-rest-api Stand-in
+
+    push(number, text) stellt eine Nachricht an alle verbundenen
+    /v1/receive/{number}-Clients zu; on_send(body) wird für jeden
+    POST /v2/send mit dem JSON-Body aufgerufen. Anhänge aus
+    push(..., attachments={id: bytes}) liefert GET /v1/attachments/{id}.
+    Mit `rate_limit` (Sendungen/s) antwortet /v2/send darüber hinaus mit
+    429 und Retry-After wie der Signal-Server.
+    """
+
+    def __init__(self, on_send=None, send_delay_ms=0.0, host="127.0.0.1", port=0, rate_limit=0.0):
+        self.on_send = on_send
+        self.send_delay = send_delay_ms / 1000.0
+        self.rate_limit = rate_limit
+        self.rate_tokens = max(1.0, rate_limit)
+        self.rate_updated = time.monotonic()
+        self.rate_limited = 0
+        self.host = host
+        self.port = port
+        self.server = None
+        # Nummer -> Liste verbundener StreamWriter
+        self.receivers = {}
+        self.sends = 0
+        self.envelope_timestamp = 0
+        # Anhang-ID -> Inhalt
+        self.attachments = {}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        for writers in self.receivers.values():
+            for writer in writers:
+                writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def connected(self, number=None):
+        if number is None:
+            return sum(len(writers) for writers in self.receivers.values())
+        return len(self.receivers.get(number, ()))
+
+    def push(self, number, text, source_number="+4900000000", source_name="Lasttest", attachments=None):
+        """Stellt eine Nachricht wie signal-cli als Envelope zu"""
+        # Zeitstempel wie bei signal-cli: vom Absender gesetzt, nicht eindeutig
+        self.envelope_timestamp = int(time.time() * 1000)
+        data_message = {"timestamp": self.envelope_timestamp, "message": text}
+        if attachments:
+            self.attachments.update(attachments)
+            data_message["attachments"] = [
+                {"id": attachment_id, "contentType": "application/octet-stream", "size": len(content)}
+                for attachment_id, content in attachments.items()
+            ]
+        frame = encode_ws_frame(json.dumps({
+            "envelope": {
+                "source": source_number,
+                "sourceNumber": source_number,
+                "sourceName": source_name,
+                "timestamp": self.envelope_timestamp,
+                "dataMessage": data_message,
+            },
+            "account": number,
+        }))
+        writers = self.receivers.get(number, ())
+        for writer in writers:
+            writer.write(frame)
+        return len(writers)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                if headers.get("upgrade", "").lower() == "websocket" and path.startswith("/v1/receive/"):
+                    await self._serve_websocket(path[len("/v1/receive/"):], headers, reader, writer)
+                    return
+
+                length = int(headers.get("content-length", "0"))
+                body = await reader.readexactly(length) if length else b""
+                extra_headers = ""
+                if method == "POST" and path == "/v2/send" and not self._take_token():
+                    self.rate_limited += 1
+                    status, response = 429, b'{"error":"rate limit exceeded"}'
+                    extra_headers = f"Retry-After: {1.0 / self.rate_limit:.3f}\r\n"
+                elif method == "POST" and path == "/v2/send":
+                    status, response = await self._send(body)
+                elif method == "GET" and path.startswith("/v1/attachments/"):
+                    content = self.attachments.get(path[len("/v1/attachments/"):])
+                    status, response = (200, content) if content is not None else (404, b'{"error":"not found"}')
+                else:
+                    status, response = 404, b'{"error":"not found"}'
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(response)}\r\n"
+                    f"{extra_headers}\r\n".encode("latin-1") + response
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _take_token(self):
+        if self.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        self.rate_tokens = min(max(1.0, self.rate_limit), self.rate_tokens + (now - self.rate_updated) * self.rate_limit)
+        self.rate_updated = now
+        if self.rate_tokens < 1:
+            return False
+        self.rate_tokens -= 1
+        return True
+
+    async def _send(self, body):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400, b'{"error":"invalid json"}'
+        self.sends += 1
+        if self.on_send is not None:
+            self.on_send(payload)
+        return 201, b'{"timestamp":"1"}'
+
+    async def _serve_websocket(self, number, headers, reader, writer):
+        accept = base64.b64encode(
+            hashlib.sha1((headers.get("sec-websocket-key", "") + WS_GUID).encode("latin-1")).digest()
+        ).decode("latin-1")
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+
+        self.receivers.setdefault(number, []).append(writer)
+        try:
+            while True:
+                opcode, payload = await read_ws_frame(reader)
+                if opcode == OPCODE_CLOSE:
+                    writer.write(encode_ws_frame(payload[:2], OPCODE_CLOSE))
+                    await writer.drain()
+                    break
+                if opcode == OPCODE_PING:
+                    writer.write(encode_ws_frame(payload, OPCODE_PONG))
+        finally:
+            self.receivers[number].remove(writer)
+
+
+class MockGateway:
+    """
+    IoT Orchestrator Gateway Stand-in (/ws/external)
+
+    on_forward(header, payload) wird für jede weitergeleitete Signal-Nachricht
+    aufgerufen. send_text() schickt TXT Output an ein verbundenes Gerät,
+    optional in `chunks` gestreamten Teilen.
+    """
+
+    def __init__(self, on_forward=None, host="127.0.0.1", port=0):
+        self.on_forward = on_forward
+        self.host = host
+        self.port = port
+        self.server = None
+        # clientId -> Verbindung
+        self.devices = {}
+        self.forwarded = 0
+
+    async def start(self):
+        self.server = await websockets.serve(self._handle, self.host, self.port, max_size=None)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def connected(self, device_name=None):
+        if device_name is None:
+            return len(self.devices)
+        return 1 if device_name in self.devices else 0
+
+    async def send_text(self, device_name, session_id, text, chunks=1):
+        """TXT Output an ein Gerät: Header + Payload pro Chunk, letzter Chunk final"""
+        connection = self.devices.get(device_name)
+        if connection is None:
+            return False
+        chunks = max(1, min(chunks, len(text) or 1))
+        step = -(-len(text) // chunks)
+        for index in range(chunks):
+            part = text[index * step:(index + 1) * step]
+            await connection.send(json.dumps({
+                "id": session_id,
+                "type": "text",
+                "final": index == chunks - 1,
+            }))
+            await connection.send(part)
+        return True
+
+    async def _handle(self, connection):
+        query = connection.request.path.partition("?")[2]
+        params = dict(item.partition("=")[::2] for item in query.split("&") if item)
+        device_name = params.get("clientId", "unknown")
+        self.devices[device_name] = connection
+        try:
+            await connection.send(json.dumps({"type": "welcome", "connectionId": f"mock-{device_name}"}))
+            header = None
+            async for message in connection:
+                if isinstance(message, str):
+                    try:
+                        data = json.loads(message)
+                    except ValueError:
+                        data = None
+                    if isinstance(data, dict) and "id" in data and "type" in data:
+                        header = data
+                        continue
+                if header is not None:
+                    self.forwarded += 1
+                    if self.on_forward is not None:
+                        self.on_forward(header, message)
+                    header = None
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if self.devices.get(device_name) is connection:
+                del self.devices[device_name]
@@ -0,0 +1,27 @@
+"""
+Gemeinsame Fixtures für die Tests
+=================================
+Lädt app/device-signal.py als Modul (Dateiname mit Bindestrich), wie
+bench/common.py für die Benchmarks.
+"""
+
+import importlib.util
+import os
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEVICE_SCRIPT = os.path.join(ROOT_DIR, "app", "device-signal.py")
+
+
+def load_device_module():
+    spec = importlib.util.spec_from_file_location("device_signal", DEVICE_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def device():
+    """device-signal.py, einmal pro Testlauf importiert"""
+    return load_device_module()
@@ -0,0 +1,42 @@
+"""
+Tests für SignalCoalescer
+=========================
+Aufgeteilte Nachrichten bleiben Teil für Teil in der Outbox.
+"""
+
+import asyncio
+
+
+def test_failed_split_part_stays_in_outbox(device, tmp_path, monkeypatch):
+    sent = []
+
+    async def fake_send(account, message, recipient=None):
+        # Erster POST schlägt vorübergehend fehl, alle weiteren gehen durch
+        sent.append(message)
+        return len(sent) > 1
+
+    monkeypatch.setattr(device, "send_signal_message", fake_send)
+
+    async def scenario():
+        account = device.SignalAccount(receive_number="+4915100000001", signal_server_url="localhost:1")
+        account.outbox = device.Outbox(str(tmp_path / "outbox.db"))
+        account.send_queue = device.SignalSendQueue(account, workers=1)
+        account.send_queue.start()
+        account.coalescer = device.SignalCoalescer(account, window_ms=1000, max_chars=10000, max_length=20)
+
+        await device.queue_signal_message(account, "Erster Satz hier.  ", message_id="m1")
+        await device.queue_signal_message(account, "Zweiter Satz dort.  ", message_id="m2")
+        await account.coalescer.close()
+        await account.send_queue.stop()
+        pending = account.outbox.pending_items("signal")
+        await account.outbox.close()
+        return pending
+
+    pending = asyncio.run(scenario())
+    assert sent == ["Erster Satz hier.", "Zweiter Satz dort."]
+    assert pending == [("m1_c0", {"message": "Erster Satz hier.", "recipient": None, "priority": "interactive"})]
+
+
+def test_split_strips_trailing_whitespace(device):
+    parts = device.split_signal_message("Ein Satz. Noch ein Satz.   \n", 12)
+    assert parts == ["Ein Satz.", "Noch ein", "Satz."]
@@ -0,0 +1,167 @@
+"""
+Fuzz-Tests für IotStreamDemux
+=============================
+Zufällige, aber reproduzierbare (Seed) Verschachtelungen von Headern und
+Payloads mehrerer Sitzungen. Jeder Payload trägt "<id>:<seq>", so lässt
+sich prüfen, dass er dem richtigen Header zugeordnet wurde und jede
+Sitzung in Reihenfolge ankommt.
+"""
+
+import random
+
+import pytest
+
+SEEDS = range(200)
+
+
+def make_sessions(rng, count, max_chunks):
+    """Sitzungs-id -> Anzahl Chunks"""
+    return {f"s{index}": rng.randint(1, max_chunks) for index in range(count)}
+
+
+def chunk(session_id, seq, total):
+    header = {"id": session_id, "seq": seq, "final": seq == total - 1}
+    return header, f"{session_id}:{seq}"
+
+
+def shuffled_frames(rng, sessions, jitter):
+    """
+    Chunks aller Sitzungen gemischt; innerhalb einer Sitzung wird jeder Chunk
+    um weniger als `jitter` Positionen nach hinten verschoben
+    """
+    per_session = {
+        session_id: sorted(range(total), key=lambda seq: seq + rng.uniform(0, jitter))
+        for session_id, total in sessions.items()
+    }
+    frames = []
+    while per_session:
+        session_id = rng.choice(sorted(per_session))
+        frames.append(chunk(session_id, per_session[session_id].pop(0), sessions[session_id]))
+        if not per_session[session_id]:
+            del per_session[session_id]
+    return frames
+
+
+def feed(demux, rng, frames, max_lead):
+    """
+    Header laufen den Payloads zufällig bis zu `max_lead` Frames voraus
+    (H1 H2 P1 H3 P2 P3 ...). Gibt die ausgelieferten seqs pro Sitzung zurück.
+    """
+    delivered = {}
+    headers = payloads = 0
+    while payloads < len(frames):
+        lead = headers - payloads
+        if headers < len(frames) and lead < max_lead and (lead == 0 or rng.random() < 0.5):
+            demux.push_header(frames[headers][0])
+            headers += 1
+            continue
+        for header, payload in demux.push_payload(frames[payloads][1]):
+            assert payload == f"{header['id']}:{header['seq']}"
+            delivered.setdefault(header["id"], []).append(header["seq"])
+        payloads += 1
+    return delivered
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_reorder_within_window(device, seed):
+    rng = random.Random(seed)
+    window = rng.randint(1, 8)
+    demux = device.IotStreamDemux(max_pending=64, reorder_window=window, max_sessions=64)
+    sessions = make_sessions(rng, rng.randint(1, 6), 30)
+
+    delivered = feed(demux, rng, shuffled_frames(rng, sessions, window), max_lead=rng.randint(1, 16))
+
+    assert delivered == {session_id: list(range(total)) for session_id, total in sessions.items()}
+    stats = demux.stats()
+    assert stats["gaps"] == 0
+    assert stats["sessions"] == 0
+    assert stats["orphans"] == 0
+    assert not demux.has_pending()
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_reorder_beyond_window(device, seed):
+    rng = random.Random(seed)
+    window = rng.randint(1, 4)
+    demux = device.IotStreamDemux(max_pending=64, reorder_window=window, max_sessions=64)
+    sessions = make_sessions(rng, rng.randint(1, 6), 30)
+
+    delivered = feed(demux, rng, shuffled_frames(rng, sessions, 4 * window), max_lead=rng.randint(1, 16))
+
+    missing = 0
+    for session_id, total in sessions.items():
+        seqs = delivered.get(session_id, [])
+        # Übersprungene Lücken fehlen, der Rest bleibt in Reihenfolge und ohne Duplikate
+        assert seqs == sorted(set(seqs))
+        assert set(seqs) <= set(range(total))
+        # Der finale Chunk kommt immer an und schließt die Sitzung ab
+        assert seqs[-1] == total - 1
+        missing += total - len(seqs)
+    stats = demux.stats()
+    assert (stats["gaps"] > 0) == (missing > 0)
+    assert stats["sessions"] == 0
+    assert not demux.has_pending()
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_duplicates_delivered_once(device, seed):
+    rng = random.Random(seed)
+    window = rng.randint(2, 8)
+    demux = device.IotStreamDemux(max_pending=64, reorder_window=window, max_sessions=64)
+    sessions = make_sessions(rng, rng.randint(1, 4), 20)
+
+    frames = shuffled_frames(rng, sessions, window)
+    # Wiederholte Chunks (z.B. erneut gesendet), auch nach dem finalen Chunk
+    for _ in range(rng.randint(1, 10)):
+        index = rng.randrange(len(frames))
+        frames.insert(rng.randint(index + 1, len(frames)), frames[index])
+
+    delivered = feed(demux, rng, frames, max_lead=rng.randint(1, 16))
+
+    assert delivered == {session_id: list(range(total)) for session_id, total in sessions.items()}
+    assert demux.stats()["sessions"] == 0
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_sticky_non_final_header(device, seed):
+    rng = random.Random(seed)
+    demux = device.IotStreamDemux(max_pending=64)
+
+    current = None
+    for index in range(rng.randint(1, 30)):
+        header = {"id": f"s{index}", "final": rng.random() < 0.3}
+        demux.push_header(header)
+        current = header
+        # Ein Header, mehrere Chunks: der erste Payload gehört immer zum Header,
+        # weitere nur, solange er nicht final ist
+        for count in range(rng.randint(1, 5)):
+            orphans = demux.stats()["orphans"]
+            result = demux.push_payload(f"{header['id']}:{count}")
+            if count == 0 or not current["final"]:
+                assert result == [(current, f"{header['id']}:{count}")]
+            else:
+                assert result == []
+                assert demux.stats()["orphans"] == orphans + 1
+        assert demux.has_pending() == (not current["final"])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_max_pending_overflow(device, seed):
+    rng = random.Random(seed)
+    max_pending = rng.randint(1, 20)
+    demux = device.IotStreamDemux(max_pending=max_pending)
+
+    count = rng.randint(1, 3 * max_pending)
+    headers = [{"id": f"s{index}", "final": True} for index in range(count)]
+    for header in headers:
+        demux.push_header(header)
+        assert demux.stats()["pending_headers"] <= max_pending
+
+    # Die ältesten Header werden verdrängt, die übrigen bleiben in FIFO-Reihenfolge
+    dropped = max(0, count - max_pending)
+    assert demux.stats()["dropped_headers"] == dropped
+    for header in headers[dropped:]:
+        assert demux.push_payload(header["id"]) == [(header, header["id"])]
+    assert demux.push_payload("ohne Header") == []
+    assert demux.stats()["orphans"] == 1
+    assert not demux.has_pending()
@@ -0,0 +1,90 @@
+"""
+Tests für IotWriter
+===================
+Gebündelter Write nur mit getesteter websockets-Version, sonst Frame für Frame.
+"""
+
+import asyncio
+
+import websockets
+
+
+class FakeConnection:
+    """Verbindung ohne websockets.asyncio-Interna"""
+
+    def __init__(self):
+        self.frames = []
+
+    async def send(self, message):
+        self.frames.append(message)
+
+
+async def with_server(scenario):
+    """Startet einen lokalen Server, der alle Frames sammelt"""
+    received = []
+
+    async def handler(websocket):
+        async for message in websocket:
+            received.append(message)
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        async with websockets.connect(f"ws://127.0.0.1:{port}") as connection:
+            await scenario(connection)
+            await connection.close()
+        await asyncio.sleep(0.05)
+    return received
+
+
+def test_version_gate(device):
+    assert device.websockets_version("17.2") == (17, 2)
+    assert device.websockets_version("16.1.1") == (16, 1)
+    assert device.websockets_version("unbekannt") is None
+    connection = FakeConnection()
+    assert device.iot_batch_write_supported(connection) is False
+
+    async def check(connection):
+        assert device.iot_batch_write_supported(connection, "15.0") is False
+        assert device.iot_batch_write_supported(connection, "18.0") is False
+        assert device.iot_batch_write_supported(connection, "16.0") is True
+
+    asyncio.run(with_server(check))
+
+
+def test_fallback_sends_frame_by_frame(device):
+    async def scenario():
+        connection = FakeConnection()
+        writer = device.IotWriter(connection)
+        writer.start()
+        await asyncio.gather(writer.send({"id": "a"}, "eins"), writer.send({"id": "b"}, "zwei"))
+        await writer.stop()
+        return writer.batch_write, connection.frames
+
+    batch_write, frames = asyncio.run(scenario())
+    assert batch_write is False
+    assert frames == ['{"id":"a"}', "eins", '{"id":"b"}', "zwei"]
+
+
+def test_batch_waits_for_fragmented_message(device):
+    async def scenario(connection):
+        release = asyncio.Event()
+
+        async def fragments():
+            yield "frag1"
+            await release.wait()
+            yield "frag2"
+
+        fragmented = asyncio.create_task(connection.send(fragments()))
+        await asyncio.sleep(0.01)
+        writer = device.IotWriter(connection)
+        assert writer.batch_write
+        writer.start()
+        sends = asyncio.gather(*(writer.send({"id": f"m{index}"}, f"p{index}") for index in range(3)))
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await sends == [True, True, True]
+        await fragmented
+        await writer.stop()
+
+    received = asyncio.run(with_server(scenario))
+    assert received == ["frag1frag2", '{"id":"m0"}', "p0", '{"id":"m1"}', "p1", '{"id":"m2"}', "p2"]
@@ -0,0 +1,147 @@
+"""
+Tests für die Weiterleitung von Signal-Anhängen an IoT
+======================================================
+signal-cli wird über httpx.MockTransport nachgebaut, die IoT-Verbindung
+durch einen Writer, der die Frames sammelt.
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+
+class FakeWriter:
+    closed_exc = None
+
+    def __init__(self):
+        self.frames = []
+
+    async def send(self, header, message):
+        self.frames.append((header, message))
+        return True
+
+
+@pytest.fixture
+def account(device, tmp_path):
+    account = device.SignalAccount(receive_number="+4915100000001", signal_server_url="localhost:1")
+    account.outbox = device.Outbox(str(tmp_path / "outbox.db"))
+    account.signal_inbox = device.SignalInbox()
+    yield account
+    account.outbox.executor.shutdown(wait=True)
+    account.outbox.db.close()
+
+
+@pytest.fixture
+def signal_cli(device, monkeypatch):
+    """Setzt den Handler für /v1/attachments/{id}; liefert die Liste der Aufrufe"""
+    state = {"handler": None, "calls": []}
+
+    async def handle(request):
+        state["calls"].append(request.url.path)
+        return await state["handler"](request)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    monkeypatch.setattr(device, "get_signal_http_client", lambda: client)
+    monkeypatch.setattr(device, "media_download_slots", None)
+    return state
+
+
+def attachment_item(device, account, media_id="m_a0"):
+    attachment = device.SignalAttachment("att1", "image/png", "bild.png", 3)
+    header = {"type": "image", "id": media_id, "metadata": {}}
+    account.outbox.add("iot", media_id, device.iot_outbox_payload(header, attachment))
+    return media_id, header, attachment
+
+
+def test_transient_error_is_retried(device, account, signal_cli):
+    async def unavailable(request):
+        return httpx.Response(503)
+
+    signal_cli["handler"] = unavailable
+
+    async def scenario():
+        writer = FakeWriter()
+        media_id, header, attachment = attachment_item(device, account)
+        result = await device.stream_signal_attachment(account, writer, header, attachment)
+        return result, writer.frames, [message_id for message_id, _ in account.outbox.pending_items("iot")]
+
+    result, frames, pending = asyncio.run(scenario())
+    assert result is False
+    assert frames == []
+    assert pending == ["m_a0"]
+
+
+def test_missing_attachment_is_dropped(device, account, signal_cli):
+    async def gone(request):
+        return httpx.Response(404)
+
+    signal_cli["handler"] = gone
+
+    async def scenario():
+        media_id, header, attachment = attachment_item(device, account)
+        result = await device.stream_signal_attachment(account, FakeWriter(), header, attachment)
+        return result, account.outbox.pending_items("iot")
+
+    assert asyncio.run(scenario()) == (None, [])
+
+
+def test_forward_retries_after_timeout(device, account, signal_cli, monkeypatch):
+    monkeypatch.setattr(device, "IOT_RECONNECT_DELAY", 0.01)
+
+    async def flaky(request):
+        if len(signal_cli["calls"]) == 1:
+            raise httpx.PoolTimeout("pool voll")
+        return httpx.Response(200, content=b"abc")
+
+    signal_cli["handler"] = flaky
+
+    async def scenario():
+        writer = FakeWriter()
+        media_id, header, attachment = attachment_item(device, account)
+        account.signal_inbox.put((media_id, header, attachment, time.monotonic()))
+        task = asyncio.create_task(device.forward_signal_inbox(account, writer))
+        for _ in range(100):
+            if writer.frames:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return writer.frames, account.outbox.pending_items("iot")
+
+    frames, pending = asyncio.run(scenario())
+    assert len(signal_cli["calls"]) == 2
+    assert [(header["seq"], header["final"], payload) for header, payload in frames] == [(0, True, b"abc")]
+    assert pending == []
+
+
+def test_replay_limits_concurrent_downloads(device, account, signal_cli, monkeypatch):
+    monkeypatch.setattr(device, "MEDIA_DOWNLOAD_CONCURRENCY", 2)
+    active = {"now": 0, "max": 0}
+
+    async def slow(request):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        if request.url.path.endswith("/att1") and len(signal_cli["calls"]) <= 2:
+            return httpx.Response(500)
+        return httpx.Response(200, content=b"abc")
+
+    signal_cli["handler"] = slow
+
+    async def scenario():
+        writer = FakeWriter()
+        for index in range(8):
+            attachment = device.SignalAttachment(f"att{index}", "image/png", None, 3)
+            header = {"type": "image", "id": f"m_a{index}", "metadata": {}}
+            account.outbox.add("iot", f"m_a{index}", device.iot_outbox_payload(header, attachment))
+        await device.replay_iot_outbox(account, writer)
+        return len(writer.frames), account.signal_inbox.session_ids()
+
+    delivered, requeued = asyncio.run(scenario())
+    assert active["max"] == 2
+    # Vorübergehend gescheitert: geht zur Wiederholung in den Signal-Eingang
+    assert delivered == 7
+    assert requeued == {"m_a1"}
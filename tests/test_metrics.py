@@ -0,0 +1,71 @@
+"""
+Tests für render_metrics
+========================
+stats()-Zähler erscheinen als Counter mit Suffix _total, Füllstände als Gauges.
+"""
+
+import asyncio
+
+
+def parse_families(text):
+    """Metrikname -> (Typ, Beschreibung, Zeilen)"""
+    families = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, help_text = line[len("# HELP "):].split(" ", 1)
+            families[name] = [None, help_text, []]
+        elif line.startswith("# TYPE "):
+            name, kind = line[len("# TYPE "):].split(" ", 1)
+            families[name][0] = kind
+        elif line:
+            name = line.split("{", 1)[0].split(" ", 1)[0]
+            if name not in families:
+                # Histogramme: _bucket/_sum/_count gehören zur Basis-Familie
+                name = name.rsplit("_", 1)[0]
+            families[name][2].append(line)
+    return families
+
+
+def test_stats_fields_cover_all_components(device, tmp_path):
+    async def scenario():
+        account = device.SignalAccount(receive_number="+4915100000001", signal_server_url="localhost:1")
+        account.outbox = device.Outbox(str(tmp_path / "outbox.db"))
+        account.iot_demux = device.IotStreamDemux()
+        account.signal_inbox = device.SignalInbox()
+        account.send_queue = device.SignalSendQueue(account)
+        account.coalescer = device.SignalCoalescer(account)
+        stats = {}
+        for component, getter in device.METRICS_STATS_SOURCES:
+            source = getter(account)
+            if source is not None:
+                stats[component] = source.stats()
+        await account.outbox.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    for component, values in stats.items():
+        fields = device.METRICS_STATS_FIELDS[component]
+        numeric = {key for key, value in values.items()
+                   if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        assert numeric <= set(fields), component
+
+
+def test_counters_get_total_suffix(device):
+    account = device.SignalAccount(receive_number="+4915100000001", signal_server_url="localhost:1")
+    account.signal_inbox = device.SignalInbox(max_items=1)
+    account.signal_inbox.put("a")
+    account.signal_inbox.put("b")
+
+    families = parse_families(device.render_metrics([account]))
+
+    kind, help_text, lines = families["signal_device_signal_inbox_dropped_total"]
+    assert kind == "counter"
+    assert "stats()" not in help_text
+    assert lines[0].endswith(" 1")
+    assert families["signal_device_signal_inbox_received_total"][0] == "counter"
+    assert families["signal_device_signal_inbox_depth"][0] == "gauge"
+    assert "signal_device_signal_inbox_dropped" not in families
+    assert families["signal_device_session_buffer_bytes"][0] == "gauge"
+    assert families["signal_device_session_buffer_evicted_total"][0] == "counter"
+    for name, (kind, help_text, _) in families.items():
+        assert "stats()" not in help_text, name
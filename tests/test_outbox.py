@@ -0,0 +1,127 @@
+"""
+Tests für die Outbox
+====================
+Deduplizierung pro Kanal und Migration älterer Datenbanken.
+"""
+
+import asyncio
+import sqlite3
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_reply_may_echo_input_id(device, tmp_path, monkeypatch):
+    sent = []
+
+    async def fake_send(account, message, recipient=None):
+        sent.append((message, recipient))
+        return True
+
+    monkeypatch.setattr(device, "send_signal_message", fake_send)
+
+    async def scenario():
+        account = device.SignalAccount(receive_number="+4915100000001", signal_server_url="localhost:1")
+        account.outbox = device.Outbox(str(tmp_path / "outbox.db"))
+        session_id = "signal_signal-device_4917600000002_1700000000000"
+        # Eingang an IoT weitergeleitet und bestätigt, Antwort-Route gemerkt
+        assert account.outbox.add("iot", session_id, {"header": {"id": session_id}, "message": "Hallo"})
+        account.outbox.ack("iot", session_id)
+        account.routes.add(session_id, "+4917600000002")
+
+        # Antwort trägt die ID der Eingabe als Header-id
+        await device.handle_iot_text_payload(account, {"id": session_id, "final": True}, "Antwort")
+        stats = account.outbox.stats()
+        await account.outbox.close()
+        return stats
+
+    stats = run(scenario())
+    assert sent == [("Antwort", "+4917600000002")]
+    assert stats["duplicates"] == 0
+    assert stats["pending"] == 0
+
+
+def test_duplicate_within_channel(device, tmp_path):
+    async def scenario():
+        outbox = device.Outbox(str(tmp_path / "outbox.db"))
+        results = [
+            outbox.add("iot", "m1", {}),
+            outbox.add("iot", "m1", {}),
+            outbox.add("signal", "m1", {}),
+        ]
+        outbox.ack("iot", "m1")
+        await outbox.close()
+
+        reopened = device.Outbox(str(tmp_path / "outbox.db"))
+        pending = reopened.pending_items("signal"), reopened.pending_items("iot")
+        duplicate = reopened.add("iot", "m1", {})
+        await reopened.close()
+        return results, pending, duplicate
+
+    results, pending, duplicate = run(scenario())
+    assert results == [True, False, True]
+    assert pending == ([("m1", {})], [])
+    assert duplicate is False
+
+
+def test_migrates_single_id_schema(device, tmp_path):
+    path = str(tmp_path / "outbox.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE outbox (id TEXT PRIMARY KEY, channel TEXT NOT NULL, payload TEXT NOT NULL,"
+        " created REAL NOT NULL, delivered REAL)"
+    )
+    db.execute("INSERT INTO outbox VALUES ('a', 'signal', '{\"message\": \"x\"}', 1, NULL)")
+    db.execute("INSERT INTO outbox VALUES ('b', 'iot', '{}', 2, 1e12)")
+    db.commit()
+    db.close()
+
+    async def scenario():
+        outbox = device.Outbox(path)
+        state = outbox.pending_items("signal"), outbox.add("iot", "b", {}), outbox.add("signal", "b", {})
+        assert outbox.fail("signal", "a") == 1
+        await outbox.close()
+        reopened = device.Outbox(path)
+        attempts = dict(reopened.attempts)
+        await reopened.close()
+        return state, attempts
+
+    (pending, iot_duplicate, signal_add), attempts = run(scenario())
+    assert pending == [("a", {"message": "x"})]
+    assert iot_duplicate is False
+    assert signal_add is True
+    assert attempts == {("signal", "a"): 1}
+
+
+def test_prunes_expired_delivered_entries(device, tmp_path, monkeypatch):
+    path = str(tmp_path / "outbox.db")
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(device.time, "time", lambda: clock["now"])
+
+    async def scenario():
+        outbox = device.Outbox(path, retention=100)
+        for index in range(5):
+            outbox.add("iot", f"m{index}", {})
+            outbox.ack("iot", f"m{index}")
+            clock["now"] += 10
+        await outbox.flush()
+
+        # m0..m2 laufen ab: im Speicher sofort, in der Datenbank erst nach prune_interval
+        clock["now"] = 1125.0
+        outbox.add("signal", "n1", {})
+        await outbox.flush()
+        in_memory = [message_id for _, message_id in outbox.delivered]
+        rows_before = outbox.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+        outbox.last_prune -= outbox.prune_interval
+        outbox.add("signal", "n2", {})
+        await outbox.flush()
+        rows_after = outbox.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        await outbox.close()
+        return in_memory, rows_before, rows_after
+
+    in_memory, rows_before, rows_after = run(scenario())
+    assert in_memory == ["m3", "m4"]
+    assert rows_before == 6
+    assert rows_after == 4
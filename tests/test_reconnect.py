@@ -0,0 +1,38 @@
+"""
+Tests für ReconnectPolicy
+=========================
+Backoff und Circuit Breaker über simulierte Fehlversuche.
+"""
+
+import random
+
+import pytest
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_default_breaker_never_waits_longer_than_backoff_cap(device, seed):
+    random.seed(seed)
+    policy = device.ReconnectPolicy("iot", device.AccountMetrics(), device.IOT_RECONNECT_DELAY)
+    delays = [policy.next_delay() for _ in range(50)]
+
+    assert policy.state == policy.OPEN
+    assert delays[0] == 0.0
+    assert max(delays) <= device.RECONNECT_MAX_DELAY
+
+
+def test_breaker_disabled(device):
+    policy = device.ReconnectPolicy("signal", device.AccountMetrics(), 1.0, breaker_threshold=0)
+    for _ in range(50):
+        policy.next_delay()
+    assert policy.state == policy.CLOSED
+
+
+def test_ready_closes_breaker(device):
+    policy = device.ReconnectPolicy("signal", device.AccountMetrics(), 1.0, breaker_threshold=2,
+                                    breaker_cooldown=5.0)
+    policy.next_delay()
+    delay = policy.next_delay()
+    assert policy.state == policy.OPEN
+    assert 4.0 <= delay <= 5.0
+    policy.ready()
+    assert policy.state == policy.CLOSED
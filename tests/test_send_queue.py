@@ -0,0 +1,85 @@
+"""
+Tests für SignalSendQueue mit Overflow-Policy 'spill'
+=====================================================
+Ausgelagerte Nachrichten kommen vollständig und in Reihenfolge an, auch
+über einen Neustart hinweg.
+"""
+
+import asyncio
+import os
+
+
+def make_account(device, tmp_path):
+    return device.SignalAccount(receive_number="+4915100000001", signal_server_url="localhost:1",
+                                spill_file=str(tmp_path / "spill.jsonl"))
+
+
+def test_spill_keeps_order(device, tmp_path, monkeypatch):
+    sent = []
+
+    async def fake_send(account, message, recipient=None):
+        await asyncio.sleep(0.001)
+        sent.append(message)
+        return True
+
+    monkeypatch.setattr(device, "send_signal_message", fake_send)
+
+    async def scenario():
+        account = make_account(device, tmp_path)
+        queue = device.SignalSendQueue(account, maxsize=4, workers=1, overflow="spill")
+        queue.start()
+        for index in range(200):
+            await queue.put(f"n{index}")
+        while queue.spill_pending or not queue.queue.empty():
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue.spilled
+
+    spilled = asyncio.run(scenario())
+    assert spilled > 0
+    assert sent == [f"n{index}" for index in range(200)]
+    assert not os.path.exists(tmp_path / "spill.jsonl")
+    assert not os.path.exists(tmp_path / "spill.jsonl.offset")
+
+
+def test_spill_resumes_after_restart(device, tmp_path):
+    async def first_run():
+        account = make_account(device, tmp_path)
+        queue = device.SignalSendQueue(account, maxsize=2, workers=1, overflow="spill")
+        for index in range(10):
+            await queue.put(f"n{index}")
+        # Ohne Worker: zwei in der Queue, acht ausgelagert; zwei davon nachladen
+        for _ in range(2):
+            queue.queue.get_nowait()
+            queue.queue.task_done()
+        queue._reload_spilled()
+        await queue.reload_task
+        queued = [queue.queue.get_nowait().message for _ in range(queue.queue.qsize())]
+        await queue.stop(drain_timeout=0)
+        return queued
+
+    async def second_run():
+        account = make_account(device, tmp_path)
+        queue = device.SignalSendQueue(account, maxsize=100, workers=1, overflow="spill")
+        pending = queue.spill_pending
+        queue._reload_spilled()
+        await queue.reload_task
+        queued = [queue.queue.get_nowait().message for _ in range(queue.queue.qsize())]
+        await queue.stop(drain_timeout=0)
+        return pending, queued
+
+    assert asyncio.run(first_run()) == ["n2", "n3"]
+    assert asyncio.run(second_run()) == (6, ["n4", "n5", "n6", "n7", "n8", "n9"])
+
+
+def test_failed_spill_write_is_not_pending(device, tmp_path):
+    async def scenario():
+        account = device.SignalAccount(receive_number="+4915100000001", signal_server_url="localhost:1",
+                                       spill_file=str(tmp_path / "fehlt" / "spill.jsonl"))
+        queue = device.SignalSendQueue(account, maxsize=1, workers=1, overflow="spill")
+        await queue.put("n0", message_ids=("a",))
+        await queue.put("n1", message_ids=("b",))
+        await queue.stop(drain_timeout=0)
+        return queue.spill_pending, queue.dropped, queue.inflight
+
+    assert asyncio.run(scenario()) == (0, 1, {"a"})
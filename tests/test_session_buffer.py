@@ -0,0 +1,53 @@
+"""
+Tests für SessionBuffer
+=======================
+Speicher- und Sitzungsgrenzen des Stream-Puffers.
+"""
+
+import asyncio
+
+
+def test_single_session_respects_max_bytes(device):
+    buffer = device.SessionBuffer(ttl=3600, max_bytes=10_000, max_sessions=10)
+    released = []
+    for _ in range(1000):
+        released += buffer.append("endlos", {"id": "endlos", "final": False}, "x" * 100)
+        assert buffer.bytes <= 10_000
+
+    assert buffer.evicted == len(released) > 0
+    # Nichts geht verloren: freigegebene Teile und Rest ergeben den ganzen Text
+    text = "".join(session.text() for session in released) + buffer.get("endlos").text()
+    assert text == "x" * 100_000
+
+
+def test_oldest_session_evicted_first(device):
+    buffer = device.SessionBuffer(ttl=3600, max_bytes=10**9, max_sessions=2)
+    buffer.append("a", {"id": "a"}, "1")
+    buffer.append("b", {"id": "b"}, "2")
+    released = buffer.append("c", {"id": "c"}, "3")
+    assert [session.session_id for session in released] == ["a"]
+    assert "b" in buffer and "c" in buffer
+
+
+def test_repeated_overflow_flushes_every_part(device, tmp_path, monkeypatch):
+    sent = []
+
+    async def fake_send(account, message, recipient=None):
+        sent.append(message)
+        return True
+
+    monkeypatch.setattr(device, "send_signal_message", fake_send)
+    monkeypatch.setattr(device, "SESSION_EXPIRE_POLICY", "flush")
+
+    async def scenario():
+        account = device.SignalAccount(receive_number="+4915100000001", signal_server_url="localhost:1")
+        account.session_buffer = device.SessionBuffer(ttl=3600, max_bytes=2_000, max_sessions=10)
+        account.outbox = device.Outbox(str(tmp_path / "outbox.db"))
+        for _ in range(100):
+            await device.handle_iot_text_payload(account, {"id": "s1", "final": False}, "y" * 50)
+        await device.handle_iot_text_payload(account, {"id": "s1", "final": True}, "!")
+        await account.outbox.close()
+
+    asyncio.run(scenario())
+    assert len(sent) > 2
+    assert "".join(sent) == "y" * 5000 + "!"